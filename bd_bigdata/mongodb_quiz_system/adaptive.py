@@ -0,0 +1,476 @@
+"""
+adaptive.py - Test adaptativo (CAT) con teoría de respuesta al ítem para MongoDB Quiz System
+
+Modelo 2PL: P(acierto | θ) = 1 / (1 + exp(-a·(θ - b))), donde θ es la
+habilidad del alumno, a la discriminación de la pregunta y b su dificultad.
+
+- Calibración (calibrate_items): máxima verosimilitud marginal por EM
+  (Bock-Aitkin) sobre una rejilla de θ, con todas las respuestas del
+  historial (item_analysis.load_responses). Cada pregunta tiene un prior
+  suave (log a ~ N(0, 0.5), b centrada en la dificultad de la pregunta), así
+  que las preguntas con pocas respuestas se quedan cerca del prior. Los
+  parámetros se guardan en item_params de la BD principal; las preguntas sin
+  calibrar usan directamente el prior.
+- Sesión (AdaptiveEngine): la habilidad se estima por EAP (media a
+  posteriori) sobre la misma rejilla. Las tablas de log-probabilidad y de
+  información de Fisher (preguntas × puntos de la rejilla) y el orden de las
+  preguntas por información en cada punto se precalculan una vez por versión
+  del banco y de la calibración, así que elegir la siguiente pregunta es una
+  búsqueda en la fila del punto más cercano a θ. La sesión acaba cuando el
+  error estándar (desviación a posteriori) baja de ADAPTIVE_SE_TARGET.
+
+Requiere NumPy (pip install numpy).
+
+Uso:
+    python adaptive.py --calibrate              # Calibra y guarda item_params
+    python adaptive.py --calibrate --dry-run    # Solo calibra y muestra el resumen
+    python adaptive.py --simulate 500           # 500 alumnos simulados: CAT frente a examen fijo
+"""
+
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import database
+from item_analysis import load_responses
+from quiz_generator import DIFFICULTY_PRIOR
+
+THETA_MIN, THETA_MAX, THETA_POINTS = -4.0, 4.0, 81  # Rejilla de habilidad
+ADAPTIVE_SE_TARGET = 0.45       # Error estándar que termina la sesión
+ADAPTIVE_MIN_QUESTIONS = 5      # Preguntas mínimas antes de poder parar
+ADAPTIVE_MAX_QUESTIONS = 30     # Tope de preguntas por sesión
+ADAPTIVE_RANDOMESQUE = 3        # Se sortea entre las N más informativas (exposición)
+FIXED_EXAM_QUESTIONS = 20       # Examen fijo de referencia en --simulate
+
+EM_MAX_ITERATIONS = 100         # Iteraciones EM de la calibración
+EM_TOLERANCE = 1e-4             # Cambio máximo de a/b para dar por convergida
+PRIOR_LOG_A_SD = 0.5            # Prior de la discriminación: log a ~ N(0, 0.5)
+PRIOR_B_SD = 1.0                # Prior de la dificultad: b ~ N(b0, 1)
+A_BOUNDS = (0.2, 4.0)
+B_BOUNDS = (-4.0, 4.0)
+CALIBRATION_CHUNK = 50_000      # Respuestas por bloque en el paso E (memoria acotada)
+
+ItemParams = Dict[int, Tuple[float, float]]  # {question_id: (a, b)}
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('adaptive.py requiere NumPy (pip install numpy)')
+
+def theta_grid():
+    """Puntos de la rejilla de habilidad"""
+    return np.linspace(THETA_MIN, THETA_MAX, THETA_POINTS)
+
+def prior_difficulty(difficulty: str) -> float:
+    """b inicial de una pregunta: la que da DIFFICULTY_PRIOR de acierto con θ = 0"""
+    p = DIFFICULTY_PRIOR.get(difficulty, 0.6)
+    return float(np.log((1 - p) / p))
+
+# ==================== CALIBRACIÓN 2PL (EM) ====================
+
+def _segments(keys):
+    """Inicio de cada tramo de claves iguales en un array ordenado"""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+def calibrate_2pl(exam_index, item_index, correct, b_prior,
+                  max_iterations: int = EM_MAX_ITERATIONS) -> Dict:
+    """
+    Estima (a, b) de cada pregunta por máxima verosimilitud marginal (EM)
+
+    Paso E: posterior de θ de cada examen sobre la rejilla, y de ahí los
+    aciertos y respuestas esperados de cada pregunta en cada punto. Paso M:
+    un paso de Fisher scoring por pregunta (vectorizado) con el prior de a y b.
+    Las respuestas se recorren en bloques ordenados por examen y por pregunta
+    y se suman con np.add.reduceat, sin matrices respuestas × rejilla completas.
+
+    Args:
+        exam_index: Índice denso del examen de cada respuesta
+        item_index: Índice denso de la pregunta de cada respuesta
+        correct: 1 si la respuesta es correcta, 0 si no
+        b_prior: Centro del prior de b para cada pregunta
+
+    Returns:
+        Dict con arrays a, b, responses y el número de iteraciones
+    """
+    grid = theta_grid()
+    log_weights = -0.5 * grid ** 2
+    num_exams = int(exam_index.max()) + 1 if len(exam_index) else 0
+    num_items = len(b_prior)
+    x = correct.astype(bool)
+
+    by_exam = np.argsort(exam_index, kind='stable')
+    by_item = np.argsort(item_index, kind='stable')
+    responses = np.bincount(item_index, minlength=num_items)
+
+    a = np.ones(num_items)
+    b = np.array(b_prior, dtype=np.float64)
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        # Paso E: log-verosimilitud de cada examen en cada punto de la rejilla
+        logits = a[:, None] * (grid[None, :] - b[:, None])
+        log_p = -np.logaddexp(0, -logits)
+        log_q = -np.logaddexp(0, logits)
+        log_lik = np.zeros((num_exams, THETA_POINTS))
+        for start in range(0, len(by_exam), CALIBRATION_CHUNK):
+            rows = by_exam[start:start + CALIBRATION_CHUNK]
+            items = item_index[rows]
+            contrib = np.where(x[rows, None], log_p[items], log_q[items])
+            exams = exam_index[rows]
+            starts = _segments(exams)
+            log_lik[exams[starts]] += np.add.reduceat(contrib, starts, axis=0)
+
+        log_post = log_lik + log_weights
+        log_post -= log_post.max(axis=1, keepdims=True)
+        posterior = np.exp(log_post)
+        posterior /= posterior.sum(axis=1, keepdims=True)
+
+        # Respuestas (n) y aciertos (r) esperados por pregunta y punto
+        n = np.zeros((num_items, THETA_POINTS))
+        r = np.zeros((num_items, THETA_POINTS))
+        for start in range(0, len(by_item), CALIBRATION_CHUNK):
+            rows = by_item[start:start + CALIBRATION_CHUNK]
+            weights = posterior[exam_index[rows]]
+            items = item_index[rows]
+            starts = _segments(items)
+            n[items[starts]] += np.add.reduceat(weights, starts, axis=0)
+            r[items[starts]] += np.add.reduceat(weights * x[rows, None], starts, axis=0)
+
+        # Paso M: Fisher scoring en (a, b) con prior
+        p = np.exp(log_p)
+        residual = r - n * p
+        npq = n * p * (1 - p)
+        delta = grid[None, :] - b[:, None]
+        grad_a = (residual * delta).sum(axis=1) - np.log(a) / (a * PRIOR_LOG_A_SD ** 2)
+        grad_b = -a * residual.sum(axis=1) - (b - b_prior) / PRIOR_B_SD ** 2
+        info_aa = (npq * delta ** 2).sum(axis=1) + 1 / (a * PRIOR_LOG_A_SD) ** 2
+        info_bb = a ** 2 * npq.sum(axis=1) + 1 / PRIOR_B_SD ** 2
+        info_ab = -a * (npq * delta).sum(axis=1)
+        det = info_aa * info_bb - info_ab ** 2
+        step_a = (info_bb * grad_a - info_ab * grad_b) / det
+        step_b = (info_aa * grad_b - info_ab * grad_a) / det
+
+        new_a = np.clip(a + step_a, *A_BOUNDS)
+        new_b = np.clip(b + step_b, *B_BOUNDS)
+        change = max(np.abs(new_a - a).max(initial=0), np.abs(new_b - b).max(initial=0))
+        a, b = new_a, new_b
+        if change < EM_TOLERANCE:
+            break
+
+    return {'a': a, 'b': b, 'responses': responses, 'iterations': iterations}
+
+def _bank_questions(fields=('id', 'category_id', 'difficulty')) -> List:
+    questions = []
+    for category in database.get_all_categories():
+        questions.extend(database.get_questions_by_category(category['id'], fields=fields))
+    return questions
+
+def save_item_params(question_ids, a, b, responses) -> int:
+    """Sustituye item_params de la BD principal por una calibración nueva"""
+    calibrated_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+    rows = [(int(qid), round(float(ai), 6), round(float(bi), 6), int(n), calibrated_at)
+            for qid, ai, bi, n in zip(question_ids, a, b, responses)]
+    conn = database.get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM item_params')
+        conn.executemany('''
+            INSERT INTO item_params (question_id, a, b, responses, calibrated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+def load_item_params() -> ItemParams:
+    """Parámetros (a, b) calibrados de la BD principal"""
+    conn = database.get_connection()
+    try:
+        rows = conn.execute('SELECT question_id, a, b FROM item_params').fetchall()
+    finally:
+        conn.close()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def _params_version() -> Optional[str]:
+    """Marca de la calibración guardada (todas las filas comparten calibrated_at)"""
+    conn = database.get_connection()
+    try:
+        row = conn.execute('SELECT calibrated_at FROM item_params LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def calibrate_items(dry_run: bool = False) -> Dict:
+    """
+    Carga todas las respuestas, calibra el 2PL y (salvo dry_run) lo guarda
+
+    Solo se calibran las preguntas del banco actual que tienen respuestas.
+
+    Raises:
+        RuntimeError: si NumPy no está instalado
+    """
+    _require_numpy()
+    database.flush_write_behind()
+
+    start = time.perf_counter()
+    exam_index, question_ids, correct = load_responses()
+    loaded = time.perf_counter()
+
+    difficulty = {q['id']: q['difficulty'] for q in _bank_questions(('id', 'difficulty'))}
+    known = np.isin(question_ids, np.fromiter(difficulty, dtype=np.int64, count=len(difficulty)))
+    exam_index, question_ids, correct = exam_index[known], question_ids[known], correct[known]
+    items, item_index = np.unique(question_ids, return_inverse=True)
+    _, exam_index = np.unique(exam_index, return_inverse=True)
+    b_prior = np.array([prior_difficulty(difficulty[int(qid)]) for qid in items])
+
+    fit = calibrate_2pl(exam_index, item_index, correct, b_prior)
+    computed = time.perf_counter()
+    saved = 0
+    if not dry_run:
+        saved = save_item_params(items, fit['a'], fit['b'], fit['responses'])
+        invalidate_adaptive_engine()
+
+    return {
+        'responses': int(len(question_ids)),
+        'exams': int(exam_index.max() + 1) if len(exam_index) else 0,
+        'questions': int(len(items)),
+        'iterations': fit['iterations'],
+        'saved': saved,
+        'load_seconds': round(loaded - start, 3),
+        'compute_seconds': round(computed - loaded, 3),
+        'question_ids': items,
+        'a': fit['a'],
+        'b': fit['b']
+    }
+
+# ==================== MOTOR ADAPTATIVO ====================
+
+class AdaptiveEngine:
+    """Tablas precalculadas sobre la rejilla de θ para estimar y elegir preguntas"""
+
+    def __init__(self, question_ids: Sequence[int], category_ids: Sequence[int],
+                 a: Sequence[float], b: Sequence[float]):
+        _require_numpy()
+        self.grid = theta_grid()
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        self.category_ids = np.asarray(category_ids, dtype=np.int64)
+        self.a = np.asarray(a, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.index = {int(qid): i for i, qid in enumerate(self.question_ids)}
+
+        logits = self.a[:, None] * (self.grid[None, :] - self.b[:, None])
+        self.log_p = -np.logaddexp(0, -logits)
+        self.log_q = -np.logaddexp(0, logits)
+        p = np.exp(self.log_p)
+        self.information = self.a[:, None] ** 2 * p * (1 - p)
+        self.log_prior = -0.5 * self.grid ** 2
+
+        # Por categoría: en cada punto de la rejilla, sus preguntas de más a
+        # menos informativa (filas globales de las tablas)
+        self.ranking: Dict[int, np.ndarray] = {}
+        for category_id in np.unique(self.category_ids):
+            rows = np.flatnonzero(self.category_ids == category_id)
+            order = np.argsort(-self.information[rows], axis=0, kind='stable')
+            self.ranking[int(category_id)] = rows[order].T.astype(np.int32)
+
+    @classmethod
+    def from_bank(cls, params: Optional[ItemParams] = None) -> 'AdaptiveEngine':
+        """Motor para el banco actual; las preguntas sin calibrar usan el prior"""
+        params = load_item_params() if params is None else params
+        questions = _bank_questions()
+        a = [params[q['id']][0] if q['id'] in params else 1.0 for q in questions]
+        b = [params[q['id']][1] if q['id'] in params else prior_difficulty(q['difficulty'])
+             for q in questions]
+        return cls([q['id'] for q in questions], [q['category_id'] for q in questions], a, b)
+
+    def estimate(self, answers: Iterable[Tuple[int, bool]]) -> Tuple[float, float]:
+        """
+        Habilidad EAP y su error estándar tras las respuestas dadas
+
+        Args:
+            answers: Pares (question_id, acierto); se ignoran preguntas fuera del banco
+
+        Returns:
+            Tupla (θ, error estándar)
+        """
+        log_post = self.log_prior.copy()
+        for question_id, is_correct in answers:
+            row = self.index.get(question_id)
+            if row is not None:
+                log_post += self.log_p[row] if is_correct else self.log_q[row]
+        posterior = np.exp(log_post - log_post.max())
+        posterior /= posterior.sum()
+        theta = float(posterior @ self.grid)
+        se = float(np.sqrt(max(posterior @ (self.grid - theta) ** 2, 0.0)))
+        return theta, se
+
+    def next_question(self, theta: float, used, category_ids: Optional[List[int]] = None,
+                      rng: Optional[random.Random] = None) -> Optional[int]:
+        """
+        Pregunta de máxima información en θ (sorteada entre las
+        ADAPTIVE_RANDOMESQUE mejores para repartir la exposición)
+
+        Args:
+            theta: Habilidad estimada
+            used: IDs ya presentados en la sesión
+            category_ids: Categorías permitidas (None o [] = todas)
+            rng: Generador aleatorio (por defecto el del módulo random)
+
+        Returns:
+            ID de la pregunta, o None si no queda ninguna
+        """
+        point = int(np.abs(self.grid - theta).argmin())
+        rankings = [self.ranking[c] for c in (category_ids or self.ranking) if c in self.ranking]
+        best: List[Tuple[float, int]] = []
+        for ranking in rankings:
+            found = 0
+            for row in ranking[point]:
+                if int(self.question_ids[row]) in used:
+                    continue
+                best.append((float(self.information[row, point]), int(row)))
+                found += 1
+                if found == ADAPTIVE_RANDOMESQUE:
+                    break
+        if not best:
+            return None
+        best.sort(reverse=True)
+        _, row = (rng or random).choice(best[:ADAPTIVE_RANDOMESQUE])
+        return int(self.question_ids[row])
+
+    def should_stop(self, se: float, answered: int) -> bool:
+        """Regla de parada: precisión alcanzada (con un mínimo) o tope de preguntas"""
+        if answered >= ADAPTIVE_MAX_QUESTIONS:
+            return True
+        return answered >= ADAPTIVE_MIN_QUESTIONS and se <= ADAPTIVE_SE_TARGET
+
+    def simulate(self, num_examinees: int, seed=0) -> Dict:
+        """
+        Compara CAT con un examen fijo de FIXED_EXAM_QUESTIONS preguntas al
+        azar sobre alumnos simulados con θ ~ N(0, 1) y el 2PL como verdad
+
+        Returns:
+            Preguntas medias, error estándar medio y RMSE de θ de cada modo
+        """
+        rng = random.Random(seed)
+        nprng = np.random.default_rng(seed)
+        ids = [int(qid) for qid in self.question_ids]
+        p_true = lambda theta, qid: 1 / (1 + np.exp(
+            -self.a[self.index[qid]] * (theta - self.b[self.index[qid]])))
+
+        cat_lengths, cat_se, cat_err, fixed_se, fixed_err = [], [], [], [], []
+        for true_theta in nprng.standard_normal(num_examinees):
+            answers: List[Tuple[int, bool]] = []
+            used = set()
+            theta, se = self.estimate(answers)
+            while not self.should_stop(se, len(answers)):
+                question_id = self.next_question(theta, used, rng=rng)
+                if question_id is None:
+                    break
+                used.add(question_id)
+                answers.append((question_id, nprng.random() < p_true(true_theta, question_id)))
+                theta, se = self.estimate(answers)
+            cat_lengths.append(len(answers))
+            cat_se.append(se)
+            cat_err.append(theta - true_theta)
+
+            fixed = [(qid, nprng.random() < p_true(true_theta, qid))
+                     for qid in rng.sample(ids, min(FIXED_EXAM_QUESTIONS, len(ids)))]
+            theta, se = self.estimate(fixed)
+            fixed_se.append(se)
+            fixed_err.append(theta - true_theta)
+
+        return {
+            'examinees': num_examinees,
+            'cat_questions': round(float(np.mean(cat_lengths)), 2),
+            'cat_se': round(float(np.mean(cat_se)), 3),
+            'cat_rmse': round(float(np.sqrt(np.mean(np.square(cat_err)))), 3),
+            'fixed_questions': min(FIXED_EXAM_QUESTIONS, len(ids)),
+            'fixed_se': round(float(np.mean(fixed_se)), 3),
+            'fixed_rmse': round(float(np.sqrt(np.mean(np.square(fixed_err)))), 3)
+        }
+
+_engine: Optional[AdaptiveEngine] = None
+_engine_version: Optional[Tuple] = None
+_engine_lock = threading.Lock()
+
+def get_adaptive_engine() -> AdaptiveEngine:
+    """
+    Motor del banco actual (se construye una vez por versión del banco y de
+    la calibración)
+
+    Raises:
+        RuntimeError: si NumPy no está instalado
+    """
+    global _engine, _engine_version
+    _require_numpy()
+    version = (database.get_question_bank_version(), _params_version())
+    if _engine is not None and _engine_version == version:
+        return _engine
+    with _engine_lock:
+        if _engine is None or _engine_version != version:
+            _engine = AdaptiveEngine.from_bank()
+            _engine_version = version
+        return _engine
+
+def invalidate_adaptive_engine():
+    """Descarta el motor en caché (tras guardar una calibración nueva)"""
+    global _engine, _engine_version
+    with _engine_lock:
+        _engine = None
+        _engine_version = None
+
+def _option(name: str, default: int) -> int:
+    return int(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+if __name__ == '__main__':
+    calibrate = '--calibrate' in sys.argv
+    dry_run = '--dry-run' in sys.argv
+
+    print("="*60)
+    print("🎯 TEST ADAPTATIVO (2PL)")
+    print("="*60 + "\n")
+
+    try:
+        if calibrate:
+            report = calibrate_items(dry_run=dry_run)
+            print(f"📊 {report['responses']} respuestas de {report['exams']} exámenes, "
+                  f"{report['questions']} preguntas")
+            print(f"  Carga: {report['load_seconds']} s, calibración: {report['compute_seconds']} s "
+                  f"({report['iterations']} iteraciones EM)")
+            if report['questions']:
+                print(f"  a: media {report['a'].mean():.2f} "
+                      f"[{report['a'].min():.2f}, {report['a'].max():.2f}]")
+                print(f"  b: media {report['b'].mean():.2f} "
+                      f"[{report['b'].min():.2f}, {report['b'].max():.2f}]")
+            if dry_run:
+                print("  (--dry-run: no se guardó nada)")
+            else:
+                print(f"  ✅ Guardadas {report['saved']} filas en item_params")
+
+        if '--simulate' in sys.argv:
+            build_start = time.perf_counter()
+            engine = get_adaptive_engine()
+            build_seconds = time.perf_counter() - build_start
+            result = engine.simulate(_option('--simulate', 500))
+            print(f"\n🧪 {result['examinees']} alumnos simulados "
+                  f"({len(engine.question_ids)} preguntas, tablas en {build_seconds:.2f} s)")
+            print(f"  CAT:   {result['cat_questions']:>5} preguntas de media, "
+                  f"EE {result['cat_se']}, RMSE {result['cat_rmse']}")
+            print(f"  Fijo:  {result['fixed_questions']:>5} preguntas al azar, "
+                  f"EE {result['fixed_se']}, RMSE {result['fixed_rmse']}")
+        elif not calibrate:
+            print("Uso: python adaptive.py [--calibrate [--dry-run]] [--simulate N]")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print()
@@ -5,24 +5,58 @@ Rutas:
 - /: Página principal con selección de categorías
 - /exam: Página de examen con 20 preguntas
 - /submit: Procesa respuestas y muestra resultados
+- /start_adaptive, /adaptive, /adaptive/answer: Test adaptativo, una pregunta cada vez
+- /review: Repaso espaciado (SM-2) de las preguntas que ya tocan
 - /progress: Dashboard de progreso y estadísticas
-- /history: Historial de exámenes anteriores
+- /history: Historial de exámenes anteriores (paginado con ?before=<cursor>)
+- /api/history: Historial paginado en JSON
+- /search, /api/search: Búsqueda de texto completo sobre el banco de preguntas
+- /export/exams.ndjson, /export/answers.csv: Exportación del historial en streaming
+- /debug/db-stats: Métricas de consultas SQL (solo con QUIZ_DB_INSTRUMENT=1 o en modo debug)
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import (Flask, Response, abort, render_template, request, redirect, url_for, session,
+                   jsonify)
+from markupsafe import Markup, escape
+import base64
+import binascii
 import json
+import os
+import queue
+import struct
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 from database import (
+    migrate_database,
     get_all_categories,
-    insert_exam,
-    insert_exam_answer,
-    get_question_by_id,
-    update_study_progress,
-    get_study_progress_all,
-    get_exam_history
+    record_exam_submission,
+    submit_exam_submission,
+    start_write_behind,
+    get_write_behind_stats,
+    get_shard_stats,
+    normalize_user_id,
+    DEFAULT_USER_ID,
+    get_questions_by_ids,
+    get_due_reviews,
+    get_next_review_date,
+    get_progress_overview,
+    get_progress_version,
+    get_exam_history_page,
+    get_overall_stats,
+    search_questions,
+    HIGHLIGHT_START,
+    HIGHLIGHT_END,
+    get_query_stats,
+    get_pool_stats,
+    get_question_cache_stats,
+    is_query_instrumentation_enabled
 )
+from backup import start_backup_scheduler, get_backup_scheduler_stats
+from export import build_export_filters, export_stream, EXPORT_KINDS
+from adaptive import get_adaptive_engine, ADAPTIVE_SE_TARGET, ADAPTIVE_MAX_QUESTIONS
 from quiz_generator import (
     QuizGenerator,
     format_exam_for_display,
@@ -32,6 +66,96 @@ from quiz_generator import (
 app = Flask(__name__)
 app.secret_key = 'mongodb-quiz-secret-key-2026'  # Cambiar en producción
 
+HISTORY_PAGE_SIZE = 20  # Exámenes por página en /history
+QUESTION_TIMING_FIELDS = 5  # Enteros por pregunta en answer_timings (ver static/js/quiz.js)
+TIMING_CLOCK_SLACK_MS = 5000  # Margen sobre la duración medida en el servidor
+PROGRESS_PAGE_CACHE_SIZE = 512  # Páginas /progress cacheadas (una por usuario)
+
+# Página /progress ya renderizada por usuario: {user_id: (versión, html)}
+_progress_pages: 'OrderedDict[str, Tuple[Tuple[int, int], str]]' = OrderedDict()
+_progress_pages_lock = threading.Lock()
+
+# Actualizar en el sitio el esquema de una BD existente (índices, tablas nuevas)
+migrate_database()
+
+# Escritura diferida de envíos: las peticiones no esperan al commit en disco
+if os.environ.get('QUIZ_DB_WRITE_BEHIND', '') not in ('', '0'):
+    start_write_behind()
+
+# Snapshots periódicos en caliente (ver backup.py)
+if os.environ.get('QUIZ_BACKUP_INTERVAL'):
+    start_backup_scheduler(float(os.environ['QUIZ_BACKUP_INTERVAL']))
+
+def _current_user_id() -> str:
+    """Usuario de la sesión (DEFAULT_USER_ID si no ha indicado ninguno)"""
+    return session.get('user_id', DEFAULT_USER_ID)
+
+def _answer_timing(timing) -> Dict:
+    """Columnas de tiempo de una respuesta (None si el navegador no las envió)"""
+    if not timing:
+        return {'time_spent_seconds': None, 'time_spent_ms': None, 'first_answer_ms': None,
+                'last_answer_ms': None, 'answer_changes': None}
+    return {'time_spent_seconds': round(timing['time_spent_ms'] / 1000), **timing}
+
+def _decode_answer_timings(raw: str, question_ids: List[int], max_ms: int) -> Dict[int, Dict]:
+    """
+    Decodifica el campo answer_timings que rellena quiz.js al enviar el examen
+
+    Formato: 'v1:' + base64 de enteros uint32 little-endian, cinco por
+    pregunta: question_id, ms activos en la pregunta, ms hasta la primera
+    respuesta, ms hasta el último cambio y número de cambios (tiempos desde
+    que cargó la página, 0 = nunca). Los tiempos se acotan a max_ms y se
+    ignoran preguntas ajenas al examen; si el campo falta o está corrupto se
+    devuelve {} y esas respuestas se guardan sin tiempo.
+    """
+    if not raw or not raw.startswith('v1:'):
+        return {}
+    try:
+        data = base64.b64decode(raw[3:], validate=True)
+    except (binascii.Error, ValueError):
+        return {}
+    record_size = 4 * QUESTION_TIMING_FIELDS
+    if not data or len(data) % record_size or len(data) > record_size * len(question_ids):
+        return {}
+
+    wanted = set(question_ids)
+    timings = {}
+    for question_id, active_ms, first_ms, last_ms, changes in struct.iter_unpack(
+            f'<{QUESTION_TIMING_FIELDS}I', data):
+        if question_id not in wanted:
+            continue
+        timings[question_id] = {
+            'time_spent_ms': min(active_ms, max_ms),
+            'first_answer_ms': min(first_ms, max_ms) or None,
+            'last_answer_ms': min(last_ms, max_ms) or None,
+            'answer_changes': changes
+        }
+    return timings
+
+def _log_failed_submission(submission: Dict):
+    """Callback del Future de un envío diferido: deja constancia si el lote falla"""
+    def callback(future):
+        error = future.exception()
+        if error is not None:
+            app.logger.error(
+                'No se pudo guardar el examen del usuario %s (escritura diferida): %r; envío: %s',
+                submission['user_id'], error, json.dumps(submission, default=str)
+            )
+    return callback
+
+def _save_submission(submission: Dict):
+    """Guarda un examen corregido; devuelve su exam_id (None si aún está en cola)"""
+    try:
+        # Con escritura diferida se encola y el exam_id llega tras el commit del lote
+        pending = submit_exam_submission(**submission)
+        if pending.done():
+            return pending.result()
+        pending.add_done_callback(_log_failed_submission(submission))
+        return None
+    except queue.Full:
+        # Cola saturada: escribir directamente para no perder el examen
+        return record_exam_submission(**submission)
+
 # ============================================================
 # RUTA PRINCIPAL: Selección de categorías
 # ============================================================
@@ -40,7 +164,7 @@ app.secret_key = 'mongodb-quiz-secret-key-2026'  # Cambiar en producción
 def index():
     """Página principal con selección de categorías"""
     categories = get_all_categories()
-    return render_template('index.html', categories=categories)
+    return render_template('index.html', categories=categories, user_id=_current_user_id())
 
 # ============================================================
 # RUTA: Generar y mostrar examen
@@ -50,6 +174,13 @@ def index():
 def start_exam():
     """Genera un examen basado en las categorías seleccionadas"""
 
+    # Usuario dueño del historial (opcional)
+    if 'user_id' in request.form:
+        try:
+            session['user_id'] = normalize_user_id(request.form['user_id'])
+        except ValueError as e:
+            return str(e), 400
+
     # Obtener categorías seleccionadas del formulario
     selected_categories = request.form.getlist('categories')
 
@@ -82,6 +213,34 @@ def start_exam():
         difficulty_summary=difficulty_summary
     )
 
+# ============================================================
+# RUTA: Repaso espaciado (SM-2)
+# ============================================================
+
+@app.route('/review')
+def review():
+    """Examen con las preguntas cuyo repaso ya toca (se corrige con /submit_exam)"""
+    user_id = _current_user_id()
+    due = get_due_reviews(user_id)
+    questions = list(get_questions_by_ids([item['question_id'] for item in due]).values())
+    if not questions:
+        next_review = get_next_review_date(user_id)
+        return render_template('review.html', next_review=next_review)
+
+    # Mismo flujo que un examen normal: al enviarlo se reprograma cada pregunta
+    generator = QuizGenerator(num_questions=len(questions))
+    session['exam_questions'] = [q['id'] for q in questions]
+    session['selected_categories'] = []
+    session['exam_start_time'] = datetime.now().isoformat()
+
+    return render_template(
+        'exam.html',
+        questions=format_exam_for_display(questions),
+        category_summary=generator.get_category_summary(questions),
+        difficulty_summary=generator.get_difficulty_summary(questions),
+        review=True
+    )
+
 # ============================================================
 # RUTA: Procesar respuestas y mostrar resultados
 # ============================================================
@@ -105,12 +264,17 @@ def submit_exam():
     # Calcular tiempo transcurrido
     time_spent = int((datetime.now() - exam_start_time).total_seconds())
 
+    # Tiempos reales por pregunta medidos en el navegador
+    timings = _decode_answer_timings(request.form.get('answer_timings'), question_ids,
+                                     time_spent * 1000 + TIMING_CLOCK_SLACK_MS)
+
     # Evaluar respuestas
     results = []
     correct_count = 0
+    questions = get_questions_by_ids(question_ids)
 
     for question_id in question_ids:
-        question = get_question_by_id(question_id)
+        question = questions[question_id]
         user_answer = user_answers.get(question_id, '')
         is_correct = user_answer == question['correct_answer']
 
@@ -127,45 +291,26 @@ def submit_exam():
     total_questions = len(question_ids)
     score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
 
-    # Guardar examen en BD
-    exam_id = insert_exam(
+    # Guardar examen, respuestas y progreso por categoría en una sola transacción
+    submission = dict(
         total_questions=total_questions,
         correct_answers=correct_count,
         score=score,
         selected_categories=json.dumps(selected_categories),
-        time_spent_seconds=time_spent
+        time_spent_seconds=time_spent,
+        answers=[
+            {
+                'question_id': result['question']['id'],
+                'category_id': result['question']['category_id'],
+                'user_answer': result['user_answer'],
+                'is_correct': result['is_correct'],
+                **_answer_timing(timings.get(result['question']['id']))
+            }
+            for result in results
+        ],
+        user_id=_current_user_id()
     )
-
-    # Guardar respuestas individuales y actualizar progreso por categoría
-    category_stats = {}  # {category_id: {'answered': 0, 'correct': 0}}
-
-    for result in results:
-        question = result['question']
-        category_id = question['category_id']
-
-        # Insertar respuesta
-        insert_exam_answer(
-            exam_id=exam_id,
-            question_id=question['id'],
-            user_answer=result['user_answer'],
-            is_correct=result['is_correct'],
-            time_spent_seconds=time_spent // total_questions  # Promedio
-        )
-
-        # Acumular stats por categoría
-        if category_id not in category_stats:
-            category_stats[category_id] = {'answered': 0, 'correct': 0}
-        category_stats[category_id]['answered'] += 1
-        if result['is_correct']:
-            category_stats[category_id]['correct'] += 1
-
-    # Actualizar progreso de estudio
-    for category_id, stats in category_stats.items():
-        update_study_progress(
-            category_id=category_id,
-            questions_answered_delta=stats['answered'],
-            questions_correct_delta=stats['correct']
-        )
+    exam_id = _save_submission(submission)
 
     # Limpiar sesión
     session.pop('exam_questions', None)
@@ -182,6 +327,140 @@ def submit_exam():
         exam_id=exam_id
     )
 
+# ============================================================
+# RUTA: Test adaptativo (una pregunta cada vez)
+# ============================================================
+
+@app.route('/start_adaptive', methods=['POST'])
+def start_adaptive():
+    """Empieza una sesión adaptativa con las categorías seleccionadas"""
+    if 'user_id' in request.form:
+        try:
+            session['user_id'] = normalize_user_id(request.form['user_id'])
+        except ValueError as e:
+            return str(e), 400
+
+    category_ids = [int(cat_id) for cat_id in request.form.getlist('categories')]
+    try:
+        engine = get_adaptive_engine()
+    except RuntimeError as e:
+        return str(e), 503
+
+    theta, _ = engine.estimate([])
+    first_question = engine.next_question(theta, set(), category_ids)
+    if first_question is None:
+        return 'No hay preguntas en las categorías seleccionadas', 400
+
+    # Estado de la sesión: [question_id, respuesta, acierto, ms] por pregunta respondida
+    now = datetime.now().isoformat()
+    session['adaptive'] = {
+        'categories': category_ids,
+        'answers': [],
+        'current': first_question,
+        'start_time': now,
+        'shown_at': now
+    }
+    return redirect(url_for('adaptive_question'))
+
+@app.route('/adaptive')
+def adaptive_question():
+    """Muestra la pregunta actual de la sesión adaptativa"""
+    state = session.get('adaptive')
+    if not state:
+        return redirect(url_for('index'))
+
+    engine = get_adaptive_engine()
+    theta, se = engine.estimate((answer[0], answer[2]) for answer in state['answers'])
+    question = format_exam_for_display(list(get_questions_by_ids([state['current']]).values()))[0]
+    question['number'] = len(state['answers']) + 1
+
+    return render_template(
+        'adaptive.html',
+        question=question,
+        answered=len(state['answers']),
+        theta=theta,
+        se=se,
+        se_target=ADAPTIVE_SE_TARGET,
+        max_questions=ADAPTIVE_MAX_QUESTIONS
+    )
+
+@app.route('/adaptive/answer', methods=['POST'])
+def adaptive_answer():
+    """Corrige la respuesta, reestima la habilidad y elige la siguiente pregunta o termina"""
+    state = session.get('adaptive')
+    if not state:
+        return redirect(url_for('index'))
+
+    # Reenvíos o pestañas viejas: solo se acepta la pregunta en curso, con respuesta
+    user_answer = request.form.get('answer', '')
+    if (request.form.get('question_id', type=int) != state['current']
+            or user_answer not in ('a', 'b', 'c', 'd', 'e')):
+        return redirect(url_for('adaptive_question'))
+
+    question_id = state['current']
+    question = get_questions_by_ids([question_id])[question_id]
+    elapsed_ms = int((datetime.now() - datetime.fromisoformat(state['shown_at'])).total_seconds() * 1000)
+    state['answers'].append([question_id, user_answer, user_answer == question['correct_answer'],
+                             elapsed_ms])
+
+    engine = get_adaptive_engine()
+    theta, se = engine.estimate((answer[0], answer[2]) for answer in state['answers'])
+    if not engine.should_stop(se, len(state['answers'])):
+        used = {answer[0] for answer in state['answers']}
+        next_question = engine.next_question(theta, used, state['categories'])
+        if next_question is not None:
+            state['current'] = next_question
+            state['shown_at'] = datetime.now().isoformat()
+            session['adaptive'] = state
+            return redirect(url_for('adaptive_question'))
+
+    return _finish_adaptive(state, theta, se)
+
+def _finish_adaptive(state: Dict, theta: float, se: float):
+    """Guarda la sesión adaptativa como un examen más y muestra los resultados"""
+    questions = get_questions_by_ids([answer[0] for answer in state['answers']])
+    results = [
+        {'question': questions[question_id], 'user_answer': user_answer, 'is_correct': is_correct}
+        for question_id, user_answer, is_correct, _ in state['answers']
+    ]
+    correct_count = sum(result['is_correct'] for result in results)
+    total_questions = len(results)
+    score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+    time_spent = int((datetime.now() - datetime.fromisoformat(state['start_time'])).total_seconds())
+
+    exam_id = _save_submission(dict(
+        total_questions=total_questions,
+        correct_answers=correct_count,
+        score=score,
+        selected_categories=json.dumps(state['categories']),
+        time_spent_seconds=time_spent,
+        answers=[
+            {
+                'question_id': question_id,
+                'category_id': questions[question_id]['category_id'],
+                'user_answer': user_answer,
+                'is_correct': is_correct,
+                # El servidor solo sabe cuánto tardó en enviar cada pregunta
+                **_answer_timing({'time_spent_ms': elapsed_ms, 'first_answer_ms': None,
+                                  'last_answer_ms': None, 'answer_changes': None})
+            }
+            for question_id, user_answer, is_correct, elapsed_ms in state['answers']
+        ],
+        user_id=_current_user_id()
+    ))
+    session.pop('adaptive', None)
+
+    return render_template(
+        'results.html',
+        results=results,
+        correct_count=correct_count,
+        total_questions=total_questions,
+        score=score,
+        time_spent=time_spent,
+        exam_id=exam_id,
+        adaptive={'theta': theta, 'se': se}
+    )
+
 # ============================================================
 # RUTA: Dashboard de progreso
 # ============================================================
@@ -189,64 +468,78 @@ def submit_exam():
 @app.route('/progress')
 def progress():
     """Muestra el progreso de estudio del usuario"""
-    categories = get_all_categories()
-    progress_data = get_study_progress_all()
-
-    # Crear mapa de progreso por categoría
-    progress_map = {p['category_id']: p for p in progress_data}
-
-    # Combinar categorías con su progreso
-    progress_list = []
-    for category in categories:
-        cat_id = category['id']
-        prog = progress_map.get(cat_id, {
-            'questions_answered': 0,
-            'questions_correct': 0,
-            'last_study_date': None
-        })
-
-        # Calcular porcentaje de éxito
-        if prog['questions_answered'] > 0:
-            success_rate = (prog['questions_correct'] / prog['questions_answered']) * 100
-        else:
-            success_rate = 0
-
-        progress_list.append({
-            'category': category,
-            'answered': prog['questions_answered'],
-            'correct': prog['questions_correct'],
-            'success_rate': success_rate,
-            'last_study_date': prog.get('last_study_date')
-        })
-
-    return render_template('progress.html', progress_list=progress_list)
+    user_id = _current_user_id()
+
+    # La página se sirve desde caché hasta que el usuario guarde otro examen
+    version = get_progress_version(user_id)
+    with _progress_pages_lock:
+        cached = _progress_pages.get(user_id)
+        if version is not None and cached is not None and cached[0] == version:
+            _progress_pages.move_to_end(user_id)
+            return cached[1]
+
+    # Categorías con su progreso y porcentaje de éxito ya calculados
+    overview = get_progress_overview(user_id)
+    html = render_template(
+        'progress.html',
+        progress_list=overview['categories'],
+        stats=get_overall_stats(user_id)
+    )
+    with _progress_pages_lock:
+        _progress_pages[user_id] = (overview['version'], html)
+        _progress_pages.move_to_end(user_id)
+        while len(_progress_pages) > PROGRESS_PAGE_CACHE_SIZE:
+            _progress_pages.popitem(last=False)
+    return html
 
 # ============================================================
 # RUTA: Historial de exámenes
 # ============================================================
 
-@app.route('/history')
-def history():
-    """Muestra el historial de exámenes realizados"""
-    exams = get_exam_history(limit=20)
-
-    # Formatear fechas y categorías
+def _format_history(exams: List[Dict]) -> List[Dict]:
+    """Añade categorías y fecha formateada a los exámenes del historial"""
     for exam in exams:
-        # Parsear categorías seleccionadas
-        try:
-            exam['categories'] = json.loads(exam['selected_categories']) if exam['selected_categories'] else []
-        except:
-            exam['categories'] = []
+        exam['categories'] = exam.get('selected_categories') or []
 
         # Formatear fecha
         if exam['exam_date']:
             try:
                 dt = datetime.fromisoformat(exam['exam_date'])
                 exam['formatted_date'] = dt.strftime('%d/%m/%Y %H:%M')
-            except:
+            except ValueError:
                 exam['formatted_date'] = exam['exam_date']
+    return exams
+
+@app.route('/history')
+def history():
+    """Muestra el historial de exámenes realizados (paginado por cursor)"""
+    before = request.args.get('before')
+    try:
+        exams, next_cursor = get_exam_history_page(
+            before=before, limit=HISTORY_PAGE_SIZE, user_id=_current_user_id()
+        )
+    except ValueError:
+        return redirect(url_for('history'))
 
-    return render_template('history.html', exams=exams)
+    return render_template(
+        'history.html',
+        exams=_format_history(exams),
+        next_cursor=next_cursor,
+        is_first_page=not before
+    )
+
+@app.route('/api/history')
+def api_history():
+    """API endpoint con el historial paginado: /api/history?before=<cursor>&limit=N"""
+    before = request.args.get('before')
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), 100)
+    try:
+        exams, next_cursor = get_exam_history_page(
+            before=before, limit=limit, user_id=_current_user_id()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'exams': exams, 'next_cursor': next_cursor})
 
 # ============================================================
 # RUTA: Ver detalles de un examen específico
@@ -257,16 +550,18 @@ def view_exam(exam_id):
     """Muestra los detalles de un examen específico"""
     from database import get_exam_by_id, get_exam_answers
 
-    exam = get_exam_by_id(exam_id)
+    user_id = _current_user_id()
+    exam = get_exam_by_id(exam_id, user_id)
     if not exam:
         return "Examen no encontrado", 404
 
-    answers = get_exam_answers(exam_id)
+    answers = get_exam_answers(exam_id, user_id)
 
-    # Obtener preguntas completas
+    # Obtener preguntas completas con una sola consulta
+    questions = get_questions_by_ids([answer['question_id'] for answer in answers])
     results = []
     for answer in answers:
-        question = get_question_by_id(answer['question_id'])
+        question = questions.get(answer['question_id'])
         results.append({
             'question': question,
             'user_answer': answer['user_answer'],
@@ -279,6 +574,102 @@ def view_exam(exam_id):
         results=results
     )
 
+# ============================================================
+# RUTA: Búsqueda de preguntas
+# ============================================================
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+def _highlight(snippet: str) -> Markup:
+    """Escapa un fragmento de búsqueda y convierte los marcadores en <mark>"""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+def _run_search(args) -> Dict:
+    """Ejecuta una búsqueda a partir de los parámetros de la petición"""
+    query = args.get('q', '').strip()
+    category_id = args.get('category', type=int)
+    difficulty = args.get('difficulty')
+    if difficulty not in DIFFICULTIES:
+        difficulty = None
+    limit = min(max(args.get('limit', 50, type=int), 1), 100)
+
+    results = []
+    if query:
+        results = search_questions(
+            query,
+            category_ids=[category_id] if category_id else None,
+            difficulty=difficulty,
+            limit=limit
+        )
+        for result in results:
+            result['question_snippet'] = _highlight(result['question_snippet'])
+            result['explanation_snippet'] = _highlight(result['explanation_snippet'])
+
+    return {
+        'query': query,
+        'category_id': category_id,
+        'difficulty': difficulty,
+        'results': results
+    }
+
+@app.route('/search')
+def search():
+    """Busca preguntas por texto en enunciados, opciones y explicaciones"""
+    search_data = _run_search(request.args)
+    return render_template('search.html', categories=get_all_categories(), **search_data)
+
+@app.route('/api/search')
+def api_search():
+    """API endpoint de búsqueda: /api/search?q=...&category=...&difficulty=..."""
+    search_data = _run_search(request.args)
+    if not search_data['query']:
+        return jsonify({'error': 'Falta el parámetro q'}), 400
+    for result in search_data['results']:
+        result['question_snippet'] = str(result['question_snippet'])
+        result['explanation_snippet'] = str(result['explanation_snippet'])
+    return jsonify(search_data)
+
+# ============================================================
+# RUTA: Exportación del historial (streaming)
+# ============================================================
+
+def _export_response(kind: str):
+    """
+    Respuesta en streaming con el historial del usuario actual
+
+    Parámetros: ?from=AAAA-MM-DD&to=AAAA-MM-DD&category=ID&gzip=1
+    """
+    try:
+        filters = build_export_filters(
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            category_id=request.args.get('category', type=int),
+            user_id=_current_user_id()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    compress = request.args.get('gzip') in ('1', 'true')
+    filename, mimetype = EXPORT_KINDS[kind]
+    if compress:
+        filename, mimetype = filename + '.gz', 'application/gzip'
+    return Response(
+        export_stream(kind, filters, compress=compress),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/export/exams.ndjson')
+def export_exams():
+    """Exporta los exámenes del usuario en NDJSON (una línea por examen)"""
+    return _export_response('exams')
+
+@app.route('/export/answers.csv')
+def export_answers():
+    """Exporta las respuestas del usuario en CSV (una fila por respuesta)"""
+    return _export_response('answers')
+
 # ============================================================
 # API: Obtener categorías (JSON)
 # ============================================================
@@ -289,6 +680,30 @@ def api_categories():
     categories = get_all_categories()
     return jsonify(categories)
 
+# ============================================================
+# DEBUG: Métricas de la capa de base de datos
+# ============================================================
+
+@app.route('/debug/db-stats')
+def debug_db_stats():
+    """
+    Métricas por sentencia SQL, estado del pool y de la caché del banco
+
+    Expone SQL normalizado y el estado interno de la BD, así que solo se
+    sirve con QUIZ_DB_INSTRUMENT=1 o con la app en modo debug (404 si no).
+    """
+    if not (is_query_instrumentation_enabled() or app.debug):
+        abort(404)
+    return jsonify({
+        'instrumentation_enabled': is_query_instrumentation_enabled(),
+        'queries': get_query_stats(),
+        'pool': get_pool_stats(),
+        'question_cache': get_question_cache_stats(),
+        'write_behind': get_write_behind_stats(),
+        'shards': get_shard_stats(),
+        'backups': get_backup_scheduler_stats()
+    })
+
 # ============================================================
 # Manejador de errores
 # ============================================================
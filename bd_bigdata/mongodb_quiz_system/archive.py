@@ -0,0 +1,199 @@
+"""
+archive.py - Archivado de exámenes antiguos de MongoDB Quiz System
+
+Mueve las respuestas (exam_answers) de los exámenes con más de
+ARCHIVE_AFTER_DAYS días a un fichero de archivo junto a cada BD de historial
+(mongodb_quiz.db -> mongodb_quiz_archive.db, y lo mismo para cada shard).
+La fila de exams se queda en la BD caliente como resumen del examen
+(fecha, puntuación, categorías) con archived_at rellenado, así que el
+historial y las estadísticas no cambian; get_exam_by_id y get_exam_answers
+leen del archivo cuando hace falta.
+
+Cada lote se copia primero al archivo (commit) y después se borra de la BD
+caliente, de modo que una interrupción nunca pierde respuestas: como mucho
+quedan duplicadas en el archivo y el siguiente lote las sobrescribe.
+
+Uso:
+    python archive.py                 # Archiva exámenes de más de ARCHIVE_AFTER_DAYS días
+    python archive.py --days 90       # Con otra antigüedad
+    python archive.py --dry-run       # Solo cuenta lo que se archivaría
+    python archive.py --vacuum        # Además compacta las BD calientes
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+import database
+from database import archive_path_for
+from migrations import apply_migrations, ARCHIVE_MIGRATIONS
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('QUIZ_ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = 200   # Exámenes por lote (muy por debajo del límite de parámetros de IN)
+
+EXAM_COLUMNS = ('id', 'user_id', 'exam_date', 'total_questions', 'correct_answers', 'score',
+                'selected_categories', 'time_spent_seconds')
+ANSWER_COLUMNS = ('id', 'exam_id', 'question_id', 'user_answer', 'is_correct',
+                  'time_spent_seconds', 'time_spent_ms', 'first_answer_ms', 'last_answer_ms',
+                  'answer_changes')
+
+def history_databases() -> List[Tuple[str, Callable]]:
+    """(ruta, función que devuelve una conexión del pool) de cada BD de historial"""
+    targets = [(database.DB_PATH, database.get_connection)]
+    router = database.get_shard_router()
+    if router is not None:
+        for index in router.existing_shards():
+            targets.append((router.path_for_shard(index),
+                            lambda index=index: router.shard_connection(index)))
+    return targets
+
+def _open_archive_for_write(history_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(archive_path_for(history_path),
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+    apply_migrations(conn, migrations=ARCHIVE_MIGRATIONS)
+    return conn
+
+def _database_size(conn) -> int:
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+def archive_database(hot, history_path: str, days: int = ARCHIVE_AFTER_DAYS,
+                     batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False,
+                     vacuum: bool = False) -> Dict:
+    """
+    Archiva los exámenes antiguos de una BD de historial
+
+    Args:
+        hot: Conexión a la BD caliente
+        history_path: Ruta de esa BD (decide el fichero de archivo)
+        days: Antigüedad mínima en días
+        dry_run: Solo contar, sin mover nada
+        vacuum: Compactar la BD caliente al terminar
+
+    Returns:
+        Dict con exams_archived, answers_archived, hot_answers, hot_bytes y
+        fits_in_cache (si la BD caliente cabe en el cache_size de la conexión)
+    """
+    age = f'-{int(days)} days'
+    report = {'database': history_path, 'archive': archive_path_for(history_path),
+              'exams_archived': 0, 'answers_archived': 0}
+
+    if dry_run:
+        row = hot.execute('''
+            SELECT COUNT(*), COALESCE(SUM(
+                (SELECT COUNT(*) FROM exam_answers ea WHERE ea.exam_id = e.id)
+            ), 0)
+            FROM exams e
+            WHERE e.archived_at IS NULL AND e.exam_date < datetime('now', ?)
+        ''', (age,)).fetchone()
+        report['exams_archived'], report['answers_archived'] = row[0], row[1]
+    else:
+        archive = _open_archive_for_write(history_path)
+        try:
+            while True:
+                ids = [row[0] for row in hot.execute('''
+                    SELECT id FROM exams
+                    WHERE archived_at IS NULL AND exam_date < datetime('now', ?)
+                    ORDER BY exam_date, id
+                    LIMIT ?
+                ''', (age, batch_size)).fetchall()]
+                if not ids:
+                    break
+                placeholders = ','.join('?' * len(ids))
+                archived_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+                exams = hot.execute(
+                    f"SELECT {', '.join(EXAM_COLUMNS)} FROM exams WHERE id IN ({placeholders})", ids
+                ).fetchall()
+                answers = hot.execute(
+                    f"SELECT {', '.join(ANSWER_COLUMNS)} FROM exam_answers "
+                    f"WHERE exam_id IN ({placeholders})", ids
+                ).fetchall()
+
+                # Fase 1: copia durable en el archivo (repetible sin duplicar)
+                with archive:
+                    archive.executemany(
+                        f"INSERT OR REPLACE INTO exams ({', '.join(EXAM_COLUMNS)}, archived_at) "
+                        f"VALUES ({', '.join('?' * len(EXAM_COLUMNS))}, ?)",
+                        [(*tuple(row), archived_at) for row in exams]
+                    )
+                    archive.executemany(
+                        f"INSERT OR REPLACE INTO exam_answers ({', '.join(ANSWER_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(ANSWER_COLUMNS))})",
+                        [tuple(row) for row in answers]
+                    )
+
+                # Fase 2: sacar las respuestas de la BD caliente y marcar el resumen
+                try:
+                    hot.execute('BEGIN IMMEDIATE')
+                    hot.execute(f'DELETE FROM exam_answers WHERE exam_id IN ({placeholders})', ids)
+                    hot.execute(
+                        f'UPDATE exams SET archived_at = ? WHERE id IN ({placeholders})',
+                        (archived_at, *ids)
+                    )
+                    hot.commit()
+                except Exception:
+                    hot.rollback()
+                    raise
+
+                report['exams_archived'] += len(exams)
+                report['answers_archived'] += len(answers)
+        finally:
+            archive.close()
+
+        if vacuum and report['exams_archived']:
+            hot.execute('VACUUM')
+            hot.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    report['hot_answers'] = hot.execute('SELECT COUNT(*) FROM exam_answers').fetchone()[0]
+    report['hot_bytes'] = _database_size(hot)
+    report['fits_in_cache'] = report['hot_bytes'] <= database.CACHE_SIZE_KB * 1024
+    return report
+
+def archive_old_exams(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                      dry_run: bool = False, vacuum: bool = False) -> List[Dict]:
+    """
+    Archiva los exámenes antiguos de la BD principal y de todos los shards
+
+    Returns:
+        Un informe por BD de historial (ver archive_database)
+    """
+    database.flush_write_behind()
+    reports = []
+    for history_path, connect in history_databases():
+        conn = connect()
+        try:
+            start = time.perf_counter()
+            report = archive_database(conn, history_path, days=days, batch_size=batch_size,
+                                      dry_run=dry_run, vacuum=vacuum)
+            report['seconds'] = round(time.perf_counter() - start, 3)
+            reports.append(report)
+        finally:
+            conn.close()
+    return reports
+
+if __name__ == '__main__':
+    days = ARCHIVE_AFTER_DAYS
+    if '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+    dry_run = '--dry-run' in sys.argv
+
+    print("="*60)
+    print(f"🗄️  ARCHIVADO DE EXÁMENES (más de {days} días)")
+    print("="*60 + "\n")
+
+    reports = archive_old_exams(days=days, dry_run=dry_run, vacuum='--vacuum' in sys.argv)
+    for report in reports:
+        verb = 'Se archivarían' if dry_run else 'Archivados'
+        print(f"📌 {report['database']}")
+        print(f"  {verb}: {report['exams_archived']} exámenes, {report['answers_archived']} respuestas")
+        print(f"  Respuestas en la BD caliente: {report['hot_answers']}")
+        print(f"  Tamaño de la BD caliente: {report['hot_bytes'] / (1024 * 1024):.2f} MB "
+              f"({'cabe' if report['fits_in_cache'] else 'NO cabe'} en la caché de página)")
+        if not dry_run:
+            print(f"  Archivo: {report['archive']} ({report['seconds']} s)")
+        print()
@@ -0,0 +1,538 @@
+"""
+backup.py - Copias de seguridad en caliente de MongoDB Quiz System
+
+Usa la API de backup online de SQLite (sqlite3.Connection.backup) copiando
+BACKUP_PAGES_PER_STEP páginas por paso y haciendo una pausa entre pasos, de
+modo que las peticiones en curso siguen leyendo y escribiendo mientras se
+copia. Cada snapshot es un directorio con la BD principal, los shards de
+historial (si los hay) y un manifest.json con las métricas de la copia.
+
+Uso:
+    python backup.py                      # Crea un snapshot ahora
+    python backup.py --list               # Lista los snapshots
+    python backup.py --restore NOMBRE     # Restaura un snapshot
+    python backup.py --prune N            # Conserva solo los N más recientes
+    python backup.py --schedule SEGUNDOS  # Snapshots periódicos (Ctrl+C para parar)
+    python backup.py --benchmark          # Latencia de peticiones con y sin backup
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+BACKUP_DIR = os.environ.get('QUIZ_BACKUP_DIR', 'backups')
+BACKUP_PAGES_PER_STEP = 64          # Páginas por paso (64 × 4 KB = 256 KB)
+BACKUP_STEP_SLEEP_SECONDS = 0.002   # Pausa entre pasos para ceder E/S a las peticiones
+BACKUP_MAX_RESTARTS = 5             # Reinicios tolerados antes de copiar en un solo paso
+BACKUP_RETENTION = 24               # Snapshots conservados por defecto
+SNAPSHOT_PREFIX = 'snapshot-'
+MANIFEST_NAME = 'manifest.json'
+
+class _TooManyRestarts(Exception):
+    """La BD cambió demasiadas veces durante una copia por pasos"""
+
+# ==================== COPIA DE UN FICHERO ====================
+
+def backup_file(source_path: str, dest_path: str, pages: int = BACKUP_PAGES_PER_STEP,
+                step_sleep: float = BACKUP_STEP_SLEEP_SECONDS) -> Dict:
+    """
+    Copia una BD SQLite en caliente con la API de backup online
+
+    Cada paso copia `pages` páginas y suelta el bloqueo de lectura antes de
+    la pausa. Si otra conexión escribe en la BD entre pasos, SQLite
+    reinicia la copia; tras BACKUP_MAX_RESTARTS reinicios se copia lo que
+    queda en un solo paso (en modo WAL eso no bloquea a los escritores).
+    La copia se escribe en un fichero temporal, se comprueba con
+    PRAGMA quick_check y solo entonces sustituye a dest_path.
+
+    Returns:
+        Dict con bytes, pages, page_size, steps, restarts, seconds,
+        mb_per_second, max_step_ms y single_step_fallback
+    """
+    tmp_path = dest_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    state = {'steps': 0, 'restarts': 0, 'max_step_ms': 0.0, 'remaining': None}
+
+    def progress(status, remaining, total):
+        step_ms = (time.perf_counter() - state['step_start']) * 1000
+        state['steps'] += 1
+        state['max_step_ms'] = max(state['max_step_ms'], step_ms)
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        if remaining and step_sleep > 0:
+            time.sleep(step_sleep)
+        state['step_start'] = time.perf_counter()
+
+    source = sqlite3.connect(source_path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    dest = sqlite3.connect(tmp_path)
+    fallback = False
+    start = time.perf_counter()
+    try:
+        state['step_start'] = start
+        try:
+            source.backup(dest, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            fallback = True
+            step_start = time.perf_counter()
+            source.backup(dest)
+            state['steps'] += 1
+            state['max_step_ms'] = max(state['max_step_ms'], (time.perf_counter() - step_start) * 1000)
+        seconds = time.perf_counter() - start
+
+        # El snapshot queda como un único fichero autocontenido
+        dest.execute('PRAGMA journal_mode=DELETE')
+        page_size = dest.execute('PRAGMA page_size').fetchone()[0]
+        page_count = dest.execute('PRAGMA page_count').fetchone()[0]
+        check = dest.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        dest.close()
+        source.close()
+
+    if check != 'ok':
+        os.remove(tmp_path)
+        raise RuntimeError(f'La copia de {source_path} no pasó quick_check: {check}')
+    os.replace(tmp_path, dest_path)
+
+    size = os.path.getsize(dest_path)
+    return {
+        'bytes': size,
+        'pages': page_count,
+        'page_size': page_size,
+        'steps': state['steps'],
+        'restarts': state['restarts'],
+        'single_step_fallback': fallback,
+        'seconds': round(seconds, 4),
+        'mb_per_second': round(size / (1024 * 1024) / seconds, 2) if seconds > 0 else None,
+        'max_step_ms': round(state['max_step_ms'], 3)
+    }
+
+# ==================== SNAPSHOTS ====================
+
+def _database_files() -> List[Tuple[str, str]]:
+    """
+    (nombre dentro del snapshot, ruta real) de la BD principal, los shards
+    existentes y sus ficheros de archivo (ver archive.py)
+    """
+    files = [(os.path.basename(database.DB_PATH), database.DB_PATH)]
+    router = database.get_shard_router()
+    if router is not None:
+        for index in router.existing_shards():
+            path = router.path_for_shard(index)
+            files.append((os.path.join('shards', os.path.basename(path)), path))
+    for entry_name, path in list(files):
+        archive_path = database.archive_path_for(path)
+        if os.path.exists(archive_path):
+            files.append((os.path.join(os.path.dirname(entry_name), os.path.basename(archive_path)),
+                          archive_path))
+    return files
+
+def _live_path(entry_name: str) -> str:
+    """Ruta real a la que se restaura un fichero del snapshot"""
+    if entry_name.startswith('shards' + os.sep) or entry_name.startswith('shards/'):
+        return os.path.join(database.SHARD_DIR, os.path.basename(entry_name))
+    if entry_name == os.path.basename(database.DB_PATH):
+        return database.DB_PATH
+    return os.path.join(os.path.dirname(database.DB_PATH), entry_name)
+
+def create_snapshot(label: Optional[str] = None, backup_dir: Optional[str] = None,
+                    pages: int = BACKUP_PAGES_PER_STEP,
+                    step_sleep: float = BACKUP_STEP_SLEEP_SECONDS) -> Dict:
+    """
+    Crea un snapshot de la BD principal, los shards de historial y los archivos
+
+    Los ficheros se copian por separado: el snapshot de cada uno es
+    consistente, y los envíos ya aceptados por la escritura diferida se
+    confirman antes de empezar.
+
+    Args:
+        label: Etiqueta opcional que se añade al nombre
+        backup_dir: Directorio de snapshots (default: BACKUP_DIR)
+
+    Returns:
+        Manifest del snapshot (nombre, ficheros y métricas)
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    database.flush_write_behind()
+
+    name = SNAPSHOT_PREFIX + datetime.now().strftime('%Y%m%d-%H%M%S')
+    if label:
+        name += '-' + label
+    final_dir = os.path.join(backup_dir, name)
+    suffix = 2
+    while os.path.exists(final_dir):
+        final_dir = os.path.join(backup_dir, f'{name}-{suffix}')
+        suffix += 1
+    name = os.path.basename(final_dir)
+
+    work_dir = final_dir + '.partial'
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+
+    files = []
+    start = time.perf_counter()
+    try:
+        for entry_name, source_path in _database_files():
+            dest_path = os.path.join(work_dir, entry_name)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            report = backup_file(source_path, dest_path, pages=pages, step_sleep=step_sleep)
+            files.append({'name': entry_name, 'source': source_path, **report})
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    seconds = time.perf_counter() - start
+
+    total_bytes = sum(f['bytes'] for f in files)
+    manifest = {
+        'name': name,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'label': label,
+        'files': files,
+        'total_bytes': total_bytes,
+        'seconds': round(seconds, 4),
+        'mb_per_second': round(total_bytes / (1024 * 1024) / seconds, 2) if seconds > 0 else None,
+        'max_step_ms': max(f['max_step_ms'] for f in files)
+    }
+    with open(os.path.join(work_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(work_dir, final_dir)
+    return manifest
+
+def list_snapshots(backup_dir: Optional[str] = None) -> List[Dict]:
+    """Manifests de los snapshots completos, del más reciente al más antiguo"""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(backup_dir):
+        manifest_path = os.path.join(backup_dir, name, MANIFEST_NAME)
+        if name.startswith(SNAPSHOT_PREFIX) and os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+    snapshots.sort(key=lambda m: (m['created_at'], m['name']), reverse=True)
+    return snapshots
+
+def prune_snapshots(keep: int = BACKUP_RETENTION, backup_dir: Optional[str] = None) -> List[str]:
+    """
+    Borra los snapshots más antiguos dejando solo `keep`
+
+    Returns:
+        Nombres de los snapshots borrados
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    removed = []
+    for manifest in list_snapshots(backup_dir)[keep:]:
+        shutil.rmtree(os.path.join(backup_dir, manifest['name']))
+        removed.append(manifest['name'])
+    return removed
+
+def _remove_database_file(path: str):
+    """Borra un fichero SQLite junto con su -wal y su -shm"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def restore_snapshot(name: str, backup_dir: Optional[str] = None,
+                     safety_snapshot: bool = True) -> Dict:
+    """
+    Restaura la BD principal y los shards al estado de un snapshot
+
+    La copia hacia los ficheros en uso también pasa por la API de backup,
+    así que respeta los bloqueos de otras conexiones. Los shards y los
+    ficheros de archivo que no existían al crear el snapshot se eliminan.
+
+    Args:
+        name: Nombre del snapshot (ver list_snapshots)
+        safety_snapshot: Crear antes un snapshot 'pre-restore' del estado actual
+
+    Returns:
+        Dict con restored, files y safety_snapshot
+
+    Raises:
+        FileNotFoundError: si el snapshot no existe
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    snapshot_dir = os.path.join(backup_dir, name)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f'No existe el snapshot {name!r} en {backup_dir}')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    safety = create_snapshot(label='pre-restore', backup_dir=backup_dir) if safety_snapshot else None
+    database.flush_write_behind()
+
+    restored_paths = set()
+    for entry in manifest['files']:
+        target_path = _live_path(entry['name'])
+        os.makedirs(os.path.dirname(target_path) or '.', exist_ok=True)
+        source = sqlite3.connect(os.path.join(snapshot_dir, entry['name']))
+        target = sqlite3.connect(target_path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        restored_paths.add(os.path.abspath(target_path))
+
+    # Conexiones y caché del banco se vuelven a abrir con el contenido restaurado
+    database.close_pool()
+    database.close_shards()
+
+    history_paths = [database.DB_PATH]
+    router = database.get_shard_router()
+    if router is not None:
+        for index in router.existing_shards():
+            path = router.path_for_shard(index)
+            if os.path.abspath(path) in restored_paths:
+                history_paths.append(path)
+            else:
+                _remove_database_file(path)
+                _remove_database_file(database.archive_path_for(path))
+    for path in history_paths:
+        archive_path = database.archive_path_for(path)
+        if os.path.abspath(archive_path) not in restored_paths:
+            _remove_database_file(archive_path)
+
+    return {
+        'restored': name,
+        'files': len(manifest['files']),
+        'safety_snapshot': safety['name'] if safety else None
+    }
+
+# ==================== SNAPSHOTS PROGRAMADOS ====================
+
+class SnapshotScheduler:
+    """Hilo que crea un snapshot cada interval_seconds y aplica la retención"""
+
+    def __init__(self, interval_seconds: float, retention: int = BACKUP_RETENTION,
+                 backup_dir: Optional[str] = None):
+        self.interval_seconds = interval_seconds
+        self.retention = retention
+        self.backup_dir = backup_dir
+        self.snapshots_taken = 0
+        self.last_snapshot: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='quiz-backup', daemon=True)
+
+    def start(self) -> 'SnapshotScheduler':
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    def run_once(self) -> Dict:
+        manifest = create_snapshot(backup_dir=self.backup_dir)
+        prune_snapshots(self.retention, backup_dir=self.backup_dir)
+        self.snapshots_taken += 1
+        self.last_snapshot = manifest
+        self.last_error = None
+        return manifest
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:  # Un fallo puntual no debe parar los siguientes snapshots
+                self.last_error = str(e)
+
+    def stats(self) -> Dict:
+        last = self.last_snapshot
+        return {
+            'interval_seconds': self.interval_seconds,
+            'retention': self.retention,
+            'snapshots_taken': self.snapshots_taken,
+            'last_snapshot': last['name'] if last else None,
+            'last_seconds': last['seconds'] if last else None,
+            'last_mb_per_second': last['mb_per_second'] if last else None,
+            'last_error': self.last_error,
+            'running': self._thread.is_alive()
+        }
+
+_scheduler: Optional[SnapshotScheduler] = None
+
+def start_backup_scheduler(interval_seconds: float, retention: int = BACKUP_RETENTION,
+                           backup_dir: Optional[str] = None) -> SnapshotScheduler:
+    """Arranca los snapshots periódicos (uno por proceso)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SnapshotScheduler(interval_seconds, retention, backup_dir).start()
+    return _scheduler
+
+def get_backup_scheduler_stats() -> Optional[Dict]:
+    return _scheduler.stats() if _scheduler is not None else None
+
+# ==================== BENCHMARK ====================
+
+def _latency_summary(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {'ops': 0}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        'ops': len(ordered),
+        'p50_ms': round(pick(0.50), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1], 3)
+    }
+
+def _run_workload(operations: int, user_id: str, question_ids: List[int],
+                  categories: Dict[int, int]) -> List[float]:
+    """Mezcla de envíos de examen y lecturas del historial; devuelve latencias en ms"""
+    latencies = []
+    for i in range(operations):
+        start = time.perf_counter()
+        if i % 4 == 0:
+            database.record_exam_submission(
+                total_questions=len(question_ids), correct_answers=1, score=50.0,
+                selected_categories='[]', time_spent_seconds=60,
+                answers=[
+                    {'question_id': qid, 'category_id': categories[qid],
+                     'user_answer': 'a', 'is_correct': qid == question_ids[0]}
+                    for qid in question_ids
+                ],
+                user_id=user_id
+            )
+        else:
+            database.get_exam_history_page(limit=20, user_id=user_id)
+            database.get_overall_stats(user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.001)  # Ritmo de peticiones, no un bucle cerrado
+    return latencies
+
+def run_benchmark(operations: int = 400) -> Dict:
+    """
+    Mide la latencia de peticiones típicas sin backup y durante un backup
+
+    Trabaja sobre una copia temporal de la BD principal, así que no
+    modifica los datos reales.
+    """
+    original_db, original_shards = database.DB_PATH, database.SHARD_COUNT
+    work_dir = tempfile.mkdtemp(prefix='quiz-backup-bench-')
+    try:
+        copy_path = os.path.join(work_dir, 'bench.db')
+        backup_file(database.DB_PATH, copy_path, pages=-1, step_sleep=0)
+        database.configure_pool(db_path=copy_path)
+        database.configure_shards(shard_count=0)
+
+        questions = database.get_random_questions(limit=10)
+        question_ids = [q['id'] for q in questions]
+        categories = {q['id']: q['category_id'] for q in questions}
+
+        idle = _run_workload(operations, 'benchmark', question_ids, categories)
+
+        reports = []
+        def backup_loop(stop: threading.Event):
+            while not stop.is_set():
+                reports.append(backup_file(copy_path, os.path.join(work_dir, 'snapshot.db')))
+
+        stop = threading.Event()
+        worker = threading.Thread(target=backup_loop, args=(stop,))
+        worker.start()
+        during = _run_workload(operations, 'benchmark', question_ids, categories)
+        stop.set()
+        worker.join()
+
+        return {
+            'database_bytes': os.path.getsize(copy_path),
+            'idle': _latency_summary(idle),
+            'during_backup': _latency_summary(during),
+            'backups_completed': len(reports),
+            'backup_mb_per_second': round(sum(r['mb_per_second'] or 0 for r in reports) / len(reports), 2),
+            'backup_restarts': sum(r['restarts'] for r in reports),
+            'backup_single_step_fallbacks': sum(1 for r in reports if r['single_step_fallback']),
+            'backup_max_step_ms': max(r['max_step_ms'] for r in reports)
+        }
+    finally:
+        database.configure_pool(db_path=original_db)
+        database.configure_shards(shard_count=original_shards)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _format_size(size: int) -> str:
+    return f"{size / (1024 * 1024):.2f} MB"
+
+if __name__ == '__main__':
+    print("="*60)
+    print("💾 COPIAS DE SEGURIDAD")
+    print("="*60 + "\n")
+
+    if '--list' in sys.argv:
+        snapshots = list_snapshots()
+        if not snapshots:
+            print("  (no hay snapshots)")
+        for manifest in snapshots:
+            print(f"  • {manifest['name']}  {_format_size(manifest['total_bytes'])}  "
+                  f"{len(manifest['files'])} fichero(s)  {manifest['mb_per_second']} MB/s")
+
+    elif '--restore' in sys.argv:
+        name = sys.argv[sys.argv.index('--restore') + 1]
+        try:
+            result = restore_snapshot(name)
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Restaurado {result['restored']} ({result['files']} fichero(s))")
+        if result['safety_snapshot']:
+            print(f"  Estado anterior guardado en {result['safety_snapshot']}")
+
+    elif '--prune' in sys.argv:
+        keep = int(sys.argv[sys.argv.index('--prune') + 1])
+        removed = prune_snapshots(keep)
+        print(f"🗑️  Snapshots eliminados: {len(removed)}")
+        for name in removed:
+            print(f"  • {name}")
+
+    elif '--schedule' in sys.argv:
+        interval = float(sys.argv[sys.argv.index('--schedule') + 1])
+        scheduler = SnapshotScheduler(interval)
+        print(f"⏱️  Snapshot cada {interval:g} s, conservando {scheduler.retention}. Ctrl+C para parar.\n")
+        try:
+            while True:
+                manifest = scheduler.run_once()
+                print(f"  ✓ {manifest['name']}  {_format_size(manifest['total_bytes'])}  "
+                      f"{manifest['seconds']} s  {manifest['mb_per_second']} MB/s")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\n⏹️  Detenido")
+
+    elif '--benchmark' in sys.argv:
+        report = run_benchmark()
+        print(f"📊 BD de {_format_size(report['database_bytes'])}, "
+              f"{report['idle']['ops']} peticiones por escenario\n")
+        print(f"{'escenario':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for label, key in (('sin backup', 'idle'), ('durante backup', 'during_backup')):
+            stats = report[key]
+            print(f"{label:<16} {stats['p50_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}")
+        print(f"\n  Backups completados: {report['backups_completed']} "
+              f"({report['backup_mb_per_second']} MB/s de media)")
+        print(f"  Reinicios por escrituras: {report['backup_restarts']} "
+              f"(copias en un solo paso: {report['backup_single_step_fallbacks']})")
+        print(f"  Paso más largo: {report['backup_max_step_ms']} ms")
+
+    else:
+        manifest = create_snapshot()
+        print(f"✅ Snapshot {manifest['name']}")
+        for entry in manifest['files']:
+            print(f"  • {entry['name']}: {_format_size(entry['bytes'])} en {entry['steps']} pasos, "
+                  f"{entry['mb_per_second']} MB/s, paso más largo {entry['max_step_ms']} ms")
+        removed = prune_snapshots()
+        if removed:
+            print(f"  🗑️  {len(removed)} snapshot(s) antiguos eliminados")
+
+    print()
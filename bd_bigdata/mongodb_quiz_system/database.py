@@ -4,95 +4,453 @@ database.py - Módulo de gestión de base de datos SQLite para MongoDB Quiz Syst
 
 import sqlite3
 import json
-from datetime import datetime
+import os
+import re
+import atexit
+import queue
+import threading
+import weakref
+import random
+import time
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FuturesTimeout
+from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple
 
+from migrations import (
+    apply_migrations,
+    rebuild_stats_summary,
+    rebuild_user_stats,
+    DEFAULT_USER_ID,
+    SHARD_MIGRATIONS
+)
+from db_instrumentation import InstrumentedCursor, recorder as _query_recorder
+from spaced_repetition import (
+    NEW_REVIEW_STATE, REVIEW_DATE_FORMAT, review_quality, sm2_review, due_date_after
+)
+
 DB_PATH = 'mongodb_quiz.db'
 
-def get_connection():
-    """Obtiene una conexión a la base de datos"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
-    return conn
+# ==================== POOL DE CONEXIONES ====================
 
-def init_database():
-    """Inicializa la base de datos creando todas las tablas"""
-    conn = get_connection()
-    cursor = conn.cursor()
+POOL_SIZE = 8                 # Conexiones máximas abiertas por proceso
+POOL_TIMEOUT_SECONDS = 30     # Espera máxima por una conexión libre
+BUSY_TIMEOUT_MS = 5000        # Espera de SQLite ante bloqueos de escritura
+CACHE_SIZE_KB = 16384         # cache_size por conexión (16 MB)
+MMAP_SIZE_BYTES = 128 * 1024 * 1024
 
-    # Tabla: categories
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            description TEXT,
-            session_number INTEGER
-        )
-    ''')
+class PooledConnection(sqlite3.Connection):
+    """
+    Conexión SQLite reutilizable.
 
-    # Tabla: questions
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category_id INTEGER NOT NULL,
-            question_type TEXT NOT NULL CHECK(question_type IN ('conceptual', 'syntax')),
-            question_text TEXT NOT NULL,
-            option_a TEXT NOT NULL,
-            option_b TEXT NOT NULL,
-            option_c TEXT NOT NULL,
-            option_d TEXT NOT NULL,
-            option_e TEXT NOT NULL,
-            correct_answer TEXT NOT NULL CHECK(correct_answer IN ('a', 'b', 'c', 'd', 'e')),
-            explanation TEXT NOT NULL,
-            dataset_reference TEXT,
-            difficulty TEXT NOT NULL CHECK(difficulty IN ('easy', 'medium', 'hard')),
-            FOREIGN KEY (category_id) REFERENCES categories (id)
-        )
-    ''')
+    close() no cierra la conexión: deshace cualquier transacción pendiente
+    y la devuelve al pool, de modo que el patrón existente
+    get_connection() / conn.close() sigue funcionando sin abrir una
+    conexión nueva por cada consulta. Un segundo close() sobre una conexión
+    ya devuelta no hace nada (no puede entrar dos veces en el pool).
+    """
 
-    # Tabla: exams
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS exams (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            exam_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            total_questions INTEGER DEFAULT 20,
-            correct_answers INTEGER,
-            score REAL,
-            selected_categories TEXT,
-            time_spent_seconds INTEGER
-        )
-    ''')
+    _pool = None
+    _finalizer = None
+    _released = False  # True mientras está libre en el pool
 
-    # Tabla: exam_answers
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS exam_answers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            exam_id INTEGER NOT NULL,
-            question_id INTEGER NOT NULL,
-            user_answer TEXT NOT NULL CHECK(user_answer IN ('a', 'b', 'c', 'd', 'e')),
-            is_correct BOOLEAN NOT NULL,
-            time_spent_seconds INTEGER,
-            FOREIGN KEY (exam_id) REFERENCES exams (id),
-            FOREIGN KEY (question_id) REFERENCES questions (id)
-        )
-    ''')
+    def cursor(self, factory=None):
+        # Con la instrumentación activa, todos los cursores (incluidos los de
+        # conn.execute) miden sus sentencias
+        if factory is None:
+            factory = InstrumentedCursor if _query_recorder.enabled else sqlite3.Cursor
+        return super().cursor(factory)
 
-    # Tabla: study_progress
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS study_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category_id INTEGER NOT NULL UNIQUE,
-            questions_answered INTEGER DEFAULT 0,
-            questions_correct INTEGER DEFAULT 0,
-            last_study_date TIMESTAMP,
-            FOREIGN KEY (category_id) REFERENCES categories (id)
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            super().close()
+            return
+        if self._released:
+            return
+        if self.in_transaction:
+            self.rollback()
+        self._released = True
+        pool.release(self)
+
+    def close_permanently(self):
+        """Cierra realmente la conexión (usado al apagar el pool)"""
+        self._pool = None
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        super().close()
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite con pragmas ajustados.
+
+    Las conexiones se crean bajo demanda hasta pool_size y se reutilizan
+    entre peticiones. Cada conexión se abre en modo WAL para que las
+    lecturas no bloqueen a la escritura y viceversa.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT_SECONDS):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False  # La conexión puede cambiar de hilo al volver al pool
         )
-    ''')
+        conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}')
+        conn.execute(f'PRAGMA cache_size={-int(CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(MMAP_SIZE_BYTES)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn._pool = self
+        # Si una conexión prestada se pierde (p. ej. por una excepción antes
+        # de conn.close()), liberar su cupo cuando el recolector la destruya
+        conn._finalizer = weakref.finalize(conn, self._forget)
+        return conn
 
-    conn.commit()
-    conn.close()
+    def _forget(self):
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self) -> PooledConnection:
+        """Obtiene una conexión libre, creando una nueva si hay cupo"""
+        conn = self._acquire()
+        conn._released = False
+        return conn
+
+    def _acquire(self) -> PooledConnection:
+        if self._closed:
+            raise RuntimeError('El pool de conexiones está cerrado')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(
+                f'No hay conexiones libres tras {self.timeout}s (pool_size={self.pool_size})'
+            )
+
+    def release(self, conn: PooledConnection):
+        """Devuelve una conexión al pool"""
+        if self._closed:
+            conn.close_permanently()
+            self._forget()
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        """Cierra todas las conexiones libres y rechaza nuevas peticiones"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close_permanently()
+            self._forget()
+
+    def stats(self) -> Dict:
+        """Estado actual del pool"""
+        return {
+            'db_path': self.db_path,
+            'pool_size': self.pool_size,
+            'open_connections': self._created,
+            'idle_connections': self._idle.qsize()
+        }
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def configure_pool(db_path: Optional[str] = None, pool_size: Optional[int] = None):
+    """
+    Reconfigura el pool de conexiones (cierra el anterior si existía)
+
+    Args:
+        db_path: Ruta de la base de datos (default: DB_PATH)
+        pool_size: Número máximo de conexiones (default: POOL_SIZE)
+    """
+    global _pool, DB_PATH, POOL_SIZE
+    with _pool_lock:
+        if db_path is not None:
+            DB_PATH = db_path
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DB_PATH, POOL_SIZE)
+    _bank_cache.invalidate()
+
+def close_pool():
+    """Cierra todas las conexiones del pool (apagado limpio)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    _bank_cache.invalidate()
+
+def get_pool_stats() -> Optional[Dict]:
+    """Devuelve el estado del pool o None si todavía no se ha creado"""
+    return _pool.stats() if _pool is not None else None
+
+atexit.register(close_pool)
+
+def enable_query_instrumentation(slow_ms: Optional[float] = None, capture_plans: bool = True):
+    """
+    Activa la medición de cada sentencia SQL (ver db_instrumentation.py)
+
+    Args:
+        slow_ms: Umbral a partir del cual se captura EXPLAIN QUERY PLAN
+        capture_plans: Si False, no se capturan planes
+    """
+    _query_recorder.enable(slow_ms=slow_ms, capture_plans=capture_plans)
+
+def disable_query_instrumentation():
+    """Desactiva la medición de sentencias (las métricas se conservan)"""
+    _query_recorder.disable()
+
+def is_query_instrumentation_enabled() -> bool:
+    """Indica si la medición de sentencias está activa"""
+    return _query_recorder.enabled
+
+def get_query_stats() -> List[Dict]:
+    """Métricas por sentencia normalizada, ordenadas por tiempo total"""
+    return _query_recorder.snapshot()
+
+def reset_query_stats():
+    """Borra las métricas acumuladas"""
+    _query_recorder.reset()
+
+def get_connection():
+    """
+    Obtiene una conexión del pool.
+
+    Llamar a conn.close() la devuelve al pool en lugar de cerrarla.
+    """
+    global _pool
+    pool = _pool
+    if pool is None or pool.db_path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.db_path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                    _bank_cache.invalidate()  # Otra BD: descartar la caché del banco
+                _pool = ConnectionPool(DB_PATH, POOL_SIZE)
+            pool = _pool
+    return pool.acquire()
+
+def migrate_database() -> List[int]:
+    """
+    Aplica las migraciones de esquema pendientes (ver migrations.py)
+
+    Returns:
+        Lista de versiones aplicadas
+    """
+    conn = get_connection()
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
+def init_database():
+    """Inicializa la base de datos creando todas las tablas e índices"""
+    migrate_database()
     print("✅ Base de datos inicializada correctamente")
 
+# ==================== HISTORIAL POR USUARIO (SHARDS) ====================
+
+SHARD_COUNT = int(os.environ.get('QUIZ_DB_SHARDS', '0'))  # 0 = historial en la BD principal
+SHARD_DIR = os.environ.get('QUIZ_DB_SHARD_DIR', 'shards')
+SHARD_POOL_SIZE = 4           # Conexiones máximas por fichero de historial
+MAX_USER_ID_LENGTH = 64
+
+def normalize_user_id(user_id: Optional[str]) -> str:
+    """
+    Limpia un identificador de usuario (vacío = DEFAULT_USER_ID)
+
+    Raises:
+        ValueError: si supera MAX_USER_ID_LENGTH caracteres
+    """
+    user_id = (user_id or '').strip()
+    if not user_id:
+        return DEFAULT_USER_ID
+    if len(user_id) > MAX_USER_ID_LENGTH:
+        raise ValueError(f'El usuario no puede superar {MAX_USER_ID_LENGTH} caracteres')
+    return user_id
+
+class ShardRouter:
+    """
+    Reparte el historial de los usuarios entre varios ficheros SQLite
+
+    El banco de preguntas sigue en la BD principal (DB_PATH, casi solo
+    lectura). Exámenes, respuestas y progreso de cada usuario van al fichero
+    SHARD_DIR/history_NN.db elegido por un hash estable (CRC32) del user_id,
+    cada uno con su propio pool de conexiones. Cada fichero tiene su propio
+    bloqueo de escritura, así que usuarios de shards distintos escriben en
+    paralelo.
+    """
+
+    def __init__(self, shard_count: int, shard_dir: str, pool_size: int = SHARD_POOL_SIZE):
+        if shard_count < 1:
+            raise ValueError('shard_count debe ser al menos 1')
+        self.shard_count = shard_count
+        self.shard_dir = shard_dir
+        self.pool_size = pool_size
+        self._pools: Dict[int, ConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def shard_for(self, user_id: str) -> int:
+        """Índice de shard del usuario (estable entre procesos y reinicios)"""
+        return zlib.crc32(user_id.encode('utf-8')) % self.shard_count
+
+    def path_for_shard(self, index: int) -> str:
+        return os.path.join(self.shard_dir, f'history_{index:02d}.db')
+
+    def _pool_for_shard(self, index: int) -> ConnectionPool:
+        pool = self._pools.get(index)
+        if pool is not None:
+            return pool
+        with self._lock:
+            pool = self._pools.get(index)
+            if pool is None:
+                os.makedirs(self.shard_dir, exist_ok=True)
+                pool = ConnectionPool(self.path_for_shard(index), self.pool_size)
+                conn = pool.acquire()
+                try:
+                    apply_migrations(conn, migrations=SHARD_MIGRATIONS)
+                finally:
+                    conn.close()
+                self._pools[index] = pool
+        return pool
+
+    def connection(self, user_id: str) -> PooledConnection:
+        """Conexión del pool del shard del usuario"""
+        return self._pool_for_shard(self.shard_for(user_id)).acquire()
+
+    def existing_shards(self) -> List[int]:
+        """Shards cuyo fichero ya existe en disco"""
+        return [i for i in range(self.shard_count) if os.path.exists(self.path_for_shard(i))]
+
+    def shard_connection(self, index: int) -> PooledConnection:
+        return self._pool_for_shard(index).acquire()
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'shard_count': self.shard_count,
+            'shard_dir': self.shard_dir,
+            'open_shards': {i: pool.stats() for i, pool in sorted(self._pools.items())}
+        }
+
+_router: Optional[ShardRouter] = None
+_router_lock = threading.Lock()
+
+def configure_shards(shard_count: Optional[int] = None, shard_dir: Optional[str] = None):
+    """
+    Reconfigura el reparto del historial (0 shards = todo en la BD principal)
+
+    Cambiar el número de shards reasigna usuarios a otros ficheros; el
+    historial ya guardado no se mueve.
+    """
+    global SHARD_COUNT, SHARD_DIR
+    close_shards()
+    with _router_lock:
+        if shard_count is not None:
+            SHARD_COUNT = shard_count
+        if shard_dir is not None:
+            SHARD_DIR = shard_dir
+
+def close_shards():
+    """Cierra los pools de todos los shards"""
+    global _router
+    with _router_lock:
+        if _router is not None:
+            _router.close()
+            _router = None
+
+atexit.register(close_shards)
+
+def get_shard_router() -> Optional[ShardRouter]:
+    """Router de shards actual, o None si el historial vive en la BD principal"""
+    global _router
+    if SHARD_COUNT <= 0:
+        return None
+    router = _router
+    if router is None or router.shard_count != SHARD_COUNT or router.shard_dir != SHARD_DIR:
+        with _router_lock:
+            if _router is None or _router.shard_count != SHARD_COUNT or _router.shard_dir != SHARD_DIR:
+                if _router is not None:
+                    _router.close()
+                _router = ShardRouter(SHARD_COUNT, SHARD_DIR)
+            router = _router
+    return router
+
+def history_shard_for(user_id: str) -> Optional[int]:
+    """Shard del usuario (None si no hay sharding)"""
+    router = get_shard_router()
+    return router.shard_for(user_id) if router is not None else None
+
+def get_history_connection(user_id: str = DEFAULT_USER_ID):
+    """
+    Conexión a la BD que guarda el historial del usuario
+
+    Sin sharding es la BD principal; con sharding, el fichero de su shard.
+    Como get_connection(), conn.close() la devuelve a su pool.
+    """
+    router = get_shard_router()
+    if router is None:
+        return get_connection()
+    return router.connection(user_id)
+
+def _history_connections() -> List:
+    """Una conexión por cada BD con historial (la principal y los shards existentes)"""
+    connections = [get_connection()]
+    router = get_shard_router()
+    if router is not None:
+        connections.extend(router.shard_connection(i) for i in router.existing_shards())
+    return connections
+
+def get_shard_stats() -> Optional[Dict]:
+    router = get_shard_router()
+    return router.stats() if router is not None else None
+
 # ==================== FUNCIONES PARA CATEGORIES ====================
 
 def insert_category(name: str, description: str, session_number: int) -> int:
@@ -106,25 +464,415 @@ def insert_category(name: str, description: str, session_number: int) -> int:
     category_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    _bank_cache.invalidate()
     return category_id
 
 def get_all_categories() -> List[Dict]:
-    """Obtiene todas las categorías"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM categories ORDER BY session_number')
-    categories = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return categories
+    """Obtiene todas las categorías (desde la caché del banco)"""
+    return [dict(category) for category in _bank_cache.snapshot().categories]
 
 def get_category_by_id(category_id: int) -> Optional[Dict]:
-    """Obtiene una categoría por su ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM categories WHERE id = ?', (category_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    """Obtiene una categoría por su ID (desde la caché del banco)"""
+    category = _bank_cache.snapshot().categories_by_id.get(category_id)
+    return dict(category) if category else None
+
+# ==================== FILAS COMPACTAS DE PREGUNTAS ====================
+
+# Columnas de questions en el orden en que se leen y se guardan en QuestionRow
+QUESTION_COLUMNS = ('id', 'category_id', 'question_type', 'question_text',
+                    'option_a', 'option_b', 'option_c', 'option_d', 'option_e',
+                    'correct_answer', 'explanation', 'dataset_reference', 'difficulty')
+
+class _RowAccess:
+    """
+    Acceso estilo dict para las filas compactas (namedtuple).
+
+    Permite row['campo'], row.get('campo'), 'campo' in row, row.keys() y
+    dict(row), así que el código y las plantillas Jinja que trataban las
+    preguntas como dicts siguen funcionando (Jinja resuelve q.campo por
+    atributo y q['campo'] por __getitem__). Los enteros siguen indexando la
+    tupla. Al iterar se recorren los valores, como en cualquier tupla.
+    """
+
+    __slots__ = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def get(self, key: str, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def to_dict(self) -> Dict:
+        """Copia mutable como dict (p. ej. para serializar a JSON)"""
+        return dict(zip(self._fields, self))
+
+def _make_record_type(name: str, fields: Tuple[str, ...]) -> type:
+    base = namedtuple(f'_{name}', fields)
+    return type(name, (_RowAccess, base), {
+        '__slots__': (),
+        '_index': {field: i for i, field in enumerate(fields)}
+    })
+
+QuestionRow = _make_record_type('QuestionRow', QUESTION_COLUMNS)
+QuestionRow.__doc__ = """
+    Pregunta de solo lectura respaldada por una tupla (sin __dict__).
+
+    Ocupa una fracción de lo que ocupa un dict por fila, así que la caché del
+    banco guarda QuestionRow y las funciones de lectura devuelven esas mismas
+    instancias compartidas en lugar de copiarlas en cada petición. Para una
+    copia modificable usar row.to_dict().
+    """
+
+_projections: Dict[Tuple[str, ...], type] = {QUESTION_COLUMNS: QuestionRow}
+
+def question_projection(fields) -> type:
+    """
+    Tipo de fila con solo las columnas pedidas (mismo acceso que QuestionRow)
+
+    Raises:
+        ValueError: si alguna columna no existe en questions
+    """
+    fields = tuple(fields)
+    record = _projections.get(fields)
+    if record is None:
+        unknown = [field for field in fields if field not in QuestionRow._index]
+        if unknown or not fields:
+            raise ValueError(f'Columnas de questions no válidas: {unknown or fields}')
+        record = _make_record_type('QuestionProjection', fields)
+        _projections[fields] = record
+    return record
+
+def _project(rows: Dict[int, QuestionRow], fields) -> Dict[int, tuple]:
+    """Reduce filas completas a la proyección de fields (None = sin tocar)"""
+    if fields is None:
+        return rows
+    record = question_projection(fields)
+    if record is QuestionRow:
+        return rows
+    indexes = [QuestionRow._index[field] for field in record._fields]
+    return {qid: record._make([row[i] for i in indexes]) for qid, row in rows.items()}
+
+# ==================== CACHÉ DEL BANCO DE PREGUNTAS ====================
+
+CACHE_REVALIDATE_SECONDS = 5  # Cada cuánto se comprueba content_version en la BD
+
+class _BankSnapshot:
+    """Copia inmutable de categorías y preguntas para una versión de contenido"""
+
+    __slots__ = ('version', 'categories', 'categories_by_id', 'questions',
+                 'ids_by_category', 'checked_at')
+
+    def __init__(self, version: int, categories: List[Dict], questions: Dict[int, QuestionRow]):
+        self.version = version
+        self.categories = categories
+        self.categories_by_id = {c['id']: c for c in categories}
+        self.questions = questions
+        self.ids_by_category: Dict[int, List[int]] = {}
+        for question_id, question in questions.items():
+            self.ids_by_category.setdefault(question.category_id, []).append(question_id)
+        self.checked_at = time.monotonic()
+
+class QuestionBankCache:
+    """
+    Caché en memoria (read-through) del banco de preguntas y las categorías.
+
+    Las preguntas y categorías casi nunca cambian después de init_db.py, así
+    que se cargan una vez y se sirven desde memoria. La BD guarda una versión
+    de contenido (tabla content_version, mantenida por triggers) que se
+    revalida como mucho cada CACHE_REVALIDATE_SECONDS; las escrituras hechas
+    desde este proceso (insert_question / insert_category) invalidan la
+    caché al momento.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[_BankSnapshot] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def invalidate(self):
+        """Descarta la copia en memoria; se recargará en el siguiente acceso"""
+        self._snapshot = None
+
+    def stats(self) -> Dict:
+        """Contadores de aciertos y fallos de la caché"""
+        snapshot = self._snapshot
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'hit_rate': round(self.hits / total * 100, 2) if total else 0,
+            'content_version': snapshot.version if snapshot else None,
+            'cached_questions': len(snapshot.questions) if snapshot else 0,
+            'cached_categories': len(snapshot.categories) if snapshot else 0
+        }
+
+    @staticmethod
+    def _read_version(cursor: sqlite3.Cursor) -> int:
+        try:
+            cursor.execute('SELECT version FROM content_version WHERE id = 1')
+        except sqlite3.OperationalError:
+            return 0  # BD sin migrar: solo se invalida por tiempo o en proceso
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def snapshot(self) -> _BankSnapshot:
+        """Devuelve la copia vigente, recargándola si la versión cambió"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < CACHE_REVALIDATE_SECONDS:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - snapshot.checked_at < CACHE_REVALIDATE_SECONDS:
+                self.hits += 1
+                return snapshot
+
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN')  # Lectura consistente de versión + contenido
+                version = self._read_version(cursor)
+                if snapshot is not None and snapshot.version == version and version != 0:
+                    snapshot.checked_at = time.monotonic()
+                    self.revalidations += 1
+                    self.hits += 1
+                    return snapshot
+
+                self.misses += 1
+                cursor.execute('SELECT * FROM categories ORDER BY session_number')
+                categories = [dict(row) for row in cursor.fetchall()]
+                cursor.row_factory = None  # Tuplas: se convierten directamente en QuestionRow
+                cursor.execute(f"SELECT {', '.join(QUESTION_COLUMNS)} FROM questions ORDER BY id")
+                questions = {row[0]: QuestionRow._make(row) for row in cursor.fetchall()}
+            finally:
+                conn.close()
+
+            snapshot = _BankSnapshot(version, categories, questions)
+            self._snapshot = snapshot
+            _sampler.invalidate()
+            return snapshot
+
+_bank_cache = QuestionBankCache()
+
+def get_question_cache_stats() -> Dict:
+    """Contadores de la caché del banco de preguntas (hits/misses)"""
+    return _bank_cache.stats()
+
+def invalidate_question_cache():
+    """Fuerza la recarga del banco de preguntas en el siguiente acceso"""
+    _bank_cache.invalidate()
+
+def get_question_bank_version() -> int:
+    """Versión de contenido del banco en caché (se revalida si toca)"""
+    return _bank_cache.snapshot().version
+
+# ==================== MUESTREO DE PREGUNTAS ====================
+
+SAMPLER_VIEW_CACHE_SIZE = 256  # Combinaciones de filtros resueltas que se conservan
+
+# Vista de un filtro: (arrays de IDs, offset acumulado de cada array, total)
+SamplerView = Tuple[List[array], List[int], int]
+
+class _SamplerIndex:
+    """Cubos de IDs de una versión del banco y las vistas por filtro ya resueltas"""
+
+    __slots__ = ('source', 'buckets', 'views')
+
+    def __init__(self, snapshot: _BankSnapshot):
+        buckets: Dict[Tuple[int, str, str], array] = {}
+        for question_id, question in snapshot.questions.items():
+            key = (question.category_id, question.difficulty, question.question_type)
+            if key not in buckets:
+                buckets[key] = array('l')
+            buckets[key].append(question_id)
+        self.source = snapshot
+        self.buckets = buckets
+        self.views: Dict[Tuple, SamplerView] = {}
+
+    def view(self, category_ids: Optional[List[int]], difficulty: Optional[str],
+             question_type: Optional[str]) -> SamplerView:
+        """Cubos que cumplen el filtro (se calculan una vez por combinación)"""
+        wanted = frozenset(category_ids) if category_ids else None
+        key = (wanted, difficulty, question_type)
+        view = self.views.get(key)
+        if view is not None:
+            return view
+
+        arrays, offsets, total = [], [], 0
+        for (category_id, bucket_difficulty, bucket_type), ids in self.buckets.items():
+            if ((wanted is None or category_id in wanted)
+                    and (difficulty is None or bucket_difficulty == difficulty)
+                    and (question_type is None or bucket_type == question_type)):
+                arrays.append(ids)
+                offsets.append(total)
+                total += len(ids)
+        view = (arrays, offsets, total)
+        if len(self.views) >= SAMPLER_VIEW_CACHE_SIZE:
+            self.views.clear()
+        self.views[key] = view
+        return view
+
+def _random_positions(total: int, k: int) -> List[int]:
+    """
+    k posiciones distintas de range(total) en orden aleatorio
+
+    Para k pequeño frente a total basta con sortear y descartar repetidas,
+    que cuesta la mitad que random.sample.
+    """
+    if k * 4 > total:
+        return random.sample(range(total), k)
+    rand = random.random
+    seen = set()
+    positions = []
+    while len(positions) < k:
+        position = int(rand() * total)
+        if position not in seen:
+            seen.add(position)
+            positions.append(position)
+    return positions
+
+class QuestionSampler:
+    """
+    Índice en memoria de IDs de preguntas agrupados por (categoría,
+    dificultad, tipo).
+
+    Sustituye a ORDER BY RANDOM(): en lugar de ordenar toda la tabla en cada
+    examen, se eligen k posiciones al azar sobre los arrays de IDs (O(k)) y
+    después se leen solo esas filas por clave primaria. El índice se construye
+    una vez a partir de la caché del banco de preguntas y se reconstruye solo
+    cuando esta se recarga. Cada combinación de filtros guarda sus cubos y
+    offsets, así que los muestreos siguientes no recorren el índice y su
+    coste no depende del tamaño del banco.
+    """
+
+    def __init__(self):
+        self._index: Optional[_SamplerIndex] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Descarta el índice; se reconstruirá en el siguiente muestreo"""
+        self._index = None
+
+    def _load(self) -> _SamplerIndex:
+        snapshot = _bank_cache.snapshot()
+        index = self._index
+        if index is not None and index.source is snapshot:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.source is not snapshot:
+                index = _SamplerIndex(snapshot)
+                self._index = index
+            return index
+
+    def count(self, category_ids: Optional[List[int]] = None,
+              difficulty: Optional[str] = None,
+              question_type: Optional[str] = None) -> int:
+        """Número de preguntas disponibles para el filtro dado"""
+        return self._load().view(category_ids, difficulty, question_type)[2]
+
+    def bucket_counts(self) -> Dict[Tuple[int, str, str], int]:
+        """Preguntas por cubo (category_id, difficulty, question_type)"""
+        return {key: len(ids) for key, ids in self._load().buckets.items()}
+
+    def sample(self, k: int, category_ids: Optional[List[int]] = None,
+               difficulty: Optional[str] = None,
+               exclude_ids: Optional[set] = None,
+               question_type: Optional[str] = None) -> List[int]:
+        """
+        Elige k IDs al azar sin reemplazo
+
+        Args:
+            k: Número de IDs a devolver
+            category_ids: Categorías permitidas (None = todas)
+            difficulty: Dificultad requerida (None = cualquiera)
+            exclude_ids: IDs que no deben devolverse
+            question_type: Tipo requerido, 'conceptual' o 'syntax' (None = cualquiera)
+
+        Returns:
+            Lista de hasta k IDs en orden aleatorio
+        """
+        arrays, offsets, total = self._load().view(category_ids, difficulty, question_type)
+        if k <= 0 or total == 0:
+            return []
+
+        draw = min(total, k + len(exclude_ids)) if exclude_ids else min(total, k)
+        positions = _random_positions(total, draw)
+        if len(arrays) == 1:
+            ids = arrays[0]
+            result = [ids[position] for position in positions]
+        else:
+            result = []
+            for position in positions:
+                bucket = bisect_right(offsets, position) - 1
+                result.append(arrays[bucket][position - offsets[bucket]])
+        if exclude_ids:
+            result = [question_id for question_id in result if question_id not in exclude_ids]
+        return result[:k]
+
+_sampler = QuestionSampler()
+
+def invalidate_question_sampler():
+    """Invalida el índice de muestreo (llamar tras modificar questions)"""
+    _sampler.invalidate()
+
+def count_available_questions(category_ids: Optional[List[int]] = None,
+                              difficulty: Optional[str] = None,
+                              question_type: Optional[str] = None) -> int:
+    """Cuenta las preguntas disponibles sin consultar la BD"""
+    return _sampler.count(category_ids, difficulty, question_type)
+
+def get_question_bucket_counts() -> Dict[Tuple[int, str, str], int]:
+    """Preguntas disponibles por (category_id, difficulty, question_type)"""
+    return _sampler.bucket_counts()
+
+def sample_question_ids(limit: int = 20, category_ids: Optional[List[int]] = None,
+                        difficulty: Optional[str] = None,
+                        exclude_ids: Optional[set] = None,
+                        question_type: Optional[str] = None) -> List[int]:
+    """Elige al azar IDs de preguntas usando el índice en memoria"""
+    return _sampler.sample(limit, category_ids, difficulty, exclude_ids, question_type)
+
+# Máximo de parámetros por consulta IN (...) (límite clásico de SQLite: 999)
+MAX_IN_PARAMS = 900
+
+def _fetch_questions_by_ids(cursor: sqlite3.Cursor, question_ids: List[int],
+                            fields=QUESTION_COLUMNS) -> Dict[int, tuple]:
+    """
+    Lee preguntas por clave primaria en bloques de MAX_IN_PARAMS IDs
+
+    Solo se seleccionan las columnas de fields; cada fila se devuelve como
+    su tipo compacto (QuestionRow o la proyección correspondiente).
+    """
+    record = question_projection(fields)
+    columns = ', '.join(('id',) + record._fields)
+    rows = {}
+    unique_ids = list(dict.fromkeys(question_ids))
+    cursor.row_factory = None
+    for start in range(0, len(unique_ids), MAX_IN_PARAMS):
+        chunk = unique_ids[start:start + MAX_IN_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'SELECT {columns} FROM questions WHERE id IN ({placeholders})', chunk)
+        for row in cursor.fetchall():
+            rows[row[0]] = record._make(row[1:])
+    return rows
 
 # ==================== FUNCIONES PARA QUESTIONS ====================
 
@@ -145,125 +893,269 @@ def insert_question(category_id: int, question_type: str, question_text: str,
     question_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    _bank_cache.invalidate()
     return question_id
 
-def get_questions_by_category(category_id: int) -> List[Dict]:
-    """Obtiene todas las preguntas de una categoría"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM questions WHERE category_id = ?', (category_id,))
-    questions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return questions
+def get_questions_by_category(category_id: int, fields=None) -> List[QuestionRow]:
+    """
+    Obtiene todas las preguntas de una categoría (desde la caché del banco)
 
-def get_random_questions(limit: int = 20, category_ids: Optional[List[int]] = None) -> List[Dict]:
-    """Obtiene preguntas aleatorias, opcionalmente filtradas por categorías"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    Las filas son las instancias compartidas de la caché (sin copias);
+    fields limita las columnas devueltas (ver question_projection).
+    """
+    snapshot = _bank_cache.snapshot()
+    rows = {qid: snapshot.questions[qid] for qid in snapshot.ids_by_category.get(category_id, [])}
+    return list(_project(rows, fields).values())
 
-    if category_ids:
-        placeholders = ','.join('?' * len(category_ids))
-        query = f'''
-            SELECT * FROM questions
-            WHERE category_id IN ({placeholders})
-            ORDER BY RANDOM()
-            LIMIT ?
-        '''
-        cursor.execute(query, (*category_ids, limit))
-    else:
-        cursor.execute('SELECT * FROM questions ORDER BY RANDOM() LIMIT ?', (limit,))
+def get_random_questions(limit: int = 20, category_ids: Optional[List[int]] = None,
+                         difficulty: Optional[str] = None,
+                         exclude_ids: Optional[set] = None, fields=None) -> List[QuestionRow]:
+    """
+    Obtiene preguntas aleatorias, opcionalmente filtradas por categorías y dificultad
 
-    questions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return questions
+    Los IDs se eligen con el índice en memoria (QuestionSampler) y solo esas
+    filas se leen por clave primaria, así que el coste no crece con el banco.
+    """
+    question_ids = _sampler.sample(limit, category_ids, difficulty, exclude_ids)
+    return list(get_questions_by_ids(question_ids, fields=fields).values())
+
+def get_questions_by_ids(question_ids: List[int], preserve_order: bool = True,
+                         fields=None) -> Dict[int, QuestionRow]:
+    """
+    Obtiene varias preguntas de la caché del banco; los IDs que no estén en
+    memoria se leen con una sola consulta IN (...)
+
+    Args:
+        question_ids: IDs de las preguntas
+        preserve_order: Si True, el dict respeta el orden de question_ids;
+                        si False, el orden es el de la BD
+        fields: Columnas a devolver (None = QuestionRow completa y compartida)
+
+    Returns:
+        Dict {question_id: fila de solo lectura}; los IDs inexistentes se omiten
+    """
+    if not question_ids:
+        return {}
+    cached = _bank_cache.snapshot().questions
+    rows = _project({qid: cached[qid] for qid in question_ids if qid in cached}, fields)
 
-def get_question_by_id(question_id: int) -> Optional[Dict]:
+    missing = [qid for qid in question_ids if qid not in rows]
+    if missing:
+        # Pregunta creada por otro proceso y aún no revalidada
+        conn = get_connection()
+        cursor = conn.cursor()
+        rows.update(_fetch_questions_by_ids(cursor, missing, fields or QUESTION_COLUMNS))
+        conn.close()
+        if preserve_order:
+            return {qid: rows[qid] for qid in question_ids if qid in rows}
+
+    if not preserve_order:
+        return {qid: rows[qid] for qid in sorted(rows)}
+    return rows
+
+def get_question_by_id(question_id: int) -> Optional[QuestionRow]:
     """Obtiene una pregunta por su ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM questions WHERE id = ?', (question_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    return get_questions_by_ids([question_id]).get(question_id)
 
 def count_questions_by_category(category_id: int) -> int:
     """Cuenta cuántas preguntas hay en una categoría"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) as count FROM questions WHERE category_id = ?', (category_id,))
-    count = cursor.fetchone()['count']
-    conn.close()
-    return count
+    return len(_bank_cache.snapshot().ids_by_category.get(category_id, []))
 
 def get_total_questions() -> int:
     """Obtiene el total de preguntas en la base de datos"""
+    return len(_bank_cache.snapshot().questions)
+
+# ==================== BÚSQUEDA DE TEXTO COMPLETO ====================
+
+# Marcadores de resaltado de snippet(); la capa web los convierte en <mark>
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# Pesos BM25 por columna: enunciado, opciones a-e, explicación
+FTS_WEIGHTS = (10.0, 2.0, 2.0, 2.0, 2.0, 2.0, 1.0)
+
+def build_fts_query(text: str) -> str:
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura
+
+    Cada palabra se entrecomilla (así los operadores y símbolos de MongoDB
+    como $match o {} no rompen la sintaxis de FTS5) y se busca por prefijo.
+    Todas las palabras deben aparecer (AND implícito).
+    """
+    tokens = re.findall(r'\w+', text)
+    return ' '.join('"' + token.replace('"', '""') + '"*' for token in tokens)
+
+def _has_fts(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'")
+    return cursor.fetchone() is not None
+
+def search_questions(text: str, category_ids: Optional[List[int]] = None,
+                     difficulty: Optional[str] = None, limit: int = 20) -> List[Dict]:
+    """
+    Busca preguntas por texto en enunciado, opciones y explicación
+
+    Usa el índice FTS5 questions_fts con ranking BM25 y fragmentos
+    resaltados (entre HIGHLIGHT_START y HIGHLIGHT_END). Si el SQLite no
+    tiene FTS5, recurre a LIKE sin ranking.
+
+    Args:
+        text: Texto a buscar
+        category_ids: Filtrar por categorías (None = todas)
+        difficulty: Filtrar por dificultad (None = todas)
+        limit: Máximo de resultados
+
+    Returns:
+        Lista de dicts con id, category_id, category_name, difficulty,
+        question_type, question_snippet, explanation_snippet y rank
+    """
+    fts_query = build_fts_query(text)
+    if not fts_query:
+        return []
+
+    filters = []
+    params: list = []
+    if category_ids:
+        filters.append(f"q.category_id IN ({','.join('?' * len(category_ids))})")
+        params.extend(category_ids)
+    if difficulty:
+        filters.append('q.difficulty = ?')
+        params.append(difficulty)
+    extra_where = ''.join(' AND ' + f for f in filters)
+
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) as count FROM questions')
-    count = cursor.fetchone()['count']
+
+    if _has_fts(cursor):
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        marks = f"'{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…'"
+        cursor.execute(f'''
+            SELECT q.id, q.category_id, c.name AS category_name, q.difficulty,
+                   q.question_type,
+                   snippet(questions_fts, 0, {marks}, 16) AS question_snippet,
+                   snippet(questions_fts, 6, {marks}, 16) AS explanation_snippet,
+                   bm25(questions_fts, {weights}) AS rank
+            FROM questions_fts
+            JOIN questions q ON q.id = questions_fts.rowid
+            JOIN categories c ON c.id = q.category_id
+            WHERE questions_fts MATCH ?{extra_where}
+            ORDER BY rank
+            LIMIT ?
+        ''', (fts_query, *params, limit))
+    else:
+        like_filters = []
+        like_params = []
+        for token in re.findall(r'\w+', text):
+            like_filters.append('(q.question_text LIKE ? OR q.explanation LIKE ?)')
+            like_params.extend([f'%{token}%', f'%{token}%'])
+        cursor.execute(f'''
+            SELECT q.id, q.category_id, c.name AS category_name, q.difficulty,
+                   q.question_type, q.question_text AS question_snippet,
+                   q.explanation AS explanation_snippet, 0 AS rank
+            FROM questions q
+            JOIN categories c ON c.id = q.category_id
+            WHERE {' AND '.join(like_filters)}{extra_where}
+            ORDER BY q.id
+            LIMIT ?
+        ''', (*like_params, *params, limit))
+
+    results = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    return count
+    return results
+
+# ==================== ARCHIVO DE EXÁMENES ANTIGUOS ====================
+
+def get_history_path(user_id: str = DEFAULT_USER_ID) -> str:
+    """Fichero de la BD de historial del usuario"""
+    router = get_shard_router()
+    if router is None:
+        return DB_PATH
+    return router.path_for_shard(router.shard_for(user_id))
+
+def archive_path_for(history_path: str) -> str:
+    """Fichero de archivo asociado a una BD de historial (x.db -> x_archive.db)"""
+    root, ext = os.path.splitext(history_path)
+    return f'{root}_archive{ext or ".db"}'
+
+def _open_archive(user_id: str) -> Optional[sqlite3.Connection]:
+    """
+    Conexión de solo lectura al archivo del usuario (None si no hay archivo)
+
+    El archivo se consulta pocas veces, así que no pasa por el pool.
+    """
+    path = archive_path_for(get_history_path(user_id))
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    return conn
 
 # ==================== FUNCIONES PARA EXAMS ====================
 
-def create_exam(selected_categories: List[int]) -> int:
+def create_exam(selected_categories: List[int], user_id: str = DEFAULT_USER_ID) -> int:
     """Crea un nuevo examen"""
-    conn = get_connection()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
     cursor.execute(
-        'INSERT INTO exams (selected_categories) VALUES (?)',
-        (json.dumps(selected_categories),)
+        'INSERT INTO exams (user_id, selected_categories) VALUES (?, ?)',
+        (user_id, json.dumps(selected_categories))
     )
     exam_id = cursor.lastrowid
     conn.commit()
     conn.close()
     return exam_id
 
-def finish_exam(exam_id: int, correct_answers: int, time_spent_seconds: int):
+def finish_exam(exam_id: int, correct_answers: int, time_spent_seconds: int,
+                user_id: str = DEFAULT_USER_ID):
     """Finaliza un examen actualizando los resultados"""
     score = (correct_answers / 20) * 100
-    conn = get_connection()
+    snapshot = _bank_cache.snapshot()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE exams
         SET correct_answers = ?, score = ?, time_spent_seconds = ?
-        WHERE id = ?
-    ''', (correct_answers, score, time_spent_seconds, exam_id))
+        WHERE id = ? AND user_id = ?
+    ''', (correct_answers, score, time_spent_seconds, exam_id, user_id))
+    _refresh_progress_read_model(cursor, user_id, snapshot)
     conn.commit()
     conn.close()
 
-def get_exam_by_id(exam_id: int) -> Optional[Dict]:
-    """Obtiene un examen por su ID"""
-    conn = get_connection()
+def get_exam_by_id(exam_id: int, user_id: str = DEFAULT_USER_ID) -> Optional[Dict]:
+    """Obtiene un examen por su ID (buscando también en el archivo)"""
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM exams WHERE id = ?', (exam_id,))
+    cursor.execute('SELECT * FROM exams WHERE id = ? AND user_id = ?', (exam_id, user_id))
     row = cursor.fetchone()
     conn.close()
-    if row:
-        exam = dict(row)
-        exam['selected_categories'] = json.loads(exam['selected_categories'])
-        return exam
-    return None
 
-def get_all_exams() -> List[Dict]:
+    if row is None:
+        archive = _open_archive(user_id)
+        if archive is not None:
+            row = archive.execute(
+                'SELECT * FROM exams WHERE id = ? AND user_id = ?', (exam_id, user_id)
+            ).fetchone()
+            archive.close()
+    return _decode_exam(row) if row else None
+
+def get_all_exams(user_id: str = DEFAULT_USER_ID) -> List[Dict]:
     """Obtiene todos los exámenes ordenados por fecha"""
-    conn = get_connection()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM exams ORDER BY exam_date DESC')
-    exams = []
-    for row in cursor.fetchall():
-        exam = dict(row)
-        exam['selected_categories'] = json.loads(exam['selected_categories'])
-        exams.append(exam)
+    cursor.execute(
+        'SELECT * FROM exams WHERE user_id = ? ORDER BY exam_date DESC, id DESC',
+        (user_id,)
+    )
+    exams = [_decode_exam(row) for row in cursor.fetchall()]
     conn.close()
     return exams
 
 # ==================== FUNCIONES PARA EXAM_ANSWERS ====================
 
 def insert_exam_answer(exam_id: int, question_id: int, user_answer: str,
-                      is_correct: bool, time_spent_seconds: Optional[int] = None) -> int:
+                      is_correct: bool, time_spent_seconds: Optional[int] = None,
+                      user_id: str = DEFAULT_USER_ID) -> int:
     """Inserta una respuesta de examen"""
-    conn = get_connection()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO exam_answers
@@ -275,35 +1167,63 @@ def insert_exam_answer(exam_id: int, question_id: int, user_answer: str,
     conn.close()
     return answer_id
 
-def get_exam_answers(exam_id: int) -> List[Dict]:
-    """Obtiene todas las respuestas de un examen con detalles de la pregunta"""
-    conn = get_connection()
+# Columnas de la pregunta que acompañan a cada respuesta en get_exam_answers
+ANSWER_QUESTION_FIELDS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+                          'option_e', 'correct_answer', 'explanation', 'question_type',
+                          'dataset_reference')
+
+def get_exam_answers(exam_id: int, user_id: str = DEFAULT_USER_ID) -> List[Dict]:
+    """
+    Obtiene todas las respuestas de un examen con detalles de la pregunta
+
+    Las respuestas se leen de la BD de historial del usuario o, si el
+    examen ya se archivó, del fichero de archivo (ver archive.py). Los datos
+    de la pregunta y su categoría salen de la caché del banco (pueden estar
+    en otro fichero si hay sharding).
+    """
+    sql = '''
+        SELECT ea.* FROM exam_answers ea
+        JOIN exams e ON e.id = ea.exam_id
+        WHERE ea.exam_id = ? AND e.user_id = ?
+        ORDER BY ea.id
+    '''
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT ea.*, q.question_text, q.option_a, q.option_b, q.option_c,
-               q.option_d, q.option_e, q.correct_answer, q.explanation,
-               q.question_type, q.dataset_reference, c.name as category_name
-        FROM exam_answers ea
-        JOIN questions q ON ea.question_id = q.id
-        JOIN categories c ON q.category_id = c.id
-        WHERE ea.exam_id = ?
-    ''', (exam_id,))
+    cursor.execute(sql, (exam_id, user_id))
     answers = [dict(row) for row in cursor.fetchall()]
     conn.close()
+
+    if not answers:
+        archive = _open_archive(user_id)
+        if archive is not None:
+            answers = [dict(row) for row in archive.execute(sql, (exam_id, user_id)).fetchall()]
+            archive.close()
+
+    questions = get_questions_by_ids([a['question_id'] for a in answers])
+    for answer in answers:
+        question = questions.get(answer['question_id'], {})
+        for field in ANSWER_QUESTION_FIELDS:
+            answer[field] = question.get(field)
+        category = get_category_by_id(question['category_id']) if question else None
+        answer['category_name'] = category['name'] if category else None
     return answers
 
 # ==================== FUNCIONES PARA STUDY_PROGRESS ====================
 
 def update_study_progress(category_id: int, questions_answered_delta: int = 1,
-                         questions_correct_delta: int = 0):
+                         questions_correct_delta: int = 0, user_id: str = DEFAULT_USER_ID):
     """
     Actualiza el progreso de estudio de una categoría con deltas
     """
-    conn = get_connection()
+    snapshot = _bank_cache.snapshot()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
 
     # Verificar si existe el registro
-    cursor.execute('SELECT * FROM study_progress WHERE category_id = ?', (category_id,))
+    cursor.execute(
+        'SELECT * FROM study_progress WHERE user_id = ? AND category_id = ?',
+        (user_id, category_id)
+    )
     existing = cursor.fetchone()
 
     if existing:
@@ -313,44 +1233,53 @@ def update_study_progress(category_id: int, questions_answered_delta: int = 1,
             SET questions_answered = questions_answered + ?,
                 questions_correct = questions_correct + ?,
                 last_study_date = CURRENT_TIMESTAMP
-            WHERE category_id = ?
-        ''', (questions_answered_delta, questions_correct_delta, category_id))
+            WHERE user_id = ? AND category_id = ?
+        ''', (questions_answered_delta, questions_correct_delta, user_id, category_id))
     else:
         # Insertar
         cursor.execute('''
             INSERT INTO study_progress
-            (category_id, questions_answered, questions_correct, last_study_date)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (category_id, questions_answered_delta, questions_correct_delta))
+            (user_id, category_id, questions_answered, questions_correct, last_study_date)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (user_id, category_id, questions_answered_delta, questions_correct_delta))
 
+    _refresh_progress_read_model(cursor, user_id, snapshot)
     conn.commit()
     conn.close()
 
-def get_study_progress() -> List[Dict]:
+def get_study_progress(user_id: str = DEFAULT_USER_ID) -> List[Dict]:
     """Obtiene el progreso de estudio de todas las categorías"""
-    conn = get_connection()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT sp.*, c.name as category_name, c.session_number
-        FROM study_progress sp
-        JOIN categories c ON sp.category_id = c.id
-        ORDER BY c.session_number
-    ''')
-    progress = [dict(row) for row in cursor.fetchall()]
+    cursor.execute('SELECT * FROM study_progress WHERE user_id = ?', (user_id,))
+    rows = cursor.fetchall()
     conn.close()
+
+    # Nombre y sesión de la categoría desde la caché del banco
+    progress = []
+    for row in rows:
+        category = get_category_by_id(row['category_id'])
+        if category is None:
+            continue
+        entry = dict(row)
+        entry['category_name'] = category['name']
+        entry['session_number'] = category['session_number']
+        progress.append(entry)
+    progress.sort(key=lambda p: (p['session_number'] is None, p['session_number'] or 0))
     return progress
 
-def get_category_stats(category_id: int) -> Dict:
+def get_category_stats(category_id: int, user_id: str = DEFAULT_USER_ID) -> Dict:
     """Obtiene estadísticas detalladas de una categoría"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
     # Total de preguntas en la categoría
-    cursor.execute('SELECT COUNT(*) as total FROM questions WHERE category_id = ?', (category_id,))
-    total_questions = cursor.fetchone()['total']
+    total_questions = count_questions_by_category(category_id)
 
     # Progreso del usuario en esta categoría
-    cursor.execute('SELECT * FROM study_progress WHERE category_id = ?', (category_id,))
+    conn = get_history_connection(user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT * FROM study_progress WHERE user_id = ? AND category_id = ?',
+        (user_id, category_id)
+    )
     progress = cursor.fetchone()
 
     conn.close()
@@ -373,93 +1302,811 @@ def get_category_stats(category_id: int) -> Dict:
             'last_study_date': None
         }
 
-# ==================== FUNCIONES DE ESTADÍSTICAS GENERALES ====================
-
-def get_overall_stats() -> Dict:
-    """Obtiene estadísticas generales del usuario"""
-    conn = get_connection()
-    cursor = conn.cursor()
+# ==================== MODELO DE LECTURA DEL PROGRESO ====================
 
-    # Total de exámenes
-    cursor.execute('SELECT COUNT(*) as total FROM exams WHERE score IS NOT NULL')
-    total_exams = cursor.fetchone()['total']
+def _refresh_progress_read_model(cursor: sqlite3.Cursor, user_id: str,
+                                 snapshot: _BankSnapshot) -> int:
+    """
+    Recalcula las filas de progress_read_model del usuario (sin commit)
 
-    # Promedio general
-    cursor.execute('SELECT AVG(score) as avg_score FROM exams WHERE score IS NOT NULL')
-    avg_score = cursor.fetchone()['avg_score'] or 0
+    Se llama en la misma transacción que modifica study_progress o exams,
+    así que /progress nunca ve el modelo desfasado respecto a los datos.
+    El llamador obtiene el snapshot del banco antes de pedir su conexión:
+    revalidarlo aquí tomaría una segunda conexión del pool con la primera
+    ocupada y, con el pool lleno, se bloquearía hasta POOL_TIMEOUT_SECONDS.
 
-    # Mejor score
-    cursor.execute('SELECT MAX(score) as best_score FROM exams WHERE score IS NOT NULL')
-    best_score = cursor.fetchone()['best_score'] or 0
+    Returns:
+        Nueva versión del modelo del usuario
+    """
+    cursor.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM progress_read_model WHERE user_id = ?',
+                   (user_id,))
+    version = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT category_id, questions_answered, questions_correct, last_study_date
+        FROM study_progress WHERE user_id = ?
+    ''', (user_id,))
+    progress = {row[0]: row for row in cursor.fetchall()}
 
-    # Total de preguntas contestadas
-    cursor.execute('SELECT SUM(questions_answered) as total FROM study_progress')
-    total_answered = cursor.fetchone()['total'] or 0
+    rows = []
+    for category in snapshot.categories:
+        _, answered, correct, last_study_date = progress.get(category['id'], (None, 0, 0, None))
+        answered, correct = answered or 0, correct or 0
+        rows.append((
+            user_id, category['id'], category['name'], category['description'],
+            category['session_number'], answered, correct,
+            (correct / answered * 100) if answered > 0 else 0,
+            last_study_date, version, snapshot.version
+        ))
+    cursor.execute('DELETE FROM progress_read_model WHERE user_id = ?', (user_id,))
+    cursor.executemany('''
+        INSERT INTO progress_read_model
+        (user_id, category_id, category_name, category_description, session_number,
+         questions_answered, questions_correct, success_rate, last_study_date,
+         version, content_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return version
 
-    # Total de preguntas correctas
-    cursor.execute('SELECT SUM(questions_correct) as total FROM study_progress')
-    total_correct = cursor.fetchone()['total'] or 0
+def get_progress_version(user_id: str = DEFAULT_USER_ID) -> Optional[Tuple[int, int]]:
+    """
+    (versión, versión del banco) del modelo de lectura del usuario
 
+    Sirve de clave para cachear la página de progreso: cambia con cada
+    examen guardado y cuando cambian las categorías. None si el modelo
+    aún no existe o está desfasado respecto al banco de preguntas.
+    """
+    conn = get_history_connection(user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT MAX(version), MAX(content_version) FROM progress_read_model WHERE user_id = ?',
+        (user_id,)
+    )
+    version, content_version = cursor.fetchone()
     conn.close()
+    if version is None or content_version != _bank_cache.snapshot().version:
+        return None
+    return version, content_version
 
+def get_progress_overview(user_id: str = DEFAULT_USER_ID) -> Dict:
+    """
+    Progreso del usuario en todas las categorías (categorías LEFT JOIN progreso)
+
+    Lee el modelo de lectura ya calculado; si todavía no existe para el
+    usuario o el banco de categorías cambió, lo recalcula antes.
+
+    Returns:
+        Dict con 'version' (ver get_progress_version) y 'categories': lista
+        ordenada por sesión con category_name, category_description,
+        questions_answered, questions_correct, success_rate y last_study_date
+    """
+    sql = '''
+        SELECT * FROM progress_read_model
+        WHERE user_id = ?
+        ORDER BY session_number, category_id
+    '''
+    snapshot = _bank_cache.snapshot()
+    conn = get_history_connection(user_id)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, (user_id,))
+        rows = cursor.fetchall()
+        if (not rows or rows[0]['content_version'] != snapshot.version
+                or len(rows) != len(snapshot.categories)):
+            conn.execute('BEGIN IMMEDIATE')
+            _refresh_progress_read_model(cursor, user_id, snapshot)
+            conn.commit()
+            cursor.execute(sql, (user_id,))
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    categories = [dict(row) for row in rows]
+    version = (rows[0]['version'], rows[0]['content_version']) if rows else None
+    return {'version': version, 'categories': categories}
+
+# ==================== FUNCIONES DE ESTADÍSTICAS GENERALES ====================
+
+_EMPTY_SUMMARY = {'total_exams': 0, 'sum_scores': 0, 'best_score': None,
+                  'total_answered': 0, 'total_correct': 0}
+
+def _summary_to_stats(row) -> Dict:
+    total_exams = row['total_exams']
+    total_answered = row['total_answered']
+    total_correct = row['total_correct']
+    avg_score = (row['sum_scores'] / total_exams) if total_exams > 0 else 0
     overall_accuracy = (total_correct / total_answered * 100) if total_answered > 0 else 0
 
     return {
         'total_exams': total_exams,
         'avg_score': round(avg_score, 2),
-        'best_score': round(best_score, 2),
+        'best_score': round(row['best_score'] or 0, 2),
         'total_questions_answered': total_answered,
         'total_questions_correct': total_correct,
         'overall_accuracy': round(overall_accuracy, 2)
     }
 
+def get_overall_stats(user_id: Optional[str] = None) -> Dict:
+    """
+    Obtiene estadísticas generales
+
+    Con user_id lee la fila del usuario en user_stats de su BD de historial.
+    Sin user_id son globales: la fila de stats_summary de la BD principal
+    más, por cada shard, la suma de su user_stats (los shards no tienen
+    stats_summary). Ambas tablas las mantienen al día los triggers de exams
+    y study_progress (ver migrations.py).
+    """
+    if user_id is not None:
+        conn = get_history_connection(user_id)
+        try:
+            row = conn.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return _summary_to_stats(row or _EMPTY_SUMMARY)
+
+    totals = dict(_EMPTY_SUMMARY)
+    for index, conn in enumerate(_history_connections()):
+        try:
+            if index == 0:
+                row = conn.execute('SELECT * FROM stats_summary WHERE id = 1').fetchone()
+            else:
+                row = conn.execute('''
+                    SELECT COALESCE(SUM(total_exams), 0) AS total_exams,
+                           COALESCE(SUM(sum_scores), 0) AS sum_scores,
+                           MAX(best_score) AS best_score,
+                           COALESCE(SUM(total_answered), 0) AS total_answered,
+                           COALESCE(SUM(total_correct), 0) AS total_correct
+                    FROM user_stats
+                ''').fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            continue
+        for field in ('total_exams', 'sum_scores', 'total_answered', 'total_correct'):
+            totals[field] += row[field]
+        if row['best_score'] is not None and (totals['best_score'] is None
+                                              or row['best_score'] > totals['best_score']):
+            totals['best_score'] = row['best_score']
+    return _summary_to_stats(totals)
+
+def rebuild_stats() -> Dict:
+    """
+    Recalcula stats_summary y user_stats desde cero (para verificar los contadores)
+
+    Returns:
+        Dict con 'before' y 'after' (estadísticas globales antes y después),
+        'users_rebuilt' (filas de user_stats en todas las BD de historial) y
+        'consistent' (True si los contadores incrementales eran correctos)
+    """
+    before = get_overall_stats()
+    consistent = True
+    users_rebuilt = 0
+    for conn in _history_connections():
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM user_stats ORDER BY user_id')
+            users_before = [tuple(row) for row in cursor.fetchall()]
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_summary'"
+            ).fetchone():
+                rebuild_stats_summary(cursor)
+            rebuild_user_stats(cursor)
+            cursor.execute('SELECT * FROM user_stats ORDER BY user_id')
+            users_after = [tuple(row) for row in cursor.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        consistent = consistent and users_before == users_after
+        users_rebuilt += len(users_after)
+    after = get_overall_stats()
+    return {
+        'before': before,
+        'after': after,
+        'users_rebuilt': users_rebuilt,
+        'consistent': consistent and before == after
+    }
+
+# ==================== ESTADÍSTICAS POR PREGUNTA ====================
+
+ITEM_COUNTER_FIELDS = ('times_shown', 'times_correct',
+                       'picks_a', 'picks_b', 'picks_c', 'picks_d', 'picks_e')
+ITEM_ANALYSIS_FIELDS = ('p_value', 'discrimination', 'analyzed_responses', 'analyzed_at')
+
+def get_item_stats(question_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """
+    Estadísticas por pregunta de todas las BD de historial
+
+    Los contadores de item_stats (los mantiene un trigger al guardar cada
+    respuesta) se suman entre la BD principal y los shards; p_value y
+    discrimination son los de la BD principal, donde los guarda
+    item_analysis.py.
+
+    Args:
+        question_ids: Preguntas a consultar (None = todas las que tienen datos)
+
+    Returns:
+        Dict {question_id: estadísticas}
+    """
+    stats: Dict[int, Dict] = {}
+    chunks = [None] if question_ids is None else [
+        question_ids[start:start + MAX_IN_PARAMS]
+        for start in range(0, len(question_ids), MAX_IN_PARAMS)
+    ]
+    for index, conn in enumerate(_history_connections()):
+        try:
+            cursor = conn.cursor()
+            for chunk in chunks:
+                if chunk is None:
+                    cursor.execute('SELECT * FROM item_stats')
+                else:
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(
+                        f'SELECT * FROM item_stats WHERE question_id IN ({placeholders})', chunk
+                    )
+                for row in cursor.fetchall():
+                    entry = stats.get(row['question_id'])
+                    if entry is None:
+                        entry = stats[row['question_id']] = {
+                            'question_id': row['question_id'], 'last_seen': None,
+                            **{field: 0 for field in ITEM_COUNTER_FIELDS},
+                            **{field: None for field in ITEM_ANALYSIS_FIELDS}
+                        }
+                    for field in ITEM_COUNTER_FIELDS:
+                        entry[field] += row[field]
+                    if row['last_seen'] and (entry['last_seen'] is None
+                                             or row['last_seen'] > entry['last_seen']):
+                        entry['last_seen'] = row['last_seen']
+                    if index == 0:  # La BD principal guarda el análisis
+                        for field in ITEM_ANALYSIS_FIELDS:
+                            entry[field] = row[field]
+        finally:
+            conn.close()
+    return stats
+
 # ==================== FUNCIONES ADICIONALES PARA APP.PY ====================
 
 def insert_exam(total_questions: int, correct_answers: int, score: float,
-                selected_categories: str, time_spent_seconds: int) -> int:
+                selected_categories: str, time_spent_seconds: int,
+                user_id: str = DEFAULT_USER_ID) -> int:
     """
     Inserta un nuevo examen con todos los datos
     (Versión alternativa de create_exam compatible con app.py)
     """
-    conn = get_connection()
+    snapshot = _bank_cache.snapshot()
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO exams
-        (total_questions, correct_answers, score, selected_categories, time_spent_seconds)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (total_questions, correct_answers, score, selected_categories, time_spent_seconds))
+        (user_id, total_questions, correct_answers, score, selected_categories, time_spent_seconds)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, total_questions, correct_answers, score, selected_categories, time_spent_seconds))
     exam_id = cursor.lastrowid
+    _refresh_progress_read_model(cursor, user_id, snapshot)
     conn.commit()
     conn.close()
     return exam_id
 
-def get_study_progress_all() -> List[Dict]:
+def get_study_progress_all(user_id: str = DEFAULT_USER_ID) -> List[Dict]:
     """
     Alias para get_study_progress() - obtiene el progreso de todas las categorías
     """
-    return get_study_progress()
+    return get_study_progress(user_id)
 
-def get_exam_history(limit: int = 20) -> List[Dict]:
+def _decode_exam(row) -> Dict:
+    """Convierte una fila de exams en dict decodificando selected_categories"""
+    exam = dict(row)
+    if exam.get('selected_categories'):
+        try:
+            exam['selected_categories'] = json.loads(exam['selected_categories'])
+        except (TypeError, ValueError):
+            exam['selected_categories'] = []
+    else:
+        exam['selected_categories'] = []
+    return exam
+
+def get_exam_history(limit: int = 20, user_id: str = DEFAULT_USER_ID) -> List[Dict]:
     """
     Obtiene el historial de exámenes con un límite específico
     """
-    conn = get_connection()
+    exams, _ = get_exam_history_page(limit=limit, user_id=user_id)
+    return exams
+
+def encode_history_cursor(exam: Dict) -> str:
+    """Cursor de paginación que apunta justo después del examen dado"""
+    return f"{exam['exam_date']}|{exam['id']}"
+
+def decode_history_cursor(cursor_value: str) -> Tuple[str, int]:
+    """
+    Decodifica un cursor 'exam_date|id'
+
+    Raises:
+        ValueError: si el cursor no tiene el formato esperado
+    """
+    exam_date, separator, exam_id = cursor_value.rpartition('|')
+    if not separator or not exam_date:
+        raise ValueError(f'Cursor de historial inválido: {cursor_value!r}')
+    return exam_date, int(exam_id)
+
+def get_exam_history_page(before: Optional[str] = None, limit: int = 20,
+                          user_id: str = DEFAULT_USER_ID) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Obtiene una página del historial con paginación por cursor (keyset)
+
+    En lugar de OFFSET, cada página continúa a partir de la clave
+    (exam_date, id) del último examen de la anterior, así que el coste de
+    cualquier página es el mismo con 10 o con 10.000 exámenes.
+
+    Args:
+        before: Cursor devuelto por la página anterior (None = más recientes)
+        limit: Exámenes por página
+        user_id: Usuario dueño del historial
+
+    Returns:
+        Tupla (exámenes, cursor de la siguiente página o None si no hay más)
+    """
+    conn = get_history_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM exams ORDER BY exam_date DESC LIMIT ?', (limit,))
-    exams = []
-    for row in cursor.fetchall():
-        exam = dict(row)
-        if exam.get('selected_categories'):
-            try:
-                exam['selected_categories'] = json.loads(exam['selected_categories'])
-            except:
-                exam['selected_categories'] = []
-        else:
-            exam['selected_categories'] = []
-        exams.append(exam)
+    if before:
+        exam_date, exam_id = decode_history_cursor(before)
+        cursor.execute('''
+            SELECT * FROM exams
+            WHERE user_id = ? AND (exam_date, id) < (?, ?)
+            ORDER BY exam_date DESC, id DESC
+            LIMIT ?
+        ''', (user_id, exam_date, exam_id, limit + 1))
+    else:
+        cursor.execute(
+            'SELECT * FROM exams WHERE user_id = ? ORDER BY exam_date DESC, id DESC LIMIT ?',
+            (user_id, limit + 1)
+        )
+    rows = cursor.fetchall()
     conn.close()
-    return exams
+
+    exams = [_decode_exam(row) for row in rows[:limit]]
+    next_cursor = encode_history_cursor(exams[-1]) if len(rows) > limit else None
+    return exams, next_cursor
+
+# ==================== REPASO ESPACIADO (SM-2) ====================
+
+REVIEW_SESSION_SIZE = 20  # Preguntas por sesión de repaso
+
+def _update_review_schedule(cursor: sqlite3.Cursor, user_id: str, answers: List[Dict]):
+    """
+    Aplica SM-2 a todas las respuestas de un examen en lote (sin commit)
+
+    Una lectura de los estados actuales por clave primaria y un solo
+    executemany de UPSERT por examen, dentro de la transacción que lo guarda.
+    """
+    if not answers:
+        return
+    question_ids = list({a['question_id'] for a in answers})
+    placeholders = ','.join('?' * len(question_ids))
+    cursor.execute(f'''
+        SELECT question_id, ease, interval_days, repetitions, lapses FROM review_schedule
+        WHERE user_id = ? AND question_id IN ({placeholders})
+    ''', [user_id, *question_ids])
+    states = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for a in answers:
+        states[a['question_id']] = sm2_review(
+            states.get(a['question_id'], NEW_REVIEW_STATE),
+            review_quality(a['is_correct'], a.get('time_spent_ms'), a.get('answer_changes'))
+        )
+
+    reviewed_at = now.strftime(REVIEW_DATE_FORMAT)
+    cursor.executemany('''
+        INSERT INTO review_schedule
+        (user_id, question_id, ease, interval_days, repetitions, lapses, due_date, last_reviewed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, question_id) DO UPDATE SET
+            ease = excluded.ease,
+            interval_days = excluded.interval_days,
+            repetitions = excluded.repetitions,
+            lapses = excluded.lapses,
+            due_date = excluded.due_date,
+            last_reviewed = excluded.last_reviewed
+    ''', [
+        (user_id, question_id, *states[question_id],
+         due_date_after(now, states[question_id][1]), reviewed_at)
+        for question_id in question_ids
+    ])
+
+def get_due_reviews(user_id: str = DEFAULT_USER_ID, limit: int = REVIEW_SESSION_SIZE,
+                    now: Optional[str] = None) -> List[Dict]:
+    """
+    Preguntas cuyo repaso ya toca, las más atrasadas primero
+
+    Búsqueda por rango en idx_review_schedule_due (O(log n) por pregunta,
+    sin ordenar ni recorrer el resto del calendario).
+
+    Args:
+        user_id: Usuario dueño del calendario
+        limit: Preguntas como máximo
+        now: Fecha de corte en formato TIMESTAMP (None = ahora, UTC)
+
+    Returns:
+        Lista de dicts con question_id y due_date
+    """
+    now = now or datetime.now(timezone.utc).strftime(REVIEW_DATE_FORMAT)
+    conn = get_history_connection(user_id)
+    try:
+        rows = conn.execute('''
+            SELECT question_id, due_date FROM review_schedule
+            WHERE user_id = ? AND due_date <= ?
+            ORDER BY due_date, question_id
+            LIMIT ?
+        ''', (user_id, now, limit)).fetchall()
+    finally:
+        conn.close()
+    return [{'question_id': row[0], 'due_date': row[1]} for row in rows]
+
+def get_next_review_date(user_id: str = DEFAULT_USER_ID) -> Optional[str]:
+    """Fecha del próximo repaso programado del usuario (None si no tiene ninguno)"""
+    conn = get_history_connection(user_id)
+    try:
+        row = conn.execute(
+            'SELECT MIN(due_date) FROM review_schedule WHERE user_id = ?', (user_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0]
+
+# ==================== REGISTRO TRANSACCIONAL DE EXÁMENES ====================
+
+def _write_exam_submission(cursor: sqlite3.Cursor, snapshot: _BankSnapshot,
+                           total_questions: int, correct_answers: int,
+                           score: float, selected_categories: str, time_spent_seconds: int,
+                           answers: List[Dict], user_id: str = DEFAULT_USER_ID) -> int:
+    """
+    Escribe examen, respuestas y progreso usando el cursor dado (sin commit)
+
+    snapshot es el del banco tomado antes de abrir la transacción (ver
+    _refresh_progress_read_model).
+    """
+    cursor.execute('''
+        INSERT INTO exams
+        (user_id, total_questions, correct_answers, score, selected_categories, time_spent_seconds)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, total_questions, correct_answers, score, selected_categories, time_spent_seconds))
+    exam_id = cursor.lastrowid
+
+    cursor.executemany('''
+        INSERT INTO exam_answers
+        (exam_id, question_id, user_answer, is_correct, time_spent_seconds,
+         time_spent_ms, first_answer_ms, last_answer_ms, answer_changes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (exam_id, a['question_id'], a['user_answer'], a['is_correct'], a.get('time_spent_seconds'),
+         a.get('time_spent_ms'), a.get('first_answer_ms'), a.get('last_answer_ms'),
+         a.get('answer_changes'))
+        for a in answers
+    ])
+
+    # Acumular deltas por categoría
+    category_stats = {}  # {category_id: [answered, correct]}
+    for a in answers:
+        stats = category_stats.setdefault(a['category_id'], [0, 0])
+        stats[0] += 1
+        if a['is_correct']:
+            stats[1] += 1
+
+    cursor.executemany('''
+        INSERT INTO study_progress
+        (user_id, category_id, questions_answered, questions_correct, last_study_date)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id, category_id) DO UPDATE SET
+            questions_answered = questions_answered + excluded.questions_answered,
+            questions_correct = questions_correct + excluded.questions_correct,
+            last_study_date = excluded.last_study_date
+    ''', [
+        (user_id, category_id, answered, correct)
+        for category_id, (answered, correct) in category_stats.items()
+    ])
+
+    _refresh_progress_read_model(cursor, user_id, snapshot)
+    _update_review_schedule(cursor, user_id, answers)
+    return exam_id
+
+def record_exam_submission(total_questions: int, correct_answers: int, score: float,
+                           selected_categories: str, time_spent_seconds: int,
+                           answers: List[Dict], user_id: str = DEFAULT_USER_ID) -> int:
+    """
+    Registra un examen completo en una sola transacción
+
+    Inserta la fila del examen, todas sus respuestas (executemany), los
+    deltas de progreso por categoría (INSERT ... ON CONFLICT DO UPDATE) y
+    el repaso SM-2 de cada pregunta (review_schedule).
+    O se guarda todo o no se guarda nada.
+
+    Args:
+        total_questions: Número de preguntas del examen
+        correct_answers: Número de respuestas correctas
+        score: Puntuación (0-100)
+        selected_categories: Categorías seleccionadas (JSON)
+        time_spent_seconds: Duración del examen
+        answers: Lista de dicts con question_id, category_id, user_answer,
+                 is_correct y opcionalmente time_spent_seconds y los tiempos
+                 medidos en el navegador (time_spent_ms, first_answer_ms,
+                 last_answer_ms, answer_changes)
+        user_id: Usuario que hizo el examen (decide la BD de historial)
+
+    Returns:
+        ID del examen creado
+    """
+    snapshot = _bank_cache.snapshot()
+    conn = get_history_connection(user_id)
+    try:
+        conn.execute('BEGIN IMMEDIATE')  # Tomar el bloqueo de escritura desde el inicio
+        exam_id = _write_exam_submission(
+            conn.cursor(), snapshot, total_questions, correct_answers, score,
+            selected_categories, time_spent_seconds, answers, user_id
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return exam_id
+
+# ==================== ESCRITURA DIFERIDA (WRITE-BEHIND) ====================
+
+WRITE_BEHIND_QUEUE_SIZE = 2000        # Envíos pendientes como máximo antes de aplicar backpressure
+WRITE_BEHIND_BATCH_SIZE = 128         # Envíos por transacción (group commit)
+WRITE_BEHIND_MAX_WAIT_SECONDS = 0.02  # Espera para llenar un lote tras el primer envío
+WRITE_BEHIND_PUT_TIMEOUT_SECONDS = 2  # Espera máxima de un productor con la cola llena
+
+class WriteBehindWriter:
+    """
+    Hilo escritor único que agrupa envíos de exámenes en pocas transacciones
+
+    Los hilos de las peticiones solo encolan (submit) y reciben un Future
+    que se resuelve con el exam_id cuando la transacción del lote ha hecho
+    commit (acuse de durabilidad), o con la excepción si ese envío falló.
+    Cada envío va en su propio SAVEPOINT: un envío inválido se deshace sin
+    afectar al resto del lote.
+
+    Con la cola llena, submit() bloquea hasta PUT_TIMEOUT y después lanza
+    queue.Full, de modo que los productores frenan en lugar de acumular
+    memoria sin límite.
+    """
+
+    _FLUSH = object()  # Marcador de flush en la cola
+
+    def __init__(self, max_queue: int = WRITE_BEHIND_QUEUE_SIZE,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 max_wait: float = WRITE_BEHIND_MAX_WAIT_SECONDS,
+                 put_timeout: float = WRITE_BEHIND_PUT_TIMEOUT_SECONDS):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='quiz-write-behind', daemon=True)
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected = 0
+        self._thread.start()
+
+    # ---------- Lado productor ----------
+
+    def submit(self, total_questions: int, correct_answers: int, score: float,
+               selected_categories: str, time_spent_seconds: int, answers: List[Dict],
+               user_id: str = DEFAULT_USER_ID) -> Future:
+        """Encola un envío (mismos argumentos que record_exam_submission)"""
+        if self._stopping.is_set():
+            raise RuntimeError('El escritor diferido está detenido')
+        future: Future = Future()
+        payload = (total_questions, correct_answers, score, selected_categories,
+                   time_spent_seconds, answers, user_id)
+        try:
+            self._queue.put((payload, future), timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise
+        with self._stats_lock:
+            self.submitted += 1
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todo lo encolado hasta ahora esté confirmado en disco"""
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        marker: Future = Future()
+        self._queue.put((self._FLUSH, marker))
+        try:
+            marker.result(timeout=timeout)
+            return True
+        except FuturesTimeout:
+            return False
+
+    def stop(self, timeout: Optional[float] = 10):
+        """Vacía la cola y detiene el hilo escritor"""
+        if self._stopping.is_set():
+            return
+        self.flush(timeout=timeout)
+        self._stopping.set()
+        self._thread.join(timeout=timeout)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'committed': self.committed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'batches': self.batches,
+                'avg_batch_size': round(self.committed / self.batches, 2) if self.batches else 0,
+                'running': self._thread.is_alive()
+            }
+
+    # ---------- Hilo escritor ----------
+
+    def _next_batch(self) -> List[tuple]:
+        """Bloquea hasta el primer elemento y agrupa lo que llegue en max_wait"""
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size and first[0] is not self._FLUSH:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item[0] is self._FLUSH:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            submissions = [item for item in batch if item[0] is not self._FLUSH]
+            if submissions:
+                self._commit_batch(submissions)
+            for payload, future in batch:
+                if payload is self._FLUSH:
+                    future.set_result(True)
+
+    def _commit_batch(self, submissions: List[tuple]):
+        # Una transacción por BD de historial: los envíos de cada shard se
+        # confirman juntos y no bloquean a los de otros shards
+        groups: Dict[Optional[int], List[tuple]] = {}
+        for payload, future in submissions:
+            groups.setdefault(history_shard_for(payload[-1]), []).append((payload, future))
+
+        results = []  # (future, exam_id | excepción)
+        for group in groups.values():
+            results.extend(self._commit_group(group))
+
+        committed = sum(1 for _, outcome in results if not isinstance(outcome, BaseException))
+        with self._stats_lock:
+            self.batches += len(groups)
+            self.committed += committed
+            self.failed += len(results) - committed
+        for future, outcome in results:
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _commit_group(self, submissions: List[tuple]) -> List[tuple]:
+        """Confirma en una transacción envíos que van a la misma BD de historial"""
+        results = []
+        conn = None
+        try:
+            snapshot = _bank_cache.snapshot()
+            conn = get_history_connection(submissions[0][0][-1])
+            cursor = conn.cursor()
+            conn.execute('BEGIN IMMEDIATE')
+            for payload, future in submissions:
+                cursor.execute('SAVEPOINT submission')
+                try:
+                    exam_id = _write_exam_submission(cursor, snapshot, *payload)
+                    cursor.execute('RELEASE SAVEPOINT submission')
+                    results.append((future, exam_id))
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT submission')
+                    cursor.execute('RELEASE SAVEPOINT submission')
+                    results.append((future, e))
+            conn.commit()
+        except Exception as e:
+            # Falló el lote completo: nada quedó guardado
+            if conn is not None:
+                conn.rollback()
+            results = [(future, e) for _, future in submissions]
+        finally:
+            if conn is not None:
+                conn.close()
+        return results
+
+_write_behind: Optional[WriteBehindWriter] = None
+_write_behind_lock = threading.Lock()
+
+def start_write_behind(**options) -> WriteBehindWriter:
+    """
+    Activa el modo de escritura diferida (idempotente)
+
+    Los envíos pendientes se vacían automáticamente al salir del proceso.
+    """
+    global _write_behind
+    with _write_behind_lock:
+        if _write_behind is None:
+            _write_behind = WriteBehindWriter(**options)
+            atexit.register(stop_write_behind)  # Se ejecuta antes que close_pool (orden LIFO)
+        return _write_behind
+
+def stop_write_behind(timeout: Optional[float] = 10):
+    """Confirma los envíos pendientes y desactiva la escritura diferida"""
+    global _write_behind
+    with _write_behind_lock:
+        writer, _write_behind = _write_behind, None
+    if writer is not None:
+        writer.stop(timeout=timeout)
+
+def is_write_behind_enabled() -> bool:
+    return _write_behind is not None
+
+def flush_write_behind(timeout: Optional[float] = None) -> bool:
+    """Espera a que los envíos encolados estén confirmados (True si no hay escritor)"""
+    writer = _write_behind
+    return writer.flush(timeout=timeout) if writer is not None else True
+
+def get_write_behind_stats() -> Optional[Dict]:
+    writer = _write_behind
+    return writer.stats() if writer is not None else None
+
+def submit_exam_submission(total_questions: int, correct_answers: int, score: float,
+                           selected_categories: str, time_spent_seconds: int,
+                           answers: List[Dict], user_id: str = DEFAULT_USER_ID) -> Future:
+    """
+    Registra un examen sin esperar al commit
+
+    Con la escritura diferida activa, encola el envío y devuelve un Future
+    con el exam_id. Sin ella, escribe de forma síncrona y devuelve un
+    Future ya resuelto. Lanza queue.Full si la cola sigue llena tras
+    WRITE_BEHIND_PUT_TIMEOUT_SECONDS.
+    """
+    writer = _write_behind
+    if writer is not None:
+        return writer.submit(total_questions, correct_answers, score,
+                             selected_categories, time_spent_seconds, answers, user_id)
+    future: Future = Future()
+    future.set_result(record_exam_submission(
+        total_questions, correct_answers, score, selected_categories, time_spent_seconds,
+        answers, user_id
+    ))
+    return future
 
 if __name__ == '__main__':
+    import sys
+
     # Inicializar la base de datos si se ejecuta directamente
     init_database()
+
+    if '--rebuild-stats' in sys.argv:
+        result = rebuild_stats()
+        print("\n📊 Estadísticas recalculadas desde cero:")
+        for key, value in result['after'].items():
+            print(f"  {key}: {value}")
+        if result['consistent']:
+            print("✅ Los contadores incrementales coincidían")
+        else:
+            print("⚠️  Los contadores incrementales no coincidían y se han corregido:")
+            print(f"  Antes: {result['before']}")
@@ -0,0 +1,261 @@
+"""
+db_instrumentation.py - Instrumentación opcional de consultas SQLite para MongoDB Quiz System
+
+Registra, por cada sentencia SQL normalizada, el número de llamadas, el
+tiempo total, los percentiles p50/p95/p99 de latencia y las filas devueltas.
+Opcionalmente captura EXPLAIN QUERY PLAN de las sentencias más lentas que
+un umbral.
+
+Está desactivada por defecto. Se activa con:
+    - variable de entorno QUIZ_DB_INSTRUMENT=1 (y QUIZ_DB_SLOW_MS=<ms>)
+    - database.enable_query_instrumentation(slow_ms=...)
+
+Los datos se consultan en /debug/db-stats o desde la línea de comandos:
+    python db_instrumentation.py [--repeat N] [--slow-ms X] [--json]
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+SAMPLES_PER_QUERY = 1024  # Latencias guardadas por sentencia para los percentiles
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+def normalize_sql(sql: str) -> str:
+    """Normaliza una sentencia: espacios colapsados y listas IN (?, ?, ...) como (?...)"""
+    return _IN_LIST.sub('(?...)', _WHITESPACE.sub(' ', sql).strip())
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class QueryStats:
+    """Métricas acumuladas de una sentencia normalizada"""
+
+    __slots__ = ('sql', 'calls', 'total_ms', 'max_ms', 'rows', 'samples', 'plan')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLES_PER_QUERY)
+        self.plan: Optional[List[str]] = None
+
+    def to_dict(self) -> Dict:
+        ordered = sorted(self.samples)
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0,
+            'p50_ms': round(_percentile(ordered, 0.50), 3),
+            'p95_ms': round(_percentile(ordered, 0.95), 3),
+            'p99_ms': round(_percentile(ordered, 0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'plan': self.plan
+        }
+
+class QueryRecorder:
+    """Almacén de métricas por sentencia compartido por todas las conexiones"""
+
+    def __init__(self):
+        self.enabled = os.environ.get('QUIZ_DB_INSTRUMENT', '') not in ('', '0')
+        self.slow_ms = float(os.environ.get('QUIZ_DB_SLOW_MS', '50'))
+        self.capture_plans = True
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, slow_ms: Optional[float] = None, capture_plans: bool = True):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        self.capture_plans = capture_plans
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _get(self, key: str) -> QueryStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats.setdefault(key, QueryStats(key))
+        return stats
+
+    def record(self, key: str, elapsed_ms: float, rows: int) -> QueryStats:
+        """Registra una llamada completa (ejecución + lectura de filas)"""
+        with self._lock:
+            stats = self._get(key)
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.rows += rows
+            stats.samples.append(elapsed_ms)
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+            return stats
+
+    def add_fetch(self, key: str, elapsed_ms: float, rows: int):
+        """Suma tiempo y filas de lecturas posteriores a una llamada ya registrada"""
+        with self._lock:
+            stats = self._get(key)
+            stats.total_ms += elapsed_ms
+            stats.rows += rows
+
+    def needs_plan(self, stats: QueryStats, elapsed_ms: float) -> bool:
+        return self.capture_plans and stats.plan is None and elapsed_ms >= self.slow_ms
+
+    def snapshot(self) -> List[Dict]:
+        """Métricas de todas las sentencias, ordenadas por tiempo total"""
+        with self._lock:
+            items = [stats.to_dict() for stats in self._stats.values()]
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+recorder = QueryRecorder()
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor que mide cada sentencia.
+
+    La latencia de una llamada incluye execute() y la primera lectura de
+    filas (fetchone/fetchall/fetchmany), que es cuando SQLite hace la mayor
+    parte del trabajo en un SELECT.
+    """
+
+    _pending = None  # [clave, ms acumulados, filas, sql, parámetros]
+    _last_key = None
+
+    def _finish(self):
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        key, elapsed_ms, rows, sql, params = pending
+        stats = recorder.record(key, elapsed_ms, rows)
+        if recorder.needs_plan(stats, elapsed_ms) and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            try:
+                # Cursor sin instrumentar para no medir el propio EXPLAIN
+                plan_cursor = sqlite3.Cursor(self.connection)
+                plan = plan_cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+                plan_cursor.close()
+                stats.plan = [row[3] for row in plan]
+            except sqlite3.Error:
+                stats.plan = []
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        result = super().execute(sql, parameters)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        key = normalize_sql(sql)
+        self._last_key = key
+        self._pending = [key, elapsed_ms, 0, sql, parameters]
+        if self.description is None:
+            # INSERT/UPDATE/DDL: no habrá lecturas, cerrar la medición ya
+            self._pending[2] = max(self.rowcount, 0)
+            self._finish()
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        key = normalize_sql(sql)
+        self._last_key = key
+        recorder.record(key, elapsed_ms, max(self.rowcount, 0))
+        return result
+
+    def _timed_fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rows = len(result) if isinstance(result, list) else (0 if result is None else 1)
+        if self._pending is not None:
+            self._pending[1] += elapsed_ms
+            self._pending[2] += rows
+            self._finish()
+        elif self._last_key is not None:
+            recorder.add_fetch(self._last_key, elapsed_ms, rows)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+def format_report(stats: List[Dict], limit: int = 25) -> str:
+    """Tabla de texto con las sentencias más costosas"""
+    lines = [
+        f"{'llamadas':>8} {'total ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'filas':>8}  sentencia",
+        '-' * 100
+    ]
+    for item in stats[:limit]:
+        sql = item['sql'] if len(item['sql']) <= 80 else item['sql'][:77] + '...'
+        lines.append(
+            f"{item['calls']:>8} {item['total_ms']:>10.2f} {item['p50_ms']:>8.3f} "
+            f"{item['p95_ms']:>8.3f} {item['p99_ms']:>8.3f} {item['rows']:>8}  {sql}"
+        )
+        if item['plan']:
+            for detail in item['plan']:
+                lines.append(f"{'':>56}↳ {detail}")
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    # Ejecuta un recorrido de solo lectura por las rutas calientes y muestra las métricas
+    import database
+    from quiz_generator import QuizGenerator
+
+    repeat = 50
+    slow_ms = 0.0
+    if '--repeat' in sys.argv:
+        repeat = int(sys.argv[sys.argv.index('--repeat') + 1])
+    if '--slow-ms' in sys.argv:
+        slow_ms = float(sys.argv[sys.argv.index('--slow-ms') + 1])
+
+    database.enable_query_instrumentation(slow_ms=slow_ms)
+    generator = QuizGenerator(num_questions=20)
+    categories = [c['id'] for c in database.get_all_categories()]
+
+    for i in range(repeat):
+        database.invalidate_question_cache()  # Forzar también las lecturas del banco
+        generator.generate_balanced_exam(selected_categories=categories[: 1 + i % len(categories)])
+        database.get_random_questions(limit=20)
+        database.get_exam_history_page(limit=20)
+        database.get_overall_stats()
+        database.get_study_progress_all()
+        database.search_questions('agregación')
+
+    stats = database.get_query_stats()
+    if '--json' in sys.argv:
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    else:
+        print("="*60)
+        print(f"📈 MÉTRICAS DE CONSULTAS ({repeat} iteraciones)")
+        print("="*60 + "\n")
+        print(format_report(stats))
+        print()
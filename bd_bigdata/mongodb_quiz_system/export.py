@@ -0,0 +1,357 @@
+"""
+export.py - Exportación en streaming del historial de MongoDB Quiz System
+
+Vuelca los exámenes en NDJSON (un objeto JSON por línea) y las respuestas en
+CSV (una fila por respuesta). Las filas se leen con fetchmany y pasan a la
+salida por lotes a través de generadores, así que la memoria usada no
+depende del tamaño del historial. La salida se puede comprimir con gzip
+sobre la marcha.
+
+Filtros:
+- Fechas (desde/hasta): rango sobre el índice (user_id, exam_date, id) o
+  (exam_date) de exams, que además da el orden cronológico sin ordenar en
+  memoria.
+- Categoría: exámenes y respuestas con preguntas de esa categoría. Los IDs de
+  pregunta salen de la caché del banco y se comprueban en la búsqueda por
+  exam_id (idx_exam_answers_exam_id) de cada examen del rango.
+
+Cada BD de historial (principal y shards) se lee con una conexión propia de
+solo lectura, sin ocupar el pool. Las respuestas de los exámenes archivados
+(ver archive.py) salen del fichero de archivo, adjuntado (ATTACH) a esa
+misma conexión.
+
+app.py sirve lo mismo en /export/exams.ndjson y /export/answers.csv.
+
+Uso:
+    python export.py exams                          # Todos los exámenes -> exams.ndjson
+    python export.py answers --gzip                 # Todas las respuestas -> answers.csv.gz
+    python export.py answers --from 2025-01-01 --to 2025-06-30 --category 3
+    python export.py exams --user ana --output -    # A la salida estándar
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import database
+from archive import history_databases
+from database import archive_path_for
+
+EXPORT_FETCH_SIZE = 1000         # Filas por fetchmany
+EXPORT_CHUNK_BYTES = 64 * 1024   # Tamaño mínimo de cada trozo enviado a la salida
+GZIP_LEVEL = 6
+
+EXPORT_KINDS = {
+    'exams': ('exams.ndjson', 'application/x-ndjson'),
+    'answers': ('answers.csv', 'text/csv'),
+}
+
+EXAM_EXPORT_COLUMNS = ('id', 'user_id', 'exam_date', 'total_questions', 'correct_answers',
+                       'score', 'selected_categories', 'time_spent_seconds', 'archived_at')
+ANSWER_EXPORT_COLUMNS = ('exam_id', 'user_id', 'exam_date', 'answer_id', 'question_id',
+                         'category_id', 'user_answer', 'is_correct', 'time_spent_seconds',
+                         'time_spent_ms', 'first_answer_ms', 'last_answer_ms', 'answer_changes')
+
+# ==================== FILTROS ====================
+
+def _parse_export_date(value: Optional[str], upper: bool = False) -> Optional[str]:
+    """
+    Normaliza una fecha del filtro al formato de exam_date
+
+    Con upper=True devuelve el límite exclusivo: una fecha sin hora incluye
+    el día entero.
+
+    Raises:
+        ValueError: si la fecha no es ISO 8601
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Fecha inválida: {value!r} (formato AAAA-MM-DD[ HH:MM:SS])')
+    if upper:
+        parsed += timedelta(days=1) if len(value) == 10 else timedelta(seconds=1)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def build_export_filters(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                         category_id: Optional[int] = None,
+                         user_id: Optional[str] = None) -> Dict:
+    """
+    Valida y normaliza los filtros de exportación
+
+    Args:
+        date_from: Primer día u hora incluidos (ISO 8601)
+        date_to: Último día u hora incluidos (ISO 8601)
+        category_id: Solo exámenes/respuestas con preguntas de esta categoría
+        user_id: Solo el historial de este usuario (None = todos)
+
+    Raises:
+        ValueError: si alguna fecha es inválida o el rango está vacío
+    """
+    since = _parse_export_date(date_from)
+    until = _parse_export_date(date_to, upper=True)
+    if since and until and since >= until:
+        raise ValueError('La fecha inicial es posterior a la final')
+    return {
+        'since': since,
+        'until': until,
+        'category_id': category_id,
+        'user_id': database.normalize_user_id(user_id) if user_id is not None else None
+    }
+
+def _category_question_ids(category_id: int) -> str:
+    """IDs de las preguntas de la categoría como array JSON (un único parámetro SQL)"""
+    ids = [row[0] for row in database.get_questions_by_category(category_id, fields=('id',))]
+    return json.dumps(ids)
+
+def _exam_conditions(filters: Dict, has_archive: bool) -> Tuple[List[str], List]:
+    """Condiciones WHERE sobre exams (alias e) y sus parámetros"""
+    conditions, params = [], []
+    if filters['user_id'] is not None:
+        conditions.append('e.user_id = ?')
+        params.append(filters['user_id'])
+    if filters['since']:
+        conditions.append('e.exam_date >= ?')
+        params.append(filters['since'])
+    if filters['until']:
+        conditions.append('e.exam_date < ?')
+        params.append(filters['until'])
+    if filters['category_id'] is not None:
+        question_ids = _category_question_ids(filters['category_id'])
+        exists = '''EXISTS (SELECT 1 FROM {db}.exam_answers c
+                   WHERE c.exam_id = e.id
+                     AND c.question_id IN (SELECT value FROM json_each(?)))'''
+        if has_archive:
+            conditions.append(f"({exists.format(db='main')} OR "
+                              f"(e.archived_at IS NOT NULL AND {exists.format(db='archive')}))")
+            params.extend((question_ids, question_ids))
+        else:
+            conditions.append(exists.format(db='main'))
+            params.append(question_ids)
+    return conditions, params
+
+# ==================== LECTURA POR LOTES ====================
+
+def _export_paths(user_id: Optional[str]) -> List[str]:
+    """BD de historial a recorrer: la del usuario o todas (principal y shards)"""
+    if user_id is not None:
+        paths = [database.get_history_path(user_id)]
+    else:
+        paths = [path for path, _ in history_databases()]
+    return [path for path in paths if os.path.exists(path)]
+
+def _open_history(path: str) -> Tuple[sqlite3.Connection, bool]:
+    """
+    Conexión de solo lectura a una BD de historial con su archivo adjunto
+
+    Returns:
+        Tupla (conexión, True si se adjuntó el fichero de archivo)
+    """
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True,
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+    archive = archive_path_for(path)
+    if not os.path.exists(archive):
+        return conn, False
+    conn.execute('ATTACH DATABASE ? AS archive', (f'file:{archive}?mode=ro',))
+    return conn, True
+
+def _iter_batches(filters: Dict, build_query) -> Iterator[List[tuple]]:
+    """Lotes de filas de build_query(filtros, has_archive) en cada BD de historial"""
+    for path in _export_paths(filters['user_id']):
+        conn, has_archive = _open_history(path)
+        try:
+            cursor = conn.execute(*build_query(filters, has_archive))
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+def _exams_query(filters: Dict, has_archive: bool) -> Tuple[str, List]:
+    conditions, params = _exam_conditions(filters, has_archive)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = ', '.join(f'e.{column}' for column in EXAM_EXPORT_COLUMNS)
+    return f'SELECT {columns} FROM exams e {where} ORDER BY e.exam_date, e.id', params
+
+def _answers_query(filters: Dict, has_archive: bool) -> Tuple[str, List]:
+    """
+    Respuestas de los exámenes filtrados, en orden (exam_date, exam_id, id)
+
+    CROSS JOIN fija exams como bucle exterior (recorrido por índice y ya
+    ordenado) y cada examen busca sus respuestas por idx_exam_answers_exam_id.
+    Las de exámenes archivados salen de archive.exam_answers; SQLite combina
+    las dos partes ya ordenadas (MERGE) sin ordenar en memoria.
+    """
+    # La categoría se comprueba en cada respuesta, no con el EXISTS sobre exams
+    conditions, params = _exam_conditions(dict(filters, category_id=None), False)
+    answer_condition, answer_params = '', []
+    if filters['category_id'] is not None:
+        answer_condition = 'AND ea.question_id IN (SELECT value FROM json_each(?))'
+        answer_params.append(_category_question_ids(filters['category_id']))
+
+    parts, all_params = [], []
+    sources = [('main', 'e.archived_at IS NULL')]
+    if has_archive:
+        sources.append(('archive', 'e.archived_at IS NOT NULL'))
+    for db, archived in sources:
+        where = ' AND '.join([*conditions, archived])
+        parts.append(f'''
+            SELECT e.exam_date, e.id AS exam_id, ea.id AS answer_id, e.user_id, ea.question_id,
+                   ea.user_answer, ea.is_correct, ea.time_spent_seconds, ea.time_spent_ms,
+                   ea.first_answer_ms, ea.last_answer_ms, ea.answer_changes
+            FROM exams e CROSS JOIN {db}.exam_answers ea
+            WHERE ea.exam_id = e.id AND {where} {answer_condition}
+        ''')
+        all_params.extend([*params, *answer_params])
+    return ' UNION ALL '.join(parts) + ' ORDER BY exam_date, exam_id, answer_id', all_params
+
+# ==================== FORMATOS ====================
+
+def iter_exams_ndjson(filters: Dict, stats: Optional[Dict] = None) -> Iterator[str]:
+    """Exámenes en NDJSON, un bloque de texto por lote de filas"""
+    for rows in _iter_batches(filters, _exams_query):
+        lines = []
+        for row in rows:
+            exam = dict(zip(EXAM_EXPORT_COLUMNS, row))
+            try:
+                exam['selected_categories'] = json.loads(exam['selected_categories'] or '[]')
+            except (TypeError, ValueError):
+                exam['selected_categories'] = []
+            lines.append(json.dumps(exam, ensure_ascii=False, separators=(',', ':')))
+        if stats is not None:
+            stats['rows'] = stats.get('rows', 0) + len(rows)
+        yield '\n'.join(lines) + '\n'
+
+def iter_answers_csv(filters: Dict, stats: Optional[Dict] = None) -> Iterator[str]:
+    """Respuestas en CSV (con cabecera), un bloque de texto por lote de filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(ANSWER_EXPORT_COLUMNS)
+    for rows in _iter_batches(filters, _answers_query):
+        questions = database.get_questions_by_ids(
+            list({row[4] for row in rows}), preserve_order=False, fields=('category_id',)
+        )
+        for (exam_date, exam_id, answer_id, user_id, question_id, user_answer, is_correct,
+             *timings) in rows:
+            question = questions.get(question_id)
+            writer.writerow((exam_id, user_id, exam_date, answer_id, question_id,
+                             question[0] if question else None, user_answer,
+                             1 if is_correct else 0, *timings))
+        if stats is not None:
+            stats['rows'] = stats.get('rows', 0) + len(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def encode_chunks(chunks: Iterator[str], compress: bool = False) -> Iterator[bytes]:
+    """
+    Codifica en UTF-8 (y opcionalmente gzip) agrupando en trozos de
+    EXPORT_CHUNK_BYTES para no enviar un write por cada lote pequeño
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    pending, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b''.join(pending)
+            pending, size = [], 0
+    if compressor is not None:
+        pending.append(compressor.flush())
+    if pending:
+        yield b''.join(pending)
+
+def export_stream(kind: str, filters: Dict, compress: bool = False,
+                  stats: Optional[Dict] = None) -> Iterator[bytes]:
+    """
+    Exportación completa como iterador de bytes (para una respuesta HTTP o un fichero)
+
+    Args:
+        kind: 'exams' (NDJSON) o 'answers' (CSV)
+        filters: Resultado de build_export_filters
+        compress: Comprimir con gzip
+        stats: Dict opcional donde se acumula el número de filas ('rows')
+
+    Raises:
+        ValueError: si kind no es un tipo de exportación conocido
+    """
+    if kind == 'exams':
+        chunks = iter_exams_ndjson(filters, stats)
+    elif kind == 'answers':
+        chunks = iter_answers_csv(filters, stats)
+    else:
+        raise ValueError(f'Tipo de exportación desconocido: {kind!r}')
+    return encode_chunks(chunks, compress)
+
+def export_to_file(kind: str, output: str, filters: Dict, compress: bool = False) -> Dict:
+    """
+    Escribe una exportación en un fichero ('-' = salida estándar)
+
+    Returns:
+        Dict con rows, bytes y seconds
+    """
+    database.flush_write_behind()
+    stats = {'rows': 0}
+    written = 0
+    start = time.perf_counter()
+    stream = export_stream(kind, filters, compress, stats)
+    if output == '-':
+        for data in stream:
+            sys.stdout.buffer.write(data)
+            written += len(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(output, 'wb') as f:
+            for data in stream:
+                f.write(data)
+                written += len(data)
+    return {'rows': stats['rows'], 'bytes': written,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+def _option(name: str) -> Optional[str]:
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else None
+
+if __name__ == '__main__':
+    kind = sys.argv[1] if len(sys.argv) > 1 else ''
+    if kind not in EXPORT_KINDS:
+        print("Uso: python export.py {exams|answers} [--from AAAA-MM-DD] [--to AAAA-MM-DD] "
+              "[--category ID] [--user USUARIO] [--gzip] [--output FICHERO|-]")
+        sys.exit(1)
+
+    compress = '--gzip' in sys.argv
+    output = _option('--output') or EXPORT_KINDS[kind][0] + ('.gz' if compress else '')
+    category = _option('--category')
+    try:
+        filters = build_export_filters(date_from=_option('--from'), date_to=_option('--to'),
+                                       category_id=int(category) if category else None,
+                                       user_id=_option('--user'))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    # Con --output - los datos van a stdout y el informe a stderr
+    log = sys.stderr if output == '-' else sys.stdout
+    print("="*60, file=log)
+    print(f"📤 EXPORTACIÓN DE {'EXÁMENES' if kind == 'exams' else 'RESPUESTAS'}", file=log)
+    print("="*60 + "\n", file=log)
+
+    report = export_to_file(kind, output, filters, compress=compress)
+    print(f"✅ {report['rows']} filas -> {'stdout' if output == '-' else output}", file=log)
+    print(f"  {report['bytes'] / (1024 * 1024):.2f} MB en {report['seconds']} s\n", file=log)
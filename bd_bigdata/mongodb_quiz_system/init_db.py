@@ -14,7 +14,11 @@ from database import (
     init_database,
     insert_category,
     insert_question,
-    get_connection
+    get_connection,
+    close_pool,
+    close_shards,
+    get_shard_router,
+    archive_path_for
 )
 from question_bank import get_all_questions, get_question_stats
 
@@ -248,11 +252,34 @@ def main():
             print("\n❌ Inicialización cancelada.")
             return
 
-        # Eliminar archivo de BD existente
+        # Cerrar las conexiones abiertas antes de borrar el archivo
+        close_pool()
+
+        # Eliminar archivo de BD existente (y los ficheros auxiliares del modo WAL)
         if os.path.exists('mongodb_quiz.db'):
             os.remove('mongodb_quiz.db')
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists('mongodb_quiz.db' + suffix):
+                    os.remove('mongodb_quiz.db' + suffix)
             print("✓ Base de datos anterior eliminada.")
 
+        # Exámenes archivados (ver archive.py)
+        if os.path.exists(archive_path_for('mongodb_quiz.db')):
+            os.remove(archive_path_for('mongodb_quiz.db'))
+
+        # El historial de los shards apunta a IDs de preguntas de la BD anterior
+        router = get_shard_router()
+        if router is not None:
+            for index in router.existing_shards():
+                path = router.path_for_shard(index)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                if os.path.exists(archive_path_for(path)):
+                    os.remove(archive_path_for(path))
+            close_shards()
+            print("✓ Historial de los shards eliminado.")
+
     # Paso 1: Crear estructura de BD
     print("\n🗄️  Paso 1: Creando estructura de base de datos...")
     init_database()
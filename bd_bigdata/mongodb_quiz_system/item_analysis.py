@@ -0,0 +1,240 @@
+"""
+item_analysis.py - Análisis de ítems (preguntas) de MongoDB Quiz System
+
+Recalcula para cada pregunta, a partir de todas las respuestas guardadas
+(BD principal, shards y ficheros de archivo):
+
+- p_value: índice de dificultad, proporción de respuestas correctas.
+- discrimination: correlación punto-biserial entre acertar la pregunta y la
+  nota del resto del examen (sin contar esa pregunta). Valores bajos o
+  negativos señalan preguntas ambiguas o con la clave mal puesta.
+
+Las respuestas se cargan en arrays y todo el cálculo se hace con NumPy
+(np.bincount por examen y por pregunta), sin bucles en Python por
+respuesta. Los resultados se guardan en item_stats de la BD principal; los
+contadores incrementales de item_stats no se tocan.
+
+Requiere NumPy (pip install numpy).
+
+Uso:
+    python item_analysis.py              # Recalcula y guarda p_value y discrimination
+    python item_analysis.py --dry-run    # Solo calcula y muestra el resumen
+    python item_analysis.py --top 15     # Muestra las 15 preguntas menos discriminantes
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import database
+from archive import history_databases
+from database import archive_path_for
+
+MIN_RESPONSES = 10      # Respuestas mínimas para calcular la discriminación
+FETCH_SIZE = 5000       # Filas por fetchmany al cargar exam_answers
+
+def _read_answers(conn, answer_ids: array, exam_ids: array, question_ids: array, correct: array):
+    cursor = conn.execute('SELECT id, exam_id, question_id, is_correct FROM exam_answers')
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for answer_id, exam_id, question_id, is_correct in rows:
+            answer_ids.append(answer_id)
+            exam_ids.append(exam_id)
+            question_ids.append(question_id)
+            correct.append(1 if is_correct else 0)
+
+def load_responses() -> Tuple:
+    """
+    Carga (exam_key, question_id, is_correct) de todas las BD de historial
+
+    Los IDs de examen solo son únicos dentro de cada fichero, así que se
+    renumeran por fichero; las respuestas presentes a la vez en la BD
+    caliente y en su archivo (archivado interrumpido) se cuentan una vez.
+
+    Returns:
+        Tupla de arrays NumPy (exam_index denso, question_ids, correct)
+    """
+    exam_parts, question_parts, correct_parts = [], [], []
+    exam_offset = 0
+    for history_path, connect in history_databases():
+        answer_ids, exam_ids, question_ids, correct = array('q'), array('q'), array('q'), array('b')
+        conn = connect()
+        try:
+            _read_answers(conn, answer_ids, exam_ids, question_ids, correct)
+        finally:
+            conn.close()
+        archive = archive_path_for(history_path)
+        if os.path.exists(archive):
+            conn = sqlite3.connect(f'file:{archive}?mode=ro', uri=True)
+            try:
+                _read_answers(conn, answer_ids, exam_ids, question_ids, correct)
+            finally:
+                conn.close()
+        if not answer_ids:
+            continue
+
+        _, first = np.unique(np.frombuffer(answer_ids, dtype=np.int64), return_index=True)
+        exams = np.frombuffer(exam_ids, dtype=np.int64)[first]
+        unique_exams, exam_index = np.unique(exams, return_inverse=True)
+        exam_parts.append(exam_index + exam_offset)
+        exam_offset += len(unique_exams)
+        question_parts.append(np.frombuffer(question_ids, dtype=np.int64)[first])
+        correct_parts.append(np.frombuffer(correct, dtype=np.int8)[first])
+
+    if not exam_parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.int8)
+    return np.concatenate(exam_parts), np.concatenate(question_parts), np.concatenate(correct_parts)
+
+def compute_item_statistics(exam_index, question_ids, correct,
+                            min_responses: int = MIN_RESPONSES) -> Dict:
+    """
+    p-value y discriminación punto-biserial de cada pregunta (vectorizado)
+
+    Args:
+        exam_index: Índice denso del examen de cada respuesta
+        question_ids: Pregunta de cada respuesta
+        correct: 1 si la respuesta es correcta, 0 si no
+        min_responses: Respuestas mínimas (en exámenes de 2+ preguntas)
+                       para dar la discriminación
+
+    Returns:
+        Dict de arrays alineados: question_ids, responses, p_value y
+        discrimination (NaN si no hay datos suficientes o varianza nula)
+    """
+    x = correct.astype(np.float64)
+    items, item_index = np.unique(question_ids, return_inverse=True)
+    k = len(items)
+    responses = np.bincount(item_index, minlength=k)
+    p_value = np.bincount(item_index, weights=x, minlength=k) / np.maximum(responses, 1)
+
+    # Nota del resto del examen: proporción de aciertos sin contar la propia pregunta
+    exam_n = np.bincount(exam_index)
+    exam_correct = np.bincount(exam_index, weights=x)
+    others = exam_n[exam_index] - 1
+    valid = others > 0
+    rest = (exam_correct[exam_index][valid] - x[valid]) / others[valid]
+    xv, iv = x[valid], item_index[valid]
+
+    n = np.bincount(iv, minlength=k).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.bincount(iv, weights=xv, minlength=k) / n
+        mean_r = np.bincount(iv, weights=rest, minlength=k) / n
+        cov = np.bincount(iv, weights=xv * rest, minlength=k) / n - mean_x * mean_r
+        var_x = mean_x * (1 - mean_x)  # x es binaria: E[x²] = E[x]
+        var_r = np.maximum(np.bincount(iv, weights=rest * rest, minlength=k) / n - mean_r ** 2, 0)
+        denominator = np.sqrt(var_x * var_r)
+        discrimination = np.where(denominator > 1e-12, cov / denominator, np.nan)
+    discrimination[n < min_responses] = np.nan
+
+    return {
+        'question_ids': items,
+        'responses': responses,
+        'p_value': p_value,
+        'discrimination': np.clip(discrimination, -1, 1)
+    }
+
+def save_item_statistics(stats: Dict) -> int:
+    """Guarda p_value y discrimination en item_stats de la BD principal"""
+    analyzed_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        (int(qid), int(responses), float(p),
+         None if np.isnan(d) else round(float(d), 6), analyzed_at)
+        for qid, responses, p, d in zip(stats['question_ids'], stats['responses'],
+                                        stats['p_value'], stats['discrimination'])
+    ]
+    conn = database.get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('''
+            INSERT INTO item_stats (question_id, analyzed_responses, p_value, discrimination, analyzed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(question_id) DO UPDATE SET
+                analyzed_responses = excluded.analyzed_responses,
+                p_value = excluded.p_value,
+                discrimination = excluded.discrimination,
+                analyzed_at = excluded.analyzed_at
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+def run_item_analysis(dry_run: bool = False, min_responses: int = MIN_RESPONSES) -> Dict:
+    """
+    Carga todas las respuestas, calcula las estadísticas y (salvo dry_run) las guarda
+
+    Raises:
+        RuntimeError: si NumPy no está instalado
+    """
+    if np is None:
+        raise RuntimeError('item_analysis.py requiere NumPy (pip install numpy)')
+    database.flush_write_behind()
+
+    start = time.perf_counter()
+    exam_index, question_ids, correct = load_responses()
+    loaded = time.perf_counter()
+    stats = compute_item_statistics(exam_index, question_ids, correct, min_responses)
+    computed = time.perf_counter()
+    saved = 0 if dry_run else save_item_statistics(stats)
+
+    return {
+        'responses': int(len(question_ids)),
+        'exams': int(exam_index.max() + 1) if len(exam_index) else 0,
+        'questions': int(len(stats['question_ids'])),
+        'saved': saved,
+        'load_seconds': round(loaded - start, 3),
+        'compute_seconds': round(computed - loaded, 4),
+        'stats': stats
+    }
+
+def _least_discriminating(stats: Dict, top: int) -> List[Tuple[int, int, float, float]]:
+    discrimination = stats['discrimination']
+    order = [i for i in np.argsort(discrimination) if not np.isnan(discrimination[i])][:top]
+    return [(int(stats['question_ids'][i]), int(stats['responses'][i]),
+             float(stats['p_value'][i]), float(discrimination[i])) for i in order]
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    top = int(sys.argv[sys.argv.index('--top') + 1]) if '--top' in sys.argv else 10
+
+    print("="*60)
+    print("📐 ANÁLISIS DE ÍTEMS (p-value y discriminación)")
+    print("="*60 + "\n")
+
+    try:
+        report = run_item_analysis(dry_run=dry_run)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"📊 {report['responses']} respuestas de {report['exams']} exámenes, "
+          f"{report['questions']} preguntas")
+    print(f"  Carga: {report['load_seconds']} s, cálculo: {report['compute_seconds']} s")
+    if dry_run:
+        print("  (--dry-run: no se guardó nada)")
+    else:
+        print(f"  ✅ Guardadas {report['saved']} filas en item_stats")
+
+    worst = _least_discriminating(report['stats'], top)
+    if worst:
+        print(f"\n⚠️  Preguntas menos discriminantes (mínimo {MIN_RESPONSES} respuestas):")
+        print(f"  {'pregunta':>8} {'resp.':>6} {'p-value':>8} {'r_pb':>7}")
+        for question_id, responses, p_value, discrimination in worst:
+            flag = '  ← revisar' if discrimination < 0 else ''
+            print(f"  {question_id:>8} {responses:>6} {p_value:>8.3f} {discrimination:>7.3f}{flag}")
+    print()
@@ -55,6 +55,18 @@ def limpiar_datos_prueba():
         cursor.execute("DELETE FROM exams")
         print("   ✓ Exámenes eliminados")
 
+        cursor.execute("DELETE FROM item_stats")
+        print("   ✓ Estadísticas por pregunta eliminadas")
+
+        cursor.execute("DELETE FROM item_params")
+        print("   ✓ Calibración 2PL eliminada (el test adaptativo vuelve al prior)")
+
+        cursor.execute("DELETE FROM review_schedule")
+        print("   ✓ Calendario de repaso eliminado")
+
+        cursor.execute("DELETE FROM progress_read_model")
+        print("   ✓ Resumen de progreso eliminado (se regenera al abrir /progress)")
+
         # Resetear progreso (poner en 0 en lugar de eliminar)
         cursor.execute("""
             UPDATE study_progress
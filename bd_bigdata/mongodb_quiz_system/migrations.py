@@ -0,0 +1,899 @@
+"""
+migrations.py - Migraciones versionadas del esquema SQLite para MongoDB Quiz System
+
+Cada migración tiene un número de versión, una descripción y una lista de pasos
+(sentencias SQL o funciones que reciben un cursor). Las migraciones se aplican
+en orden y la versión aplicada queda registrada en la tabla schema_version, de
+modo que una base de datos existente (mongodb_quiz.db) se actualiza en el sitio
+sin perder datos.
+
+Uso:
+    python migrations.py           # Aplica las migraciones pendientes
+    python migrations.py --check   # Además verifica los planes de consulta
+"""
+
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple, Union
+
+from spaced_repetition import (
+    NEW_REVIEW_STATE, review_quality, sm2_review, due_date_after
+)
+
+Step = Union[str, Callable[[sqlite3.Cursor], None]]
+
+# ==================== TRIGGERS COMPARTIDOS ====================
+
+DEFAULT_USER_ID = 'local'  # Usuario de los datos anteriores al soporte multiusuario
+
+# Mantienen los totales de respuestas de stats_summary (migraciones 4 y 6)
+STUDY_PROGRESS_STATS_TRIGGERS: List[str] = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_insert_stats
+    AFTER INSERT ON study_progress
+    BEGIN
+        UPDATE stats_summary SET
+            total_answered = total_answered + COALESCE(NEW.questions_answered, 0),
+            total_correct = total_correct + COALESCE(NEW.questions_correct, 0)
+        WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_update_stats
+    AFTER UPDATE OF questions_answered, questions_correct ON study_progress
+    BEGIN
+        UPDATE stats_summary SET
+            total_answered = total_answered
+                - COALESCE(OLD.questions_answered, 0) + COALESCE(NEW.questions_answered, 0),
+            total_correct = total_correct
+                - COALESCE(OLD.questions_correct, 0) + COALESCE(NEW.questions_correct, 0)
+        WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_delete_stats
+    AFTER DELETE ON study_progress
+    BEGIN
+        UPDATE stats_summary SET
+            total_answered = total_answered - COALESCE(OLD.questions_answered, 0),
+            total_correct = total_correct - COALESCE(OLD.questions_correct, 0)
+        WHERE id = 1;
+    END
+    ''',
+]
+
+# Resumen por usuario, equivalente a stats_summary pero con una fila por user_id
+USER_STATS_SCHEMA: List[str] = [
+    '''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id TEXT PRIMARY KEY,
+        total_exams INTEGER NOT NULL DEFAULT 0,
+        sum_scores REAL NOT NULL DEFAULT 0,
+        best_score REAL,
+        total_answered INTEGER NOT NULL DEFAULT 0,
+        total_correct INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_exams_insert_user_stats
+    AFTER INSERT ON exams WHEN NEW.score IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET
+            total_exams = total_exams + 1,
+            sum_scores = sum_scores + NEW.score,
+            best_score = CASE WHEN best_score IS NULL OR NEW.score > best_score
+                              THEN NEW.score ELSE best_score END
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_exams_update_user_stats
+    AFTER UPDATE OF score ON exams
+    BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET
+            total_exams = total_exams
+                - (OLD.score IS NOT NULL) + (NEW.score IS NOT NULL),
+            sum_scores = sum_scores - COALESCE(OLD.score, 0) + COALESCE(NEW.score, 0),
+            best_score = (SELECT MAX(score) FROM exams WHERE user_id = NEW.user_id)
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_exams_delete_user_stats
+    AFTER DELETE ON exams WHEN OLD.score IS NOT NULL
+    BEGIN
+        UPDATE user_stats SET
+            total_exams = total_exams - 1,
+            sum_scores = sum_scores - OLD.score,
+            best_score = (SELECT MAX(score) FROM exams WHERE user_id = OLD.user_id)
+        WHERE user_id = OLD.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_insert_user_stats
+    AFTER INSERT ON study_progress
+    BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET
+            total_answered = total_answered + COALESCE(NEW.questions_answered, 0),
+            total_correct = total_correct + COALESCE(NEW.questions_correct, 0)
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_update_user_stats
+    AFTER UPDATE OF questions_answered, questions_correct ON study_progress
+    BEGIN
+        UPDATE user_stats SET
+            total_answered = total_answered
+                - COALESCE(OLD.questions_answered, 0) + COALESCE(NEW.questions_answered, 0),
+            total_correct = total_correct
+                - COALESCE(OLD.questions_correct, 0) + COALESCE(NEW.questions_correct, 0)
+        WHERE user_id = NEW.user_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_study_progress_delete_user_stats
+    AFTER DELETE ON study_progress
+    BEGIN
+        UPDATE user_stats SET
+            total_answered = total_answered - COALESCE(OLD.questions_answered, 0),
+            total_correct = total_correct - COALESCE(OLD.questions_correct, 0)
+        WHERE user_id = OLD.user_id;
+    END
+    ''',
+]
+
+# Estadísticas por pregunta (item_stats). Los contadores los mantiene un
+# trigger sobre exam_answers, así que se actualizan dentro de la misma
+# transacción que guarda el examen (también en la escritura diferida). No hay
+# trigger de borrado: archive.py borra respuestas de la BD caliente y los
+# contadores deben conservarlas. p_value y discrimination los recalcula
+# item_analysis.py en la BD principal.
+ITEM_STATS_SCHEMA: List[str] = [
+    '''
+    CREATE TABLE IF NOT EXISTS item_stats (
+        question_id INTEGER PRIMARY KEY,
+        times_shown INTEGER NOT NULL DEFAULT 0,
+        times_correct INTEGER NOT NULL DEFAULT 0,
+        picks_a INTEGER NOT NULL DEFAULT 0,
+        picks_b INTEGER NOT NULL DEFAULT 0,
+        picks_c INTEGER NOT NULL DEFAULT 0,
+        picks_d INTEGER NOT NULL DEFAULT 0,
+        picks_e INTEGER NOT NULL DEFAULT 0,
+        last_seen TIMESTAMP,
+        p_value REAL,
+        discrimination REAL,
+        analyzed_responses INTEGER,
+        analyzed_at TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_exam_answers_insert_item_stats
+    AFTER INSERT ON exam_answers
+    BEGIN
+        INSERT OR IGNORE INTO item_stats (question_id) VALUES (NEW.question_id);
+        UPDATE item_stats SET
+            times_shown = times_shown + 1,
+            times_correct = times_correct + (NEW.is_correct != 0),
+            picks_a = picks_a + (NEW.user_answer IS 'a'),
+            picks_b = picks_b + (NEW.user_answer IS 'b'),
+            picks_c = picks_c + (NEW.user_answer IS 'c'),
+            picks_d = picks_d + (NEW.user_answer IS 'd'),
+            picks_e = picks_e + (NEW.user_answer IS 'e'),
+            last_seen = CURRENT_TIMESTAMP
+        WHERE question_id = NEW.question_id;
+    END
+    ''',
+]
+
+# Tiempos reales por pregunta que envía quiz.js (ver app.submit_exam)
+ANSWER_TIMING_COLUMNS: List[str] = [
+    'ALTER TABLE exam_answers ADD COLUMN time_spent_ms INTEGER',
+    'ALTER TABLE exam_answers ADD COLUMN first_answer_ms INTEGER',
+    'ALTER TABLE exam_answers ADD COLUMN last_answer_ms INTEGER',
+    'ALTER TABLE exam_answers ADD COLUMN answer_changes INTEGER',
+]
+
+# Modelo de lectura de /progress: una fila por (usuario, categoría) con el
+# nombre de la categoría y el porcentaje de acierto ya calculados. Lo
+# rellena database._refresh_progress_read_model en la misma transacción que
+# cambia study_progress; version crece con cada refresco y sirve para
+# invalidar la página cacheada.
+PROGRESS_READ_MODEL_SCHEMA: List[str] = [
+    '''
+    CREATE TABLE IF NOT EXISTS progress_read_model (
+        user_id TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        category_name TEXT NOT NULL,
+        category_description TEXT,
+        session_number INTEGER,
+        questions_answered INTEGER NOT NULL DEFAULT 0,
+        questions_correct INTEGER NOT NULL DEFAULT 0,
+        success_rate REAL NOT NULL DEFAULT 0,
+        last_study_date TIMESTAMP,
+        version INTEGER NOT NULL,
+        content_version INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category_id)
+    )
+    ''',
+]
+
+# Parámetros 2PL por pregunta (a = discriminación, b = dificultad) que
+# calibra adaptive.py con todo el historial. Cada calibración sustituye la
+# tabla entera, así que todas las filas comparten calibrated_at.
+ITEM_PARAMS_SCHEMA: List[str] = [
+    '''
+    CREATE TABLE IF NOT EXISTS item_params (
+        question_id INTEGER PRIMARY KEY,
+        a REAL NOT NULL,
+        b REAL NOT NULL,
+        responses INTEGER NOT NULL DEFAULT 0,
+        calibrated_at TIMESTAMP NOT NULL
+    )
+    ''',
+]
+
+# Repaso espaciado (SM-2) por usuario y pregunta (ver spaced_repetition.py).
+# Vive en cada BD de historial junto a exam_answers y lo actualiza en lote
+# database._update_review_schedule al guardar cada examen. El índice por
+# (user_id, due_date) sirve las preguntas pendientes con una búsqueda por
+# rango, sin recorrer el historial.
+REVIEW_SCHEDULE_SCHEMA: List[str] = [
+    '''
+    CREATE TABLE IF NOT EXISTS review_schedule (
+        user_id TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        ease REAL NOT NULL,
+        interval_days INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL,
+        lapses INTEGER NOT NULL,
+        due_date TIMESTAMP NOT NULL,
+        last_reviewed TIMESTAMP NOT NULL,
+        PRIMARY KEY (user_id, question_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_review_schedule_due ON review_schedule (user_id, due_date, question_id)',
+]
+
+# ==================== PASOS EN PYTHON ====================
+
+def rebuild_stats_summary(cursor: sqlite3.Cursor):
+    """Recalcula desde cero la fila de stats_summary a partir de exams y study_progress"""
+    cursor.execute('''
+        UPDATE stats_summary SET
+            total_exams = (SELECT COUNT(*) FROM exams WHERE score IS NOT NULL),
+            sum_scores = (SELECT COALESCE(SUM(score), 0) FROM exams WHERE score IS NOT NULL),
+            best_score = (SELECT MAX(score) FROM exams),
+            total_answered = (SELECT COALESCE(SUM(questions_answered), 0) FROM study_progress),
+            total_correct = (SELECT COALESCE(SUM(questions_correct), 0) FROM study_progress)
+        WHERE id = 1
+    ''')
+
+def rebuild_user_stats(cursor: sqlite3.Cursor):
+    """Recalcula desde cero user_stats a partir de exams y study_progress"""
+    cursor.execute('DELETE FROM user_stats')
+    cursor.execute('''
+        INSERT INTO user_stats
+        (user_id, total_exams, sum_scores, best_score, total_answered, total_correct)
+        SELECT u.user_id,
+               (SELECT COUNT(*) FROM exams e WHERE e.user_id = u.user_id AND e.score IS NOT NULL),
+               (SELECT COALESCE(SUM(score), 0) FROM exams e WHERE e.user_id = u.user_id AND e.score IS NOT NULL),
+               (SELECT MAX(score) FROM exams e WHERE e.user_id = u.user_id),
+               (SELECT COALESCE(SUM(questions_answered), 0) FROM study_progress sp WHERE sp.user_id = u.user_id),
+               (SELECT COALESCE(SUM(questions_correct), 0) FROM study_progress sp WHERE sp.user_id = u.user_id)
+        FROM (SELECT user_id FROM exams UNION SELECT user_id FROM study_progress) u
+    ''')
+
+def rebuild_item_stats(cursor: sqlite3.Cursor):
+    """
+    Recalcula los contadores de item_stats a partir de exam_answers
+
+    Conserva p_value y discrimination. Las respuestas ya archivadas no están
+    en exam_answers, así que solo debe usarse antes de archivar.
+    """
+    cursor.execute('''
+        UPDATE item_stats SET times_shown = 0, times_correct = 0, picks_a = 0, picks_b = 0,
+                              picks_c = 0, picks_d = 0, picks_e = 0, last_seen = NULL
+    ''')
+    cursor.execute('''
+        INSERT INTO item_stats
+        (question_id, times_shown, times_correct, picks_a, picks_b, picks_c, picks_d, picks_e, last_seen)
+        SELECT ea.question_id, COUNT(*), SUM(ea.is_correct != 0),
+               SUM(ea.user_answer IS 'a'), SUM(ea.user_answer IS 'b'), SUM(ea.user_answer IS 'c'),
+               SUM(ea.user_answer IS 'd'), SUM(ea.user_answer IS 'e'), MAX(e.exam_date)
+        FROM exam_answers ea
+        JOIN exams e ON e.id = ea.exam_id
+        GROUP BY ea.question_id
+        ON CONFLICT(question_id) DO UPDATE SET
+            times_shown = excluded.times_shown,
+            times_correct = excluded.times_correct,
+            picks_a = excluded.picks_a,
+            picks_b = excluded.picks_b,
+            picks_c = excluded.picks_c,
+            picks_d = excluded.picks_d,
+            picks_e = excluded.picks_e,
+            last_seen = excluded.last_seen
+    ''')
+
+def rebuild_study_progress_per_user(cursor: sqlite3.Cursor):
+    """
+    Reconstruye study_progress con user_id y UNIQUE(user_id, category_id)
+
+    SQLite no permite cambiar una restricción UNIQUE con ALTER TABLE, así
+    que se copia a una tabla nueva. Las filas existentes pasan al usuario
+    DEFAULT_USER_ID; los triggers de la tabla antigua se recrean después.
+    """
+    cursor.execute('''
+        CREATE TABLE study_progress_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT 'local',
+            category_id INTEGER NOT NULL,
+            questions_answered INTEGER DEFAULT 0,
+            questions_correct INTEGER DEFAULT 0,
+            last_study_date TIMESTAMP,
+            UNIQUE (user_id, category_id),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO study_progress_new
+        (id, user_id, category_id, questions_answered, questions_correct, last_study_date)
+        SELECT id, ?, category_id, questions_answered, questions_correct, last_study_date
+        FROM study_progress
+    ''', (DEFAULT_USER_ID,))
+    cursor.execute('DROP TABLE study_progress')
+    cursor.execute('ALTER TABLE study_progress_new RENAME TO study_progress')
+
+def rebuild_review_schedule(cursor: sqlite3.Cursor):
+    """
+    Reconstruye review_schedule repasando exam_answers en orden cronológico
+
+    Como rebuild_item_stats, solo ve las respuestas que siguen en la BD
+    caliente (no las archivadas).
+    """
+    states: Dict[Tuple[str, int], Tuple] = {}
+    cursor.execute('''
+        SELECT e.user_id, ea.question_id, ea.is_correct, ea.time_spent_ms, ea.answer_changes,
+               e.exam_date
+        FROM exam_answers ea
+        JOIN exams e ON e.id = ea.exam_id
+        ORDER BY e.exam_date, e.id, ea.id
+    ''')
+    for user_id, question_id, is_correct, time_spent_ms, answer_changes, exam_date in cursor:
+        if exam_date is None:
+            continue
+        key = (user_id, question_id)
+        previous = states.get(key)
+        state = sm2_review(previous[0] if previous else NEW_REVIEW_STATE,
+                           review_quality(is_correct, time_spent_ms, answer_changes))
+        states[key] = (state, exam_date)
+
+    cursor.execute('DELETE FROM review_schedule')
+    cursor.executemany('''
+        INSERT INTO review_schedule
+        (user_id, question_id, ease, interval_days, repetitions, lapses, due_date, last_reviewed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (user_id, question_id, *state,
+         due_date_after(datetime.fromisoformat(reviewed), state[1]), reviewed)
+        for (user_id, question_id), (state, reviewed) in states.items()
+    ])
+
+FTS_COLUMNS = ('question_text', 'option_a', 'option_b', 'option_c',
+               'option_d', 'option_e', 'explanation')
+
+def create_questions_fts(cursor: sqlite3.Cursor):
+    """
+    Crea el índice de texto completo FTS5 sobre questions y sus triggers
+
+    Si el SQLite del sistema no incluye FTS5 la migración se da por aplicada
+    sin índice y la búsqueda usa LIKE como alternativa.
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'NEW.{c}' for c in FTS_COLUMNS)
+    old_values = ', '.join(f'OLD.{c}' for c in FTS_COLUMNS)
+
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                {columns},
+                content='questions',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        return
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_questions_fts_insert
+        AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO questions_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_questions_fts_delete
+        AFTER DELETE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, {old_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_questions_fts_update
+        AFTER UPDATE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO questions_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    cursor.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
+# ==================== MIGRACIONES ====================
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Esquema inicial', [
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            session_number INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER NOT NULL,
+            question_type TEXT NOT NULL CHECK(question_type IN ('conceptual', 'syntax')),
+            question_text TEXT NOT NULL,
+            option_a TEXT NOT NULL,
+            option_b TEXT NOT NULL,
+            option_c TEXT NOT NULL,
+            option_d TEXT NOT NULL,
+            option_e TEXT NOT NULL,
+            correct_answer TEXT NOT NULL CHECK(correct_answer IN ('a', 'b', 'c', 'd', 'e')),
+            explanation TEXT NOT NULL,
+            dataset_reference TEXT,
+            difficulty TEXT NOT NULL CHECK(difficulty IN ('easy', 'medium', 'hard')),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_questions INTEGER DEFAULT 20,
+            correct_answers INTEGER,
+            score REAL,
+            selected_categories TEXT,
+            time_spent_seconds INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS exam_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL CHECK(user_answer IN ('a', 'b', 'c', 'd', 'e')),
+            is_correct BOOLEAN NOT NULL,
+            time_spent_seconds INTEGER,
+            FOREIGN KEY (exam_id) REFERENCES exams (id),
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS study_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER NOT NULL UNIQUE,
+            questions_answered INTEGER DEFAULT 0,
+            questions_correct INTEGER DEFAULT 0,
+            last_study_date TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+    ]),
+    (2, 'Índices secundarios para respuestas, preguntas e historial', [
+        'CREATE INDEX IF NOT EXISTS idx_exam_answers_exam_id ON exam_answers (exam_id)',
+        'CREATE INDEX IF NOT EXISTS idx_exam_answers_question_id ON exam_answers (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_category_difficulty ON questions (category_id, difficulty)',
+        'CREATE INDEX IF NOT EXISTS idx_exams_exam_date ON exams (exam_date)',
+    ]),
+    (3, 'Versión de contenido del banco de preguntas', [
+        '''
+        CREATE TABLE IF NOT EXISTS content_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO content_version (id, version) VALUES (1, 1)',
+    ] + [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_content_version
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE content_version SET version = version + 1 WHERE id = 1;
+        END
+        '''
+        for table in ('questions', 'categories')
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]),
+    (4, 'Resumen de estadísticas mantenido por triggers', [
+        '''
+        CREATE TABLE IF NOT EXISTS stats_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_exams INTEGER NOT NULL DEFAULT 0,
+            sum_scores REAL NOT NULL DEFAULT 0,
+            best_score REAL,
+            total_answered INTEGER NOT NULL DEFAULT 0,
+            total_correct INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        'INSERT OR IGNORE INTO stats_summary (id) VALUES (1)',
+        # MAX(score) tras un borrado o corrección se resuelve con este índice
+        'CREATE INDEX IF NOT EXISTS idx_exams_score ON exams (score)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_exams_insert_stats
+        AFTER INSERT ON exams WHEN NEW.score IS NOT NULL
+        BEGIN
+            UPDATE stats_summary SET
+                total_exams = total_exams + 1,
+                sum_scores = sum_scores + NEW.score,
+                best_score = CASE WHEN best_score IS NULL OR NEW.score > best_score
+                                  THEN NEW.score ELSE best_score END
+            WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_exams_update_stats
+        AFTER UPDATE OF score ON exams
+        BEGIN
+            UPDATE stats_summary SET
+                total_exams = total_exams
+                    - (OLD.score IS NOT NULL) + (NEW.score IS NOT NULL),
+                sum_scores = sum_scores - COALESCE(OLD.score, 0) + COALESCE(NEW.score, 0),
+                best_score = (SELECT MAX(score) FROM exams)
+            WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_exams_delete_stats
+        AFTER DELETE ON exams WHEN OLD.score IS NOT NULL
+        BEGIN
+            UPDATE stats_summary SET
+                total_exams = total_exams - 1,
+                sum_scores = sum_scores - OLD.score,
+                best_score = (SELECT MAX(score) FROM exams)
+            WHERE id = 1;
+        END
+        ''',
+        *STUDY_PROGRESS_STATS_TRIGGERS,
+        rebuild_stats_summary,
+    ]),
+    (5, 'Búsqueda de texto completo (FTS5) sobre preguntas', [
+        create_questions_fts,
+    ]),
+    (6, 'Historial multiusuario (user_id) con resumen por usuario', [
+        f"ALTER TABLE exams ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'",
+        'CREATE INDEX IF NOT EXISTS idx_exams_user_date ON exams (user_id, exam_date, id)',
+        rebuild_study_progress_per_user,
+        *STUDY_PROGRESS_STATS_TRIGGERS,
+        *USER_STATS_SCHEMA,
+        rebuild_user_stats,
+        rebuild_stats_summary,
+    ]),
+    (7, 'Marca de archivado de exámenes', [
+        'ALTER TABLE exams ADD COLUMN archived_at TIMESTAMP',
+    ]),
+    (8, 'Estadísticas por pregunta (item_stats)', [
+        *ITEM_STATS_SCHEMA,
+        rebuild_item_stats,
+    ]),
+    (9, 'Tiempos por pregunta en exam_answers', [
+        *ANSWER_TIMING_COLUMNS,
+    ]),
+    (10, 'Modelo de lectura del progreso por categoría', [
+        *PROGRESS_READ_MODEL_SCHEMA,
+    ]),
+    (11, 'Parámetros IRT (2PL) por pregunta', [
+        *ITEM_PARAMS_SCHEMA,
+    ]),
+    (12, 'Calendario de repaso espaciado (SM-2)', [
+        *REVIEW_SCHEDULE_SCHEMA,
+        rebuild_review_schedule,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Esquema de los ficheros de historial por usuario (shards). Solo contienen
+# exams, exam_answers, study_progress y sus tablas derivadas; el banco de preguntas
+# vive en la BD principal, así que no hay claves foráneas hacia questions.
+SHARD_MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Esquema de historial por usuario', [
+        '''
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            exam_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_questions INTEGER DEFAULT 20,
+            correct_answers INTEGER,
+            score REAL,
+            selected_categories TEXT,
+            time_spent_seconds INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS exam_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL CHECK(user_answer IN ('a', 'b', 'c', 'd', 'e')),
+            is_correct BOOLEAN NOT NULL,
+            time_spent_seconds INTEGER,
+            FOREIGN KEY (exam_id) REFERENCES exams (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS study_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            questions_answered INTEGER DEFAULT 0,
+            questions_correct INTEGER DEFAULT 0,
+            last_study_date TIMESTAMP,
+            UNIQUE (user_id, category_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_exam_answers_exam_id ON exam_answers (exam_id)',
+        'CREATE INDEX IF NOT EXISTS idx_exam_answers_question_id ON exam_answers (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_exams_user_date ON exams (user_id, exam_date, id)',
+        *USER_STATS_SCHEMA,
+    ]),
+    (2, 'Marca de archivado de exámenes', [
+        'ALTER TABLE exams ADD COLUMN archived_at TIMESTAMP',
+        'CREATE INDEX IF NOT EXISTS idx_exams_exam_date ON exams (exam_date)',
+    ]),
+    (3, 'Estadísticas por pregunta (item_stats)', [
+        *ITEM_STATS_SCHEMA,
+        rebuild_item_stats,
+    ]),
+    (4, 'Tiempos por pregunta en exam_answers', [
+        *ANSWER_TIMING_COLUMNS,
+    ]),
+    (5, 'Modelo de lectura del progreso por categoría', [
+        *PROGRESS_READ_MODEL_SCHEMA,
+    ]),
+    (6, 'Calendario de repaso espaciado (SM-2)', [
+        *REVIEW_SCHEDULE_SCHEMA,
+        rebuild_review_schedule,
+    ]),
+]
+
+# Esquema de los ficheros de archivo (ver archive.py): copia completa de los
+# exámenes antiguos y sus respuestas, que salen de las tablas calientes
+ARCHIVE_MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Esquema de archivo de exámenes', [
+        '''
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            exam_date TIMESTAMP,
+            total_questions INTEGER,
+            correct_answers INTEGER,
+            score REAL,
+            selected_categories TEXT,
+            time_spent_seconds INTEGER,
+            archived_at TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS exam_answers (
+            id INTEGER PRIMARY KEY,
+            exam_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            time_spent_seconds INTEGER
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_exam_answers_exam_id ON exam_answers (exam_id)',
+    ]),
+    (2, 'Tiempos por pregunta en exam_answers', [
+        *ANSWER_TIMING_COLUMNS,
+    ]),
+]
+
+# ==================== MOTOR DE MIGRACIONES ====================
+
+def _ensure_version_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Devuelve la versión de esquema aplicada (0 si la BD no está versionada)"""
+    _ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn: sqlite3.Connection, target: int = LATEST_VERSION,
+                     migrations: List[Tuple[int, str, List[Step]]] = MIGRATIONS) -> List[int]:
+    """
+    Aplica en orden las migraciones pendientes hasta la versión target
+
+    Cada migración se ejecuta en su propia transacción (BEGIN IMMEDIATE), así
+    que si falla la BD queda en la última versión completa y dos procesos
+    que arrancan a la vez no aplican la misma migración dos veces.
+
+    Args:
+        conn: Conexión a la base de datos
+        target: Versión final deseada (default: la última)
+        migrations: Lista de migraciones (MIGRATIONS o SHARD_MIGRATIONS)
+
+    Returns:
+        Lista de versiones aplicadas en esta llamada
+    """
+    _ensure_version_table(conn)
+    applied = []
+
+    for version, description, steps in migrations:
+        if version > target:
+            break
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+            if version <= current:
+                conn.rollback()
+                continue
+
+            cursor = conn.cursor()
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+
+            cursor.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+
+    return applied
+
+# ==================== VERIFICACIÓN DE PLANES DE CONSULTA ====================
+
+# Consultas críticas de database.py y el índice que deben usar
+EXPECTED_QUERY_PLANS: Dict[str, Tuple[str, tuple, str]] = {
+    'get_exam_answers': (
+        '''
+        SELECT ea.* FROM exam_answers ea
+        JOIN exams e ON e.id = ea.exam_id
+        WHERE ea.exam_id = ? AND e.user_id = ?
+        ORDER BY ea.id
+        ''',
+        (1, DEFAULT_USER_ID),
+        'idx_exam_answers_exam_id'
+    ),
+    'answers_by_question': (
+        'SELECT COUNT(*) FROM exam_answers WHERE question_id = ?',
+        (1,),
+        'idx_exam_answers_question_id'
+    ),
+    'get_questions_by_category': (
+        'SELECT * FROM questions WHERE category_id = ?',
+        (1,),
+        'idx_questions_category_difficulty'
+    ),
+    'get_random_questions': (
+        'SELECT id FROM questions WHERE category_id IN (?, ?) AND difficulty = ?',
+        (1, 2, 'easy'),
+        'idx_questions_category_difficulty'
+    ),
+    'get_exam_history': (
+        'SELECT * FROM exams WHERE user_id = ? ORDER BY exam_date DESC, id DESC LIMIT ?',
+        (DEFAULT_USER_ID, 20),
+        'idx_exams_user_date'
+    ),
+    'get_exam_history_page': (
+        '''
+        SELECT * FROM exams
+        WHERE user_id = ? AND (exam_date, id) < (?, ?)
+        ORDER BY exam_date DESC, id DESC
+        LIMIT ?
+        ''',
+        (DEFAULT_USER_ID, '2026-01-01 00:00:00', 1, 21),
+        'idx_exams_user_date'
+    ),
+    'get_due_reviews': (
+        '''
+        SELECT question_id, due_date FROM review_schedule
+        WHERE user_id = ? AND due_date <= ?
+        ORDER BY due_date, question_id
+        LIMIT ?
+        ''',
+        (DEFAULT_USER_ID, '2026-01-01 00:00:00', 20),
+        'idx_review_schedule_due'
+    ),
+}
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[str]:
+    """Devuelve las líneas de detalle de EXPLAIN QUERY PLAN para una consulta"""
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return [row[3] for row in rows]
+
+def check_query_plans(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """
+    Verifica que las consultas críticas usan sus índices
+
+    Returns:
+        Dict {nombre_consulta: plan} si todas usan el índice esperado
+
+    Raises:
+        AssertionError: si alguna consulta no usa el índice esperado
+    """
+    plans = {}
+    failures = []
+
+    for name, (sql, params, index_name) in EXPECTED_QUERY_PLANS.items():
+        plan = explain_query_plan(conn, sql, params)
+        plans[name] = plan
+        if not any(index_name in detail for detail in plan):
+            failures.append(f"{name}: se esperaba {index_name}, plan = {plan}")
+        if any('USE TEMP B-TREE FOR ORDER BY' in detail for detail in plan):
+            failures.append(f"{name}: ordena con un B-tree temporal, plan = {plan}")
+
+    assert not failures, 'Planes de consulta inesperados:\n  ' + '\n  '.join(failures)
+    return plans
+
+if __name__ == '__main__':
+    from database import get_connection, DB_PATH
+
+    conn = get_connection()
+    before = get_schema_version(conn)
+    applied = apply_migrations(conn)
+
+    print("="*60)
+    print("🗄️  MIGRACIONES DE ESQUEMA")
+    print("="*60)
+    print(f"\n📌 Base de datos: {DB_PATH}")
+    print(f"  Versión anterior: {before}")
+    if applied:
+        for version in applied:
+            print(f"  ✓ Aplicada migración {version}")
+    else:
+        print("  ✓ El esquema ya estaba actualizado")
+    print(f"  Versión actual: {get_schema_version(conn)}")
+
+    if '--check' in sys.argv:
+        print("\n🔍 Verificando planes de consulta...")
+        try:
+            for name, plan in check_query_plans(conn).items():
+                print(f"  ✓ {name}: {' | '.join(plan)}")
+        except AssertionError as e:
+            print(f"\n❌ {e}")
+            conn.close()
+            sys.exit(1)
+
+    conn.close()
+    print()
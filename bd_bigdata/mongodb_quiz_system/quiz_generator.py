@@ -6,11 +6,39 @@ Funcionalidades:
 - Filtrar preguntas por categorías seleccionadas
 - Balancear distribución de dificultades
 - Evitar repetición de preguntas en el mismo examen
+
+Los IDs se eligen del índice en memoria de database.py (QuestionSampler):
+cubos de IDs por (categoría, dificultad, tipo) en arrays de enteros que se
+construyen una vez por proceso y versión del banco. Cada examen solo sortea
+k posiciones en los cubos que cumplen el filtro, sin leer la BD.
+
+generate_stratified_exam y generate_exam_batch usan stratified_sampler.py
+(NumPy) para cumplir a la vez cuotas de categoría, dificultad y tipo.
+
+ExamAssembler (generate_constrained_exam) trata el examen como un problema
+de selección con restricciones: puntuación esperada, cobertura de
+categorías, un dataset_reference por examen y tope de preguntas de
+sintaxis. Usa una heurística voraz + búsqueda local con presupuesto de
+reloj por examen, o un ILP exacto con PuLP (opcional) para bancos pequeños.
 """
 
 import random
-from typing import List, Dict, Optional
-from database import get_random_questions, get_all_categories
+import time
+from typing import List, Dict, Optional, Tuple
+from database import (
+    get_random_questions,
+    get_all_categories,
+    get_questions_by_category,
+    get_questions_by_ids,
+    get_item_stats,
+    sample_question_ids
+)
+from stratified_sampler import get_stratified_sampler, DEFAULT_DIFFICULTY_QUOTA
+
+try:
+    import pulp
+except ImportError:
+    pulp = None
 
 class QuizGenerator:
     """Clase para generar exámenes personalizados"""
@@ -48,7 +76,8 @@ class QuizGenerator:
     def generate_balanced_exam(
         self,
         selected_categories: Optional[List[int]] = None,
-        difficulty_distribution: Optional[Dict[str, float]] = None
+        difficulty_distribution: Optional[Dict[str, float]] = None,
+        question_type: Optional[str] = None
     ) -> List[Dict]:
         """
         Genera un examen con distribución balanceada de dificultades
@@ -57,6 +86,7 @@ class QuizGenerator:
             selected_categories: Lista de IDs de categorías a incluir
             difficulty_distribution: Dict con % por dificultad
                                    Ej: {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
+            question_type: Solo preguntas de este tipo ('conceptual' o 'syntax')
 
         Returns:
             Lista de preguntas balanceadas por dificultad
@@ -74,49 +104,120 @@ class QuizGenerator:
         num_medium = int(self.num_questions * difficulty_distribution.get('medium', 0))
         num_hard = self.num_questions - num_easy - num_medium
 
-        # Obtener todas las preguntas disponibles (filtradas por categoría)
-        all_questions = get_random_questions(
-            limit=1000,  # Obtener un pool grande
-            category_ids=selected_categories
-        )
-
-        # Separar por dificultad
-        easy_questions = [q for q in all_questions if q['difficulty'] == 'easy']
-        medium_questions = [q for q in all_questions if q['difficulty'] == 'medium']
-        hard_questions = [q for q in all_questions if q['difficulty'] == 'hard']
-
-        # Seleccionar aleatoriamente
-        selected_questions = []
-
-        if len(easy_questions) >= num_easy:
-            selected_questions.extend(random.sample(easy_questions, num_easy))
-        else:
-            selected_questions.extend(easy_questions)
-
-        if len(medium_questions) >= num_medium:
-            selected_questions.extend(random.sample(medium_questions, num_medium))
-        else:
-            selected_questions.extend(medium_questions)
+        # Muestrear IDs de cada dificultad directamente del índice en memoria
+        selected_ids = []
+        used_ids = set()
 
-        if len(hard_questions) >= num_hard:
-            selected_questions.extend(random.sample(hard_questions, num_hard))
-        else:
-            selected_questions.extend(hard_questions)
+        for difficulty, count in (('easy', num_easy), ('medium', num_medium), ('hard', num_hard)):
+            ids = sample_question_ids(
+                limit=count,
+                category_ids=selected_categories,
+                difficulty=difficulty,
+                question_type=question_type
+            )
+            selected_ids.extend(ids)
+            used_ids.update(ids)
 
         # Si no alcanzamos 20 preguntas, completar con las que faltan
-        if len(selected_questions) < self.num_questions:
-            remaining = self.num_questions - len(selected_questions)
-            used_ids = {q['id'] for q in selected_questions}
-            available = [q for q in all_questions if q['id'] not in used_ids]
-            if available:
-                additional = random.sample(available, min(remaining, len(available)))
-                selected_questions.extend(additional)
+        if len(selected_ids) < self.num_questions:
+            remaining = self.num_questions - len(selected_ids)
+            selected_ids.extend(sample_question_ids(
+                limit=remaining,
+                category_ids=selected_categories,
+                exclude_ids=used_ids,
+                question_type=question_type
+            ))
+
+        # Leer solo las preguntas elegidas con una sola consulta
+        selected_questions = list(get_questions_by_ids(selected_ids).values())
 
         # Mezclar el orden final
         random.shuffle(selected_questions)
 
         return selected_questions[:self.num_questions]
 
+    def generate_exam_batch(
+        self,
+        num_exams: int,
+        selected_categories: Optional[List[int]] = None,
+        difficulty_distribution: Optional[Dict[str, float]] = DEFAULT_DIFFICULTY_QUOTA,
+        type_distribution: Optional[Dict[str, float]] = None,
+        category_distribution='even',
+        seed=None
+    ) -> Tuple:
+        """
+        Genera un lote de exámenes con cuotas simultáneas (ver stratified_sampler.py)
+
+        Args:
+            num_exams: Número de exámenes (p. ej. uno por alumno de la clase)
+            selected_categories: Lista de IDs de categorías a incluir
+            difficulty_distribution: Proporción por dificultad (None = sin cuota)
+            type_distribution: Proporción por tipo, p. ej. {'conceptual': 0.6, 'syntax': 0.4}
+            category_distribution: 'even' (reparto igual), proporción por categoría o None
+            seed: Semilla para reproducir el lote
+
+        Returns:
+            Tupla (array NumPy [num_exams, preguntas] de IDs, informe de cuotas)
+
+        Raises:
+            RuntimeError: si NumPy no está instalado
+        """
+        return get_stratified_sampler().sample_batch(
+            num_exams,
+            self.num_questions,
+            category_ids=selected_categories,
+            category_quota=category_distribution,
+            difficulty_quota=difficulty_distribution,
+            type_quota=type_distribution,
+            seed=seed
+        )
+
+    def generate_stratified_exam(
+        self,
+        selected_categories: Optional[List[int]] = None,
+        difficulty_distribution: Optional[Dict[str, float]] = DEFAULT_DIFFICULTY_QUOTA,
+        type_distribution: Optional[Dict[str, float]] = None,
+        category_distribution='even'
+    ) -> List[Dict]:
+        """
+        Genera un examen que cumple a la vez las cuotas de categoría, dificultad y tipo
+
+        Returns:
+            Lista de preguntas en orden aleatorio
+        """
+        exams, _ = self.generate_exam_batch(
+            1, selected_categories, difficulty_distribution,
+            type_distribution, category_distribution
+        )
+        return list(get_questions_by_ids(exams[0].tolist()).values())
+
+    def generate_constrained_exam(
+        self,
+        selected_categories: Optional[List[int]] = None,
+        target_score: float = 60.0,
+        score_tolerance: float = 5.0,
+        min_per_category: int = 1,
+        max_syntax: Optional[int] = None,
+        method: str = 'heuristic',
+        seed=None
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        Genera un examen que cumple a la vez puntuación esperada, cobertura
+        de categorías, datasets sin repetir y tope de sintaxis (ver ExamAssembler)
+
+        Returns:
+            Tupla (preguntas, informe de restricciones y tiempo de resolución)
+        """
+        assembler = ExamAssembler(
+            num_questions=self.num_questions,
+            target_score=target_score,
+            score_tolerance=score_tolerance,
+            min_per_category=min_per_category,
+            max_syntax=max_syntax,
+            method=method
+        )
+        return assembler.assemble(selected_categories, seed=seed)
+
     def get_category_summary(self, questions: List[Dict]) -> Dict[int, int]:
         """
         Obtiene un resumen de cuántas preguntas hay por categoría
@@ -163,6 +264,406 @@ class QuizGenerator:
             summary[q['question_type']] += 1
         return summary
 
+# ==================== ENSAMBLADO CON RESTRICCIONES ====================
+
+# Probabilidad de acierto supuesta para preguntas sin historial
+DIFFICULTY_PRIOR = {'easy': 0.8, 'medium': 0.6, 'hard': 0.4}
+PRIOR_STRENGTH = 10             # Respuestas "virtuales" del prior al estimar p de acierto
+ASSEMBLY_TIME_BUDGET_MS = 50    # Presupuesto de reloj por examen (heurística)
+ASSEMBLY_CANDIDATES = 32        # Candidatas evaluadas por paso de la construcción voraz
+ASSEMBLY_CHECK_EVERY = 16       # Iteraciones de búsqueda local entre consultas al reloj
+STRUCTURAL_WEIGHT = 2.0         # Peso de cobertura/datasets/sintaxis frente a la puntuación
+ILP_MAX_QUESTIONS = 300         # Tamaño máximo del banco filtrado para usar ILP en modo 'auto'
+ILP_TIME_LIMIT_SECONDS = 10     # Límite del solver CBC por examen (modo 'ilp')
+ILP_AUTO_TIME_LIMIT_SECONDS = 1 # Límite de CBC en modo 'auto'
+ILP_SCORE_GAP = 0.1             # Puntos de puntuación esperada a los que CBC da por buena la solución
+ASSEMBLY_FIELDS = ('id', 'category_id', 'difficulty', 'question_type', 'dataset_reference')
+NO_DATASET = (None, '', 'N/A')  # Valores de dataset_reference que no cuentan como dataset
+
+def estimate_p_correct(questions) -> Dict[int, float]:
+    """
+    Estima la probabilidad de acierto de cada pregunta
+
+    Mezcla los aciertos de item_stats con el prior de su dificultad
+    (PRIOR_STRENGTH respuestas virtuales): una pregunta nueva vale su
+    prior y una muy respondida, su tasa real.
+
+    Args:
+        questions: Filas con 'id' y 'difficulty'
+
+    Returns:
+        Dict {question_id: p}
+    """
+    stats = get_item_stats([q['id'] for q in questions])
+    p_correct = {}
+    for q in questions:
+        prior = DIFFICULTY_PRIOR.get(q['difficulty'], 0.6)
+        entry = stats.get(q['id'])
+        shown = entry['times_shown'] if entry else 0
+        correct = entry['times_correct'] if entry else 0
+        p_correct[q['id']] = (correct + PRIOR_STRENGTH * prior) / (shown + PRIOR_STRENGTH)
+    return p_correct
+
+class ExamAssembler:
+    """
+    Ensambla exámenes como un problema de selección con restricciones
+
+    Restricciones (todas a la vez):
+    - num_questions preguntas distintas
+    - puntuación esperada (media de p de acierto, en %) en target_score ± score_tolerance
+    - al menos min_per_category preguntas de cada categoría elegida
+    - como mucho una pregunta por dataset_reference (si unique_datasets)
+    - como mucho max_syntax preguntas de tipo 'syntax' (None = sin tope)
+
+    Métodos:
+    - 'heuristic': construcción voraz + búsqueda local por intercambios,
+      cortada por un presupuesto de reloj fijo por examen
+    - 'ilp': programa entero exacto con PuLP/CBC (opcional, bancos pequeños)
+    - 'auto': ILP si PuLP está instalado y el banco filtrado no supera
+      ILP_MAX_QUESTIONS, con un límite de ILP_AUTO_TIME_LIMIT_SECONDS
+    """
+
+    def __init__(self, num_questions: int = 20, target_score: float = 60.0,
+                 score_tolerance: float = 5.0, min_per_category: int = 1,
+                 max_syntax: Optional[int] = None, unique_datasets: bool = True,
+                 time_budget_ms: float = ASSEMBLY_TIME_BUDGET_MS, method: str = 'heuristic'):
+        if method not in ('heuristic', 'ilp', 'auto'):
+            raise ValueError(f"Método desconocido: {method}")
+        self.num_questions = num_questions
+        self.target_score = target_score
+        self.score_tolerance = score_tolerance
+        self.min_per_category = min_per_category
+        self.max_syntax = max_syntax
+        self.unique_datasets = unique_datasets
+        self.time_budget_ms = time_budget_ms
+        self.method = method
+        self._p_correct: Dict[int, float] = {}
+
+    def assemble(self, selected_categories: Optional[List[int]] = None,
+                 seed=None) -> Tuple[List[Dict], Dict]:
+        """
+        Ensambla un examen
+
+        Args:
+            selected_categories: IDs de categorías a incluir (None = todas)
+            seed: Semilla para reproducir el examen
+
+        Returns:
+            Tupla (preguntas en orden aleatorio, informe con método, tiempo
+            de resolución y cumplimiento de cada restricción)
+
+        Raises:
+            RuntimeError: si method='ilp' y PuLP no está instalado
+        """
+        started = time.perf_counter()
+        rng = random.Random(seed)
+        pool = self._pool(selected_categories)
+
+        method, time_limit = self.method, ILP_TIME_LIMIT_SECONDS
+        if method == 'auto':
+            method = 'ilp' if pulp is not None and len(pool) <= ILP_MAX_QUESTIONS else 'heuristic'
+            time_limit = ILP_AUTO_TIME_LIMIT_SECONDS
+
+        iterations, status = 0, None
+        if method == 'ilp':
+            chosen, status = self._solve_ilp(pool, rng, time_limit)
+            if chosen is None:  # Inviable o sin solución en el límite: mejor esfuerzo
+                method = 'ilp+heuristic'
+        if method != 'ilp':
+            chosen, iterations = self._solve_heuristic(pool, rng, started)
+
+        report = self._report(pool, chosen)
+        report.update({
+            'method': method,
+            'solver_status': status,
+            'iterations': iterations,
+            'pool_size': len(pool),
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+
+        questions = list(get_questions_by_ids([pool[i]['id'] for i in chosen]).values())
+        rng.shuffle(questions)
+        return questions, report
+
+    # ---------- Banco filtrado ----------
+
+    def _pool(self, selected_categories: Optional[List[int]]) -> List[Dict]:
+        """Preguntas candidatas con su p de acierto estimada (en caché)"""
+        if selected_categories is None:
+            selected_categories = [c['id'] for c in get_all_categories()]
+        rows = [row for category_id in selected_categories
+                for row in get_questions_by_category(category_id, fields=ASSEMBLY_FIELDS)]
+
+        missing = [row for row in rows if row['id'] not in self._p_correct]
+        if missing:
+            self._p_correct.update(estimate_p_correct(missing))
+
+        return [{
+            'id': row['id'],
+            'category_id': row['category_id'],
+            'syntax': row['question_type'] == 'syntax',
+            'dataset': (row['dataset_reference'] if self.unique_datasets
+                        and row['dataset_reference'] not in NO_DATASET else None),
+            'p': self._p_correct[row['id']]
+        } for row in rows]
+
+    def _category_minimums(self, pool: List[Dict]) -> Dict[int, int]:
+        """Mínimo exigible por categoría (no más de las preguntas que tiene)"""
+        available: Dict[int, int] = {}
+        for q in pool:
+            available[q['category_id']] = available.get(q['category_id'], 0) + 1
+        return {c: min(self.min_per_category, n) for c, n in available.items()}
+
+    def _score_bounds(self) -> Tuple[float, float]:
+        """Rango admitido de aciertos esperados (suma de p)"""
+        n = self.num_questions
+        return (n * (self.target_score - self.score_tolerance) / 100,
+                n * (self.target_score + self.score_tolerance) / 100)
+
+    # ---------- Heurística: voraz + búsqueda local ----------
+
+    def _solve_heuristic(self, pool: List[Dict], rng: random.Random,
+                         started: float) -> Tuple[List[int], int]:
+        """
+        Construye un examen voraz y lo repara con intercambios hasta cumplir
+        todas las restricciones o agotar el presupuesto de reloj
+
+        La penalización (déficit de cobertura + datasets repetidos + exceso
+        de sintaxis, con peso STRUCTURAL_WEIGHT, más la desviación de la
+        suma de p fuera del rango) se actualiza en O(1) por movimiento.
+
+        Returns:
+            Tupla (índices del pool elegidos, iteraciones de búsqueda local)
+        """
+        n = min(self.num_questions, len(pool))
+        deadline = started + self.time_budget_ms / 1000
+        minimums = self._category_minimums(pool)
+        low, high = self._score_bounds()
+        syntax_cap = self.max_syntax if self.max_syntax is not None else n
+        target_sum = n * self.target_score / 100
+
+        by_category: Dict[int, List[int]] = {}
+        for i, q in enumerate(pool):
+            by_category.setdefault(q['category_id'], []).append(i)
+
+        chosen: List[int] = []
+        selected = set()
+        cat_count = {c: 0 for c in minimums}
+        ds_count: Dict[str, int] = {}
+        state = {'syntax': 0, 'p_sum': 0.0}
+
+        def add(i):
+            q = pool[i]
+            chosen.append(i)
+            selected.add(i)
+            cat_count[q['category_id']] += 1
+            if q['dataset']:
+                ds_count[q['dataset']] = ds_count.get(q['dataset'], 0) + 1
+            state['syntax'] += q['syntax']
+            state['p_sum'] += q['p']
+
+        def add_cost(i, slots_left):
+            """Coste voraz: conflictos que crea + distancia a la p que falta"""
+            q = pool[i]
+            conflicts = ds_count.get(q['dataset'], 0) if q['dataset'] else 0
+            conflicts += q['syntax'] and state['syntax'] >= syntax_cap
+            wanted = (target_sum - state['p_sum']) / slots_left
+            return STRUCTURAL_WEIGHT * conflicts + abs(q['p'] - wanted)
+
+        def pick(candidates, slots_left):
+            free = [i for i in candidates if i not in selected]
+            if len(free) > ASSEMBLY_CANDIDATES:
+                free = rng.sample(free, ASSEMBLY_CANDIDATES)
+            return min(free, key=lambda i: add_cost(i, slots_left)) if free else None
+
+        # 1) Construcción: primero los mínimos por categoría, luego el resto
+        categories = list(minimums)
+        rng.shuffle(categories)
+        for category_id in categories:
+            for _ in range(minimums[category_id]):
+                if len(chosen) < n:
+                    add(pick(by_category[category_id], n - len(chosen)))
+        all_indices = range(len(pool))
+        while len(chosen) < n:
+            i = pick(rng.sample(all_indices, min(len(pool), 4 * ASSEMBLY_CANDIDATES)),
+                     n - len(chosen))
+            if i is None:
+                i = next(i for i in all_indices if i not in selected)
+            add(i)
+
+        def score_dev(p_sum):
+            return max(0.0, low - p_sum, p_sum - high)
+
+        def penalty():
+            structural = sum(max(0, m - cat_count[c]) for c, m in minimums.items())
+            structural += sum(count - 1 for count in ds_count.values() if count > 1)
+            structural += max(0, state['syntax'] - syntax_cap)
+            return STRUCTURAL_WEIGHT * structural + score_dev(state['p_sum'])
+
+        def swap_delta(out_i, in_i):
+            """Cambio de penalización al sustituir out_i por in_i"""
+            q_out, q_in = pool[out_i], pool[in_i]
+            delta = 0
+            c_out, c_in = q_out['category_id'], q_in['category_id']
+            if c_out != c_in:
+                delta += cat_count[c_out] <= minimums[c_out]
+                delta -= cat_count[c_in] < minimums[c_in]
+            d_out, d_in = q_out['dataset'], q_in['dataset']
+            if d_out != d_in:
+                if d_out:
+                    delta -= ds_count[d_out] > 1
+                if d_in:
+                    delta += ds_count.get(d_in, 0) >= 1
+            syntax = state['syntax'] - q_out['syntax'] + q_in['syntax']
+            delta += max(0, syntax - syntax_cap) - max(0, state['syntax'] - syntax_cap)
+            p_sum = state['p_sum'] - q_out['p'] + q_in['p']
+            return STRUCTURAL_WEIGHT * delta + score_dev(p_sum) - score_dev(state['p_sum'])
+
+        def swap(slot, in_i):
+            out_i = chosen[slot]
+            q_out = pool[out_i]
+            selected.discard(out_i)
+            cat_count[q_out['category_id']] -= 1
+            if q_out['dataset']:
+                ds_count[q_out['dataset']] -= 1
+                if not ds_count[q_out['dataset']]:
+                    del ds_count[q_out['dataset']]
+            state['syntax'] -= q_out['syntax']
+            state['p_sum'] -= q_out['p']
+            chosen.pop(slot)
+            add(in_i)
+
+        # 2) Búsqueda local: intercambios que no empeoran, dirigidos a la
+        #    categoría con déficit cuando la hay
+        current = penalty()
+        iterations = 0
+        while current > 1e-9 and len(pool) > n:
+            iterations += 1
+            if iterations % ASSEMBLY_CHECK_EVERY == 0 and time.perf_counter() >= deadline:
+                break
+            short = [c for c, m in minimums.items() if cat_count[c] < m]
+            candidates = by_category[rng.choice(short)] if short and rng.random() < 0.5 else pool
+            in_i = rng.randrange(len(pool)) if candidates is pool else rng.choice(candidates)
+            if in_i in selected:
+                continue
+            slot = rng.randrange(n)
+            delta = swap_delta(chosen[slot], in_i)
+            if delta <= 0:
+                swap(slot, in_i)
+                current += delta
+
+        return chosen, iterations
+
+    # ---------- ILP exacto (PuLP) ----------
+
+    def _solve_ilp(self, pool: List[Dict], rng: random.Random,
+                   time_limit: float = ILP_TIME_LIMIT_SECONDS) -> Tuple[Optional[List[int]], str]:
+        """
+        Resuelve el ensamblado como programa entero con CBC
+
+        Variables binarias x_i por pregunta; restricciones duras de tamaño,
+        cobertura, dataset y sintaxis; minimiza la desviación |Σ p·x − T|
+        más un ruido pequeño para que dos exámenes con el mismo objetivo
+        no salgan idénticos. CBC para en cuanto la solución está a menos de
+        ILP_SCORE_GAP puntos del óptimo (gapAbs); el ruido suma como mucho
+        la mitad de ese margen, así que no obliga a explorar empates.
+
+        Returns:
+            Tupla (índices elegidos o None si no hay solución, estado:
+            'optimal', 'time-limited feasible' si CBC agotó time_limit con
+            una solución sin probar, o el estado de CBC en minúsculas)
+        """
+        if pulp is None:
+            raise RuntimeError("El modo 'ilp' requiere PuLP: pip install pulp")
+
+        n = self.num_questions
+        target_sum = n * self.target_score / 100
+        problem = pulp.LpProblem('ensamblado_examen', pulp.LpMinimize)
+        x = [pulp.LpVariable(f'x_{i}', cat='Binary') for i in range(len(pool))]
+        deviation = pulp.LpVariable('desviacion', lowBound=0)
+
+        gap = n * ILP_SCORE_GAP / 100  # La desviación se mide en aciertos esperados
+        noise = gap / (2 * n)
+        problem += deviation + noise * pulp.lpSum(rng.random() * x[i] for i in range(len(pool)))
+        problem += pulp.lpSum(x) == n
+
+        by_category: Dict[int, List[int]] = {}
+        by_dataset: Dict[str, List[int]] = {}
+        for i, q in enumerate(pool):
+            by_category.setdefault(q['category_id'], []).append(i)
+            if q['dataset']:
+                by_dataset.setdefault(q['dataset'], []).append(i)
+        for category_id, minimum in self._category_minimums(pool).items():
+            problem += pulp.lpSum(x[i] for i in by_category[category_id]) >= minimum
+        for indices in by_dataset.values():
+            if len(indices) > 1:
+                problem += pulp.lpSum(x[i] for i in indices) <= 1
+        if self.max_syntax is not None:
+            problem += pulp.lpSum(x[i] for i, q in enumerate(pool) if q['syntax']) <= self.max_syntax
+
+        expected = pulp.lpSum(q['p'] * x[i] for i, q in enumerate(pool))
+        problem += expected - target_sum <= deviation
+        problem += target_sum - expected <= deviation
+
+        problem.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapAbs=gap))
+        # status dice 'Optimal' también si CBC paró en el límite con una solución
+        if problem.sol_status == pulp.LpSolutionOptimal:
+            status = 'optimal'
+        elif problem.sol_status == pulp.LpSolutionIntegerFeasible:
+            status = 'time-limited feasible'
+        else:
+            return None, pulp.LpStatus[problem.status].lower()
+        return [i for i in range(len(pool)) if x[i].value() > 0.5], status
+
+    # ---------- Informe ----------
+
+    def _report(self, pool: List[Dict], chosen: List[int]) -> Dict:
+        """Comprueba cada restricción sobre el examen elegido"""
+        questions = [pool[i] for i in chosen]
+        minimums = self._category_minimums(pool)
+        low, high = self._score_bounds()
+
+        cat_count = {c: 0 for c in minimums}
+        ds_count: Dict[str, int] = {}
+        for q in questions:
+            cat_count[q['category_id']] += 1
+            if q['dataset']:
+                ds_count[q['dataset']] = ds_count.get(q['dataset'], 0) + 1
+        p_sum = sum(q['p'] for q in questions)
+        expected_score = 100 * p_sum / len(questions) if questions else 0.0
+        syntax = sum(q['syntax'] for q in questions)
+        missing = sorted(c for c, m in minimums.items() if cat_count[c] < m)
+        repeated = sorted(d for d, count in ds_count.items() if count > 1)
+
+        constraints = {
+            'size': {
+                'value': len(questions), 'target': self.num_questions,
+                'ok': len(questions) == self.num_questions
+            },
+            'expected_score': {
+                'value': round(expected_score, 2),
+                'target': [self.target_score - self.score_tolerance,
+                           self.target_score + self.score_tolerance],
+                'ok': low - 1e-9 <= p_sum <= high + 1e-9
+            },
+            'category_coverage': {
+                'value': len(minimums) - len(missing), 'target': len(minimums),
+                'missing': missing, 'ok': not missing
+            },
+            'unique_dataset_reference': {
+                'value': repeated, 'target': [], 'ok': not repeated
+            },
+            'max_syntax': {
+                'value': syntax, 'target': self.max_syntax,
+                'ok': self.max_syntax is None or syntax <= self.max_syntax
+            }
+        }
+        return {
+            'expected_score': round(expected_score, 2),
+            'constraints': constraints,
+            'satisfied': all(c['ok'] for c in constraints.values())
+        }
+
 def get_available_categories() -> List[Dict]:
     """
     Obtiene todas las categorías disponibles
@@ -268,4 +769,18 @@ if __name__ == "__main__":
         percentage = (count / len(balanced_exam)) * 100
         print(f"  {diff.capitalize()}: {count} ({percentage:.0f}%)")
 
+    # Examen con restricciones
+    methods = ['heuristic', 'ilp'] if pulp is not None else ['heuristic']
+    for method in methods:
+        print(f"\n\n📝 Ensamblando examen con restricciones ({method})...")
+        constrained_exam, report = generator.generate_constrained_exam(
+            target_score=65, max_syntax=8, method=method
+        )
+        solver = f", {report['solver_status']}" if report['solver_status'] else ''
+        print(f"✓ {len(constrained_exam)} preguntas en {report['solve_ms']} ms{solver} "
+              f"(puntuación esperada {report['expected_score']}%)")
+        for name, check in report['constraints'].items():
+            print(f"  {'✓' if check['ok'] else '✗'} {name}: {check['value']} "
+                  f"(objetivo {check['target']})")
+
     print("\n✅ Tests completados\n")
@@ -0,0 +1,83 @@
+"""
+spaced_repetition.py - Planificador de repaso espaciado (SM-2) para MongoDB Quiz System
+
+Cada (usuario, pregunta) tiene una facilidad (ease), un intervalo en días,
+el número de repasos seguidos acertados, los fallos acumulados y la fecha
+del próximo repaso. Cada respuesta guardada es un repaso: se convierte en
+una calidad 0-5 (review_quality) y se aplica SM-2 (sm2_review):
+
+- calidad >= 3: el intervalo pasa a 1 día, luego a 6 y después se
+  multiplica por la facilidad
+- calidad < 3: la pregunta vuelve a empezar (intervalo de 1 día) y cuenta
+  como fallo
+- la facilidad sube o baja según la calidad, con un mínimo de 1.3; el
+  intervalo no pasa de SM2_MAX_INTERVAL_DAYS
+
+Este módulo solo contiene el cálculo; el estado vive en la tabla
+review_schedule de cada BD de historial, que database.py actualiza en lote
+al guardar cada examen y que migrations.py reconstruye a partir del
+historial existente.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+SM2_INITIAL_EASE = 2.5          # Facilidad de una pregunta nueva
+SM2_MIN_EASE = 1.3              # Facilidad mínima
+SM2_FIRST_INTERVALS = (1, 6)    # Días tras el primer y el segundo acierto seguidos
+SM2_MAX_INTERVAL_DAYS = 3650    # Tope del intervalo (la facilidad puede crecer sin límite)
+FAST_ANSWER_MS = 15_000         # Acierto en menos tiempo = calidad 5
+SLOW_ANSWER_MS = 60_000         # Acierto en más tiempo = calidad 3
+REVIEW_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'  # Mismo formato que CURRENT_TIMESTAMP (UTC)
+
+# (ease, interval_days, repetitions, lapses)
+ReviewState = Tuple[float, int, int, int]
+
+NEW_REVIEW_STATE: ReviewState = (SM2_INITIAL_EASE, 0, 0, 0)
+
+def review_quality(is_correct: bool, time_spent_ms: Optional[int] = None,
+                   answer_changes: Optional[int] = None) -> int:
+    """
+    Calidad SM-2 (0-5) de una respuesta
+
+    Un fallo vale 1. Un acierto vale 4, 5 si fue rápido y sin cambiar de
+    opción, y 3 si costó (lento o con cambios). Sin tiempos medidos, 4.
+    """
+    if not is_correct:
+        return 1
+    if answer_changes is not None and answer_changes > 1:
+        return 3
+    if time_spent_ms is None:
+        return 4
+    if time_spent_ms <= FAST_ANSWER_MS:
+        return 5
+    return 3 if time_spent_ms > SLOW_ANSWER_MS else 4
+
+def sm2_review(state: ReviewState, quality: int) -> ReviewState:
+    """
+    Aplica un repaso SM-2
+
+    Args:
+        state: (ease, interval_days, repetitions, lapses) antes del repaso
+        quality: Calidad 0-5 (ver review_quality)
+
+    Returns:
+        Estado tras el repaso
+    """
+    ease, interval, repetitions, lapses = state
+    if quality >= 3:
+        if repetitions < len(SM2_FIRST_INTERVALS):
+            interval = SM2_FIRST_INTERVALS[repetitions]
+        else:
+            interval = min(SM2_MAX_INTERVAL_DAYS, max(1, round(interval * ease)))
+        repetitions += 1
+    else:
+        interval = SM2_FIRST_INTERVALS[0]
+        repetitions = 0
+        lapses += 1
+    ease = max(SM2_MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval, repetitions, lapses
+
+def due_date_after(reviewed_at: datetime, interval_days: int) -> str:
+    """Fecha del próximo repaso en el formato de las columnas TIMESTAMP"""
+    return (reviewed_at + timedelta(days=interval_days)).strftime(REVIEW_DATE_FORMAT)
@@ -119,6 +119,96 @@ function clearSavedAnswers() {
     localStorage.removeItem('examAnswers');
 }
 
+// ============================================================
+// Per-question Timing
+// ============================================================
+
+/**
+ * Fields packed per question in the timings array:
+ * question id, active ms, first answer ms, last change ms, answer changes.
+ * Offsets are milliseconds since the exam page loaded (0 = never).
+ */
+const QUESTION_TIMING_FIELDS = 5;
+
+/**
+ * Record how long each question is worked on and when its answer changes.
+ *
+ * Everything is kept in a single Uint32Array and sent once, packed into the
+ * hidden "answer_timings" field when the exam form is submitted, so no
+ * extra requests are made while answering.
+ */
+function initQuestionTiming() {
+    const form = document.getElementById('examForm');
+    const field = document.getElementById('answerTimings');
+    if (!form || !field) return;
+
+    const cards = Array.from(form.querySelectorAll('.question-card[data-question-id]'));
+    const packed = new Uint32Array(cards.length * QUESTION_TIMING_FIELDS);
+    cards.forEach((card, index) => {
+        packed[index * QUESTION_TIMING_FIELDS] = parseInt(card.dataset.questionId, 10);
+    });
+
+    const started = performance.now();
+    const elapsed = () => Math.max(1, Math.round(performance.now() - started));
+    let active = -1;
+    let activeSince = 0;
+
+    // Credit the time since the last switch to the question being worked on
+    function settle() {
+        const now = elapsed();
+        if (active >= 0 && !document.hidden) {
+            packed[active * QUESTION_TIMING_FIELDS + 1] += now - activeSince;
+        }
+        activeSince = now;
+    }
+
+    function activate(index) {
+        settle();
+        active = index;
+    }
+
+    cards.forEach((card, index) => {
+        card.addEventListener('focusin', () => activate(index));
+        card.addEventListener('pointerdown', () => activate(index));
+        card.addEventListener('change', () => {
+            activate(index);
+            const base = index * QUESTION_TIMING_FIELDS;
+            if (!packed[base + 2]) {
+                packed[base + 2] = activeSince;
+            }
+            packed[base + 3] = activeSince;
+            packed[base + 4] += 1;
+        });
+    });
+
+    // Time spent on another tab does not count
+    document.addEventListener('visibilitychange', () => {
+        const now = elapsed();
+        if (document.hidden && active >= 0) {
+            packed[active * QUESTION_TIMING_FIELDS + 1] += now - activeSince;
+        }
+        activeSince = now;
+    });
+
+    form.addEventListener('submit', () => {
+        settle();
+        field.value = packTimings(packed);
+    });
+}
+
+/**
+ * Encode a Uint32Array as "v1:" + base64 of its little-endian bytes
+ */
+function packTimings(values) {
+    const view = new DataView(new ArrayBuffer(values.length * 4));
+    values.forEach((value, index) => view.setUint32(index * 4, value, true));
+    let binary = '';
+    new Uint8Array(view.buffer).forEach(byte => {
+        binary += String.fromCharCode(byte);
+    });
+    return 'v1:' + btoa(binary);
+}
+
 // ============================================================
 // Progress Tracking
 // ============================================================
@@ -155,7 +245,8 @@ function enableKeyboardShortcuts() {
                 const index = parseInt(e.key) - 1;
                 if (options[index]) {
                     options[index].checked = true;
-                    options[index].dispatchEvent(new Event('change'));
+                    // Bubbles so the card-level listener of initQuestionTiming times it
+                    options[index].dispatchEvent(new Event('change', { bubbles: true }));
                 }
             }
         }
@@ -286,6 +377,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize based on current page
     if (document.getElementById('examForm')) {
         initExamPage();
+        initQuestionTiming();  // After restoring saved answers, so they are not counted
         validateExamForm();
         enableKeyboardShortcuts();
     }
@@ -0,0 +1,733 @@
+"""
+storage.py - Backends de almacenamiento intercambiables para MongoDB Quiz System
+
+Define la interfaz StorageBackend con las operaciones de database.py que usa
+el flujo de un examen (preguntas aleatorias, registro del examen, historial,
+respuestas, progreso y estadísticas) y dos implementaciones:
+
+- SQLiteBackend: el modelo relacional actual (delega en database.py).
+- DocumentBackend: modelo documental al estilo MongoDB. Cada examen es un
+  documento con sus respuestas embebidas, las preguntas aleatorias salen de
+  un pipeline con $sample y el progreso se acumula con $inc. Funciona con
+  pymongo (QUIZ_MONGO_URI), con mongomock si está instalado o, si no, con
+  InMemoryDatabase, un sustituto en proceso con el subconjunto de la API de
+  pymongo que usa este módulo.
+
+El benchmark ejecuta la misma carga contra ambos backends para comparar el
+modelo embebido con el relacional en nuestra mezcla de lecturas y escrituras.
+
+Uso:
+    python storage.py --benchmark              # Compara SQLite y documental
+    python storage.py --benchmark --exams 500  # Con otro número de exámenes
+"""
+
+import copy
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import database
+from database import DEFAULT_USER_ID, ANSWER_QUESTION_FIELDS
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+STORAGE_BACKEND = os.environ.get('QUIZ_STORAGE_BACKEND', 'sqlite')  # 'sqlite' o 'document'
+MONGO_URI = os.environ.get('QUIZ_MONGO_URI')                       # Vacío = sin servidor MongoDB
+MONGO_DB_NAME = os.environ.get('QUIZ_MONGO_DB', 'mongodb_quiz')
+
+# ==================== INTERFAZ ====================
+
+class StorageBackend(ABC):
+    """
+    Operaciones de almacenamiento del flujo de un examen
+
+    Las firmas y los dicts devueltos son los de las funciones homónimas de
+    database.py, así que el código que las usa no depende del backend.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def get_random_questions(self, limit: int = 20, category_ids: Optional[List[int]] = None,
+                             difficulty: Optional[str] = None,
+                             exclude_ids: Optional[set] = None) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def get_questions_by_ids(self, question_ids: List[int]) -> Dict[int, Dict]:
+        ...
+
+    @abstractmethod
+    def insert_exam(self, total_questions: int, correct_answers: int, score: float,
+                    selected_categories: str, time_spent_seconds: int,
+                    user_id: str = DEFAULT_USER_ID) -> int:
+        ...
+
+    @abstractmethod
+    def insert_exam_answer(self, exam_id: int, question_id: int, user_answer: str,
+                           is_correct: bool, time_spent_seconds: Optional[int] = None,
+                           user_id: str = DEFAULT_USER_ID) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def record_exam_submission(self, total_questions: int, correct_answers: int, score: float,
+                               selected_categories: str, time_spent_seconds: int,
+                               answers: List[Dict], user_id: str = DEFAULT_USER_ID) -> int:
+        ...
+
+    @abstractmethod
+    def get_exam_by_id(self, exam_id: int, user_id: str = DEFAULT_USER_ID) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def get_exam_answers(self, exam_id: int, user_id: str = DEFAULT_USER_ID) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def get_exam_history(self, limit: int = 20, user_id: str = DEFAULT_USER_ID) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def get_study_progress(self, user_id: str = DEFAULT_USER_ID) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def get_overall_stats(self, user_id: Optional[str] = None) -> Dict:
+        ...
+
+    def close(self):
+        pass
+
+# ==================== BACKEND SQLITE ====================
+
+class SQLiteBackend(StorageBackend):
+    """Modelo relacional actual: exams + exam_answers + study_progress (database.py)"""
+
+    name = 'sqlite'
+
+    def get_random_questions(self, limit=20, category_ids=None, difficulty=None, exclude_ids=None):
+        return database.get_random_questions(limit, category_ids, difficulty, exclude_ids)
+
+    def get_questions_by_ids(self, question_ids):
+        return database.get_questions_by_ids(question_ids)
+
+    def insert_exam(self, total_questions, correct_answers, score, selected_categories,
+                    time_spent_seconds, user_id=DEFAULT_USER_ID):
+        return database.insert_exam(total_questions, correct_answers, score,
+                                    selected_categories, time_spent_seconds, user_id)
+
+    def insert_exam_answer(self, exam_id, question_id, user_answer, is_correct,
+                           time_spent_seconds=None, user_id=DEFAULT_USER_ID):
+        return database.insert_exam_answer(exam_id, question_id, user_answer, is_correct,
+                                           time_spent_seconds, user_id)
+
+    def record_exam_submission(self, total_questions, correct_answers, score, selected_categories,
+                               time_spent_seconds, answers, user_id=DEFAULT_USER_ID):
+        return database.record_exam_submission(total_questions, correct_answers, score,
+                                               selected_categories, time_spent_seconds,
+                                               answers, user_id)
+
+    def get_exam_by_id(self, exam_id, user_id=DEFAULT_USER_ID):
+        return database.get_exam_by_id(exam_id, user_id)
+
+    def get_exam_answers(self, exam_id, user_id=DEFAULT_USER_ID):
+        return database.get_exam_answers(exam_id, user_id)
+
+    def get_exam_history(self, limit=20, user_id=DEFAULT_USER_ID):
+        return database.get_exam_history(limit, user_id)
+
+    def get_study_progress(self, user_id=DEFAULT_USER_ID):
+        return database.get_study_progress(user_id)
+
+    def get_overall_stats(self, user_id=None):
+        return database.get_overall_stats(user_id)
+
+# ==================== SUSTITUTO EN PROCESO DE MONGODB ====================
+
+_MISSING = object()
+
+_QUERY_OPERATORS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+    '$lt': lambda value, operand: value is not _MISSING and value < operand,
+    '$lte': lambda value, operand: value is not _MISSING and value <= operand,
+    '$gt': lambda value, operand: value is not _MISSING and value > operand,
+    '$gte': lambda value, operand: value is not _MISSING and value >= operand,
+}
+
+def _matches(document: Dict, query: Optional[Dict]) -> bool:
+    for key, condition in (query or {}).items():
+        value = document.get(key, _MISSING)
+        if isinstance(condition, dict) and condition and next(iter(condition)).startswith('$'):
+            for operator, operand in condition.items():
+                if operator not in _QUERY_OPERATORS:
+                    raise NotImplementedError(f'Operador no soportado por InMemoryDatabase: {operator}')
+                if not _QUERY_OPERATORS[operator](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _apply_projection(document: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(document)
+    included = [key for key, flag in projection.items() if flag and key != '_id']
+    if included:
+        result = {key: copy.deepcopy(document[key]) for key in included if key in document}
+        if projection.get('_id', 1):
+            result['_id'] = document['_id']
+        return result
+    return {key: copy.deepcopy(value) for key, value in document.items()
+            if projection.get(key, 1)}
+
+def _apply_update(document: Dict, update: Dict, inserting: bool):
+    for operator, fields in update.items():
+        for key, value in fields.items():
+            if operator == '$set' or (operator == '$setOnInsert' and inserting):
+                document[key] = copy.deepcopy(value)
+            elif operator == '$inc':
+                document[key] = document.get(key, 0) + value
+            elif operator == '$max':
+                current = document.get(key)
+                document[key] = value if current is None or value > current else current
+            elif operator == '$push':
+                document.setdefault(key, []).append(copy.deepcopy(value))
+            elif operator != '$setOnInsert':
+                raise NotImplementedError(f'Operador no soportado por InMemoryDatabase: {operator}')
+
+class _InMemoryCursor:
+    """Resultado de find(): admite sort() y limit() encadenados, como en pymongo"""
+
+    def __init__(self, documents: List[Dict], projection: Optional[Dict]):
+        self._documents = documents
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1):
+        keys = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, key_direction in reversed(keys):  # Ordenación estable por varias claves
+            self._documents.sort(key=lambda doc: doc.get(key), reverse=key_direction < 0)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        documents = self._documents[:self._limit] if self._limit else self._documents
+        return (_apply_projection(doc, self._projection) for doc in documents)
+
+class InMemoryCollection:
+    """Colección en memoria con el subconjunto de la API de pymongo que usa DocumentBackend"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.indexes: List = []
+        self._documents: Dict = {}
+        self._lock = threading.Lock()
+
+    def create_index(self, keys, **options) -> str:
+        self.indexes.append((keys, options))  # Sin efecto: el sustituto recorre la colección
+        return '_'.join(f'{key}_{direction}' for key, direction in keys)
+
+    def insert_one(self, document: Dict):
+        with self._lock:
+            if document['_id'] in self._documents:
+                raise ValueError(f'_id duplicado en {self.name}: {document["_id"]}')
+            self._documents[document['_id']] = copy.deepcopy(document)
+        return SimpleNamespace(inserted_id=document['_id'])
+
+    def insert_many(self, documents: List[Dict]):
+        return SimpleNamespace(inserted_ids=[self.insert_one(doc).inserted_id for doc in documents])
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None) -> _InMemoryCursor:
+        with self._lock:
+            documents = [doc for doc in self._documents.values() if _matches(doc, query)]
+        return _InMemoryCursor(documents, projection)
+
+    def find_one(self, query: Optional[Dict] = None, projection: Optional[Dict] = None) -> Optional[Dict]:
+        with self._lock:
+            if query and '_id' in query and not isinstance(query['_id'], dict):
+                document = self._documents.get(query['_id'])
+                found = document is not None and _matches(document, query)
+                return _apply_projection(document, projection) if found else None
+            for document in self._documents.values():
+                if _matches(document, query):
+                    return _apply_projection(document, projection)
+        return None
+
+    def _upsert_target(self, query: Dict, update: Dict, upsert: bool):
+        if '_id' in query and not isinstance(query['_id'], dict):
+            candidates = [self._documents[query['_id']]] if query['_id'] in self._documents else []
+        else:
+            candidates = self._documents.values()
+        for document in candidates:
+            if _matches(document, query):
+                return document, False
+        if not upsert:
+            return None, False
+        document = {key: value for key, value in query.items() if not isinstance(value, dict)}
+        if '_id' not in document:
+            document['_id'] = f'{self.name}:{len(self._documents) + 1}'
+        self._documents[document['_id']] = document
+        return document, True
+
+    def update_one(self, query: Dict, update: Dict, upsert: bool = False):
+        with self._lock:
+            document, inserted = self._upsert_target(query, update, upsert)
+            if document is not None:
+                _apply_update(document, update, inserted)
+        return SimpleNamespace(matched_count=int(document is not None and not inserted),
+                               upserted_id=document['_id'] if inserted else None)
+
+    def find_one_and_update(self, query: Dict, update: Dict, upsert: bool = False,
+                            return_document: bool = False) -> Optional[Dict]:
+        with self._lock:
+            document, inserted = self._upsert_target(query, update, upsert)
+            if document is None:
+                return None
+            before = None if inserted else copy.deepcopy(document)
+            _apply_update(document, update, inserted)
+            return copy.deepcopy(document) if return_document else before
+
+    def count_documents(self, query: Dict) -> int:
+        with self._lock:
+            return sum(1 for doc in self._documents.values() if _matches(doc, query))
+
+    def delete_many(self, query: Dict):
+        with self._lock:
+            doomed = [key for key, doc in self._documents.items() if _matches(doc, query)]
+            for key in doomed:
+                del self._documents[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    def aggregate(self, pipeline: List[Dict]):
+        """Solo $match, $sample y $limit (lo que usa DocumentBackend)"""
+        with self._lock:
+            documents = list(self._documents.values())
+        for stage in pipeline:
+            (operator, argument), = stage.items()
+            if operator == '$match':
+                documents = [doc for doc in documents if _matches(doc, argument)]
+            elif operator == '$sample':
+                documents = random.sample(documents, min(argument['size'], len(documents)))
+            elif operator == '$limit':
+                documents = documents[:argument]
+            else:
+                raise NotImplementedError(f'Etapa no soportada por InMemoryDatabase: {operator}')
+        return iter([copy.deepcopy(doc) for doc in documents])
+
+class InMemoryDatabase:
+    """Base de datos en memoria: db['coleccion'] devuelve (y crea) la colección"""
+
+    def __init__(self):
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+def connect_document_store():
+    """
+    Base de datos documental disponible
+
+    pymongo si hay QUIZ_MONGO_URI; si no, mongomock si está instalado; si
+    tampoco, InMemoryDatabase.
+    """
+    if MONGO_URI:
+        if pymongo is None:
+            raise RuntimeError('QUIZ_MONGO_URI requiere pymongo (pip install pymongo)')
+        return pymongo.MongoClient(MONGO_URI)[MONGO_DB_NAME]
+    if mongomock is not None:
+        return mongomock.MongoClient()[MONGO_DB_NAME]
+    return InMemoryDatabase()
+
+# ==================== BACKEND DOCUMENTAL ====================
+
+def _utc_timestamp() -> str:
+    """Mismo formato que CURRENT_TIMESTAMP de SQLite"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _with_id(document: Dict) -> Dict:
+    """Renombra _id a id para devolver la misma forma que el backend SQLite"""
+    document['id'] = document.pop('_id')
+    return document
+
+class DocumentBackend(StorageBackend):
+    """
+    Modelo documental: un documento por examen con las respuestas embebidas
+
+    Colecciones:
+        questions / categories: copia del banco (_id = id de SQLite)
+        exams: {_id, user_id, exam_date, ..., answers: [{question_id, ...}]}
+        study_progress: un documento por (user_id, category_id), con $inc
+        user_stats: totales por usuario (como la tabla user_stats)
+        counters: secuencia de IDs de examen
+
+    Guardar un examen es un solo insert_one atómico; el progreso y las
+    estadísticas se actualizan justo después con $inc, sin transacción
+    multi-documento (MongoDB solo la ofrece con replica set).
+    """
+
+    name = 'document'
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else connect_document_store()
+        self.questions = self.db['questions']
+        self.categories = self.db['categories']
+        self.exams = self.db['exams']
+        self.study_progress = self.db['study_progress']
+        self.user_stats = self.db['user_stats']
+        self.counters = self.db['counters']
+        self.questions.create_index([('category_id', 1), ('difficulty', 1)])
+        self.exams.create_index([('user_id', 1), ('exam_date', -1), ('_id', -1)])
+        self.study_progress.create_index([('user_id', 1), ('category_id', 1)], unique=True)
+
+    def load_question_bank(self, categories: Optional[List[Dict]] = None,
+                           questions: Optional[List] = None) -> int:
+        """
+        Reemplaza el banco de preguntas (por defecto, el de la BD SQLite)
+
+        Returns:
+            Número de preguntas cargadas
+        """
+        if categories is None:
+            categories = database.get_all_categories()
+        if questions is None:
+            questions = [question for category in categories
+                         for question in database.get_questions_by_category(category['id'])]
+        self.categories.delete_many({})
+        self.questions.delete_many({})
+        if categories:
+            self.categories.insert_many([
+                {'_id': c['id'], **{k: v for k, v in dict(c).items() if k != 'id'}} for c in categories
+            ])
+        if questions:
+            self.questions.insert_many([
+                {'_id': q['id'], **{k: v for k, v in dict(q).items() if k != 'id'}} for q in questions
+            ])
+        return len(questions)
+
+    def _next_exam_id(self) -> int:
+        counter = self.counters.find_one_and_update(
+            {'_id': 'exams'}, {'$inc': {'seq': 1}}, upsert=True, return_document=True
+        )
+        return counter['seq']
+
+    def get_random_questions(self, limit=20, category_ids=None, difficulty=None, exclude_ids=None):
+        match = {}
+        if category_ids:
+            match['category_id'] = {'$in': list(category_ids)}
+        if difficulty:
+            match['difficulty'] = difficulty
+        if exclude_ids:
+            match['_id'] = {'$nin': list(exclude_ids)}
+        pipeline = [{'$match': match}, {'$sample': {'size': limit}}]
+        return [_with_id(doc) for doc in self.questions.aggregate(pipeline)]
+
+    def get_questions_by_ids(self, question_ids):
+        if not question_ids:
+            return {}
+        found = {doc['_id']: doc for doc in self.questions.find({'_id': {'$in': list(question_ids)}})}
+        return {qid: _with_id(found[qid]) for qid in dict.fromkeys(question_ids) if qid in found}
+
+    def _insert_exam_document(self, total_questions, correct_answers, score, selected_categories,
+                              time_spent_seconds, answers, user_id) -> int:
+        exam_id = self._next_exam_id()
+        self.exams.insert_one({
+            '_id': exam_id,
+            'user_id': user_id,
+            'exam_date': _utc_timestamp(),
+            'total_questions': total_questions,
+            'correct_answers': correct_answers,
+            'score': score,
+            'selected_categories': json.loads(selected_categories) if selected_categories else [],
+            'time_spent_seconds': time_spent_seconds,
+            'archived_at': None,
+            'answers': answers
+        })
+        self.user_stats.update_one(
+            {'_id': user_id},
+            {'$inc': {'total_exams': 1, 'sum_scores': score}, '$max': {'best_score': score}},
+            upsert=True
+        )
+        return exam_id
+
+    def insert_exam(self, total_questions, correct_answers, score, selected_categories,
+                    time_spent_seconds, user_id=DEFAULT_USER_ID):
+        return self._insert_exam_document(total_questions, correct_answers, score,
+                                          selected_categories, time_spent_seconds, [], user_id)
+
+    def insert_exam_answer(self, exam_id, question_id, user_answer, is_correct,
+                           time_spent_seconds=None, user_id=DEFAULT_USER_ID):
+        """Añade la respuesta al array del examen ($push); no tiene ID propio (devuelve None)"""
+        self.exams.update_one({'_id': exam_id, 'user_id': user_id}, {'$push': {'answers': {
+            'question_id': question_id,
+            'user_answer': user_answer,
+            'is_correct': bool(is_correct),
+            'time_spent_seconds': time_spent_seconds
+        }}})
+        return None
+
+    def record_exam_submission(self, total_questions, correct_answers, score, selected_categories,
+                               time_spent_seconds, answers, user_id=DEFAULT_USER_ID):
+        embedded = [{
+            'question_id': a['question_id'],
+            'category_id': a['category_id'],
+            'user_answer': a['user_answer'],
+            'is_correct': bool(a['is_correct']),
+            'time_spent_seconds': a.get('time_spent_seconds'),
+            'time_spent_ms': a.get('time_spent_ms'),
+            'first_answer_ms': a.get('first_answer_ms'),
+            'last_answer_ms': a.get('last_answer_ms'),
+            'answer_changes': a.get('answer_changes')
+        } for a in answers]
+        exam_id = self._insert_exam_document(total_questions, correct_answers, score,
+                                             selected_categories, time_spent_seconds,
+                                             embedded, user_id)
+
+        category_stats = {}  # {category_id: [answered, correct]}
+        for a in embedded:
+            stats = category_stats.setdefault(a['category_id'], [0, 0])
+            stats[0] += 1
+            if a['is_correct']:
+                stats[1] += 1
+        now = _utc_timestamp()
+        for category_id, (answered, correct) in category_stats.items():
+            self.study_progress.update_one(
+                {'_id': f'{user_id}:{category_id}', 'user_id': user_id, 'category_id': category_id},
+                {'$inc': {'questions_answered': answered, 'questions_correct': correct},
+                 '$set': {'last_study_date': now}},
+                upsert=True
+            )
+        self.user_stats.update_one(
+            {'_id': user_id},
+            {'$inc': {'total_answered': len(embedded),
+                      'total_correct': sum(1 for a in embedded if a['is_correct'])}},
+            upsert=True
+        )
+        return exam_id
+
+    def get_exam_by_id(self, exam_id, user_id=DEFAULT_USER_ID):
+        exam = self.exams.find_one({'_id': exam_id, 'user_id': user_id}, {'answers': 0})
+        return _with_id(exam) if exam else None
+
+    def get_exam_answers(self, exam_id, user_id=DEFAULT_USER_ID):
+        exam = self.exams.find_one({'_id': exam_id, 'user_id': user_id}, {'answers': 1})
+        if not exam:
+            return []
+        answers = exam.get('answers', [])
+        questions = self.get_questions_by_ids([a['question_id'] for a in answers])
+        categories = {c['_id']: c for c in self.categories.find()}
+        for answer in answers:
+            answer['exam_id'] = exam_id
+            question = questions.get(answer['question_id'], {})
+            for field in ANSWER_QUESTION_FIELDS:
+                answer[field] = question.get(field)
+            category = categories.get(question.get('category_id'))
+            answer['category_name'] = category['name'] if category else None
+        return answers
+
+    def get_exam_history(self, limit=20, user_id=DEFAULT_USER_ID):
+        cursor = self.exams.find({'user_id': user_id}, {'answers': 0})
+        return [_with_id(exam) for exam in
+                cursor.sort([('exam_date', -1), ('_id', -1)]).limit(limit)]
+
+    def get_study_progress(self, user_id=DEFAULT_USER_ID):
+        categories = {c['_id']: c for c in self.categories.find()}
+        progress = []
+        for entry in self.study_progress.find({'user_id': user_id}, {'_id': 0}):
+            category = categories.get(entry['category_id'])
+            if category is None:
+                continue
+            entry['category_name'] = category['name']
+            entry['session_number'] = category['session_number']
+            progress.append(entry)
+        progress.sort(key=lambda p: (p['session_number'] is None, p['session_number'] or 0))
+        return progress
+
+    def get_overall_stats(self, user_id=None):
+        summary = dict(database._EMPTY_SUMMARY)
+        query = {} if user_id is None else {'_id': user_id}
+        for stats in self.user_stats.find(query):
+            summary['total_exams'] += stats.get('total_exams', 0)
+            summary['sum_scores'] += stats.get('sum_scores', 0)
+            summary['total_answered'] += stats.get('total_answered', 0)
+            summary['total_correct'] += stats.get('total_correct', 0)
+            summary['best_score'] = max(summary['best_score'] or 0, stats.get('best_score') or 0)
+        return database._summary_to_stats(summary)
+
+# ==================== SELECCIÓN DEL BACKEND ====================
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+def create_storage(kind: Optional[str] = None) -> StorageBackend:
+    """
+    Crea un backend ('sqlite' o 'document'; por defecto QUIZ_STORAGE_BACKEND)
+
+    Raises:
+        ValueError: si el tipo no existe
+    """
+    kind = kind or STORAGE_BACKEND
+    if kind == 'sqlite':
+        return SQLiteBackend()
+    if kind == 'document':
+        backend = DocumentBackend()
+        if backend.questions.count_documents({}) == 0:
+            backend.load_question_bank()
+        return backend
+    raise ValueError(f"Backend de almacenamiento desconocido: {kind!r} (usa 'sqlite' o 'document')")
+
+def get_storage() -> StorageBackend:
+    """Backend compartido del proceso (se crea en el primer uso)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+# ==================== BENCHMARK ====================
+
+def _latency_summary(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        'ops': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p99_ms': round(pick(0.99), 3)
+    }
+
+def run_workload(backend: StorageBackend, exams: int = 200, users: int = 20,
+                 questions_per_exam: int = 20, seed: int = 42) -> Dict:
+    """
+    Ejecuta la carga de la aplicación contra un backend
+
+    Por cada examen: preguntas aleatorias, registro del examen y las
+    lecturas que siguen en la interfaz (historial, detalle con respuestas,
+    progreso y estadísticas del usuario).
+
+    Returns:
+        Dict {operación: resumen de latencias} más total_seconds
+    """
+    rng = random.Random(seed)
+    samples = {name: [] for name in ('get_random_questions', 'record_exam_submission',
+                                     'get_exam_history', 'get_exam_answers',
+                                     'get_study_progress', 'get_overall_stats')}
+
+    def timed(name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        samples[name].append((time.perf_counter() - start) * 1000)
+        return result
+
+    start = time.perf_counter()
+    for _ in range(exams):
+        user_id = f'bench-{rng.randrange(users)}'
+        questions = timed('get_random_questions', backend.get_random_questions, questions_per_exam)
+        answers = [{
+            'question_id': q['id'],
+            'category_id': q['category_id'],
+            'user_answer': rng.choice('abcde'),
+            'is_correct': False,
+            'time_spent_seconds': rng.randint(5, 60)
+        } for q in questions]
+        for answer, question in zip(answers, questions):
+            answer['is_correct'] = answer['user_answer'] == question['correct_answer']
+        correct = sum(1 for a in answers if a['is_correct'])
+        exam_id = timed('record_exam_submission', backend.record_exam_submission,
+                        len(answers), correct, correct / len(answers) * 100 if answers else 0,
+                        json.dumps([]), sum(a['time_spent_seconds'] for a in answers),
+                        answers, user_id)
+
+        timed('get_exam_history', backend.get_exam_history, 20, user_id)
+        timed('get_exam_answers', backend.get_exam_answers, exam_id, user_id)
+        timed('get_study_progress', backend.get_study_progress, user_id)
+        timed('get_overall_stats', backend.get_overall_stats, user_id)
+
+    report = {name: _latency_summary(values) for name, values in samples.items() if values}
+    report['total_seconds'] = round(time.perf_counter() - start, 3)
+    return report
+
+def run_benchmark(exams: int = 200, users: int = 20) -> Dict:
+    """
+    Misma carga contra SQLite y contra el backend documental
+
+    SQLite trabaja sobre una copia temporal de la BD principal (sin
+    sharding ni escritura diferida) y el documental sobre una BD nueva con
+    el mismo banco de preguntas, así que no se modifican los datos reales.
+    """
+    from backup import backup_file
+
+    original_db, original_shards = database.DB_PATH, database.SHARD_COUNT
+    work_dir = tempfile.mkdtemp(prefix='quiz-storage-bench-')
+    try:
+        copy_path = os.path.join(work_dir, 'bench.db')
+        backup_file(database.DB_PATH, copy_path, pages=-1, step_sleep=0)
+        database.configure_pool(db_path=copy_path)
+        database.configure_shards(shard_count=0)
+
+        document = DocumentBackend()
+        document.load_question_bank()
+        document_store = type(document.db).__module__.split('.')[0]
+
+        reports = {}
+        for backend in (SQLiteBackend(), document):
+            reports[backend.name] = run_workload(backend, exams=exams, users=users)
+        reports['document_store'] = 'InMemoryDatabase' if document_store == __name__ else document_store
+        return reports
+    finally:
+        database.configure_pool(db_path=original_db)
+        database.configure_shards(shard_count=original_shards)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    print("="*60)
+    print("🗃️  BACKENDS DE ALMACENAMIENTO")
+    print("="*60 + "\n")
+
+    if '--benchmark' in sys.argv:
+        exams = 200
+        if '--exams' in sys.argv:
+            exams = int(sys.argv[sys.argv.index('--exams') + 1])
+        reports = run_benchmark(exams=exams)
+        print(f"📊 {exams} exámenes por backend (documental sobre {reports['document_store']})\n")
+        print(f"{'operación':<24} {'backend':<10} {'media ms':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for operation in reports['sqlite']:
+            if operation == 'total_seconds':
+                continue
+            for name in ('sqlite', 'document'):
+                stats = reports[name][operation]
+                print(f"{operation:<24} {name:<10} {stats['mean_ms']:>9} "
+                      f"{stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+        print()
+        for name in ('sqlite', 'document'):
+            print(f"  Total {name}: {reports[name]['total_seconds']} s")
+    else:
+        backend = get_storage()
+        print(f"Backend activo: {backend.name} (QUIZ_STORAGE_BACKEND)")
+        print("Usa --benchmark para comparar SQLite con el modelo documental")
+
+    print()
@@ -0,0 +1,438 @@
+"""
+stratified_sampler.py - Muestreo estratificado de exámenes con NumPy
+
+Genera exámenes que cumplen a la vez cuotas por categoría, dificultad y
+tipo de pregunta, en lotes de miles de exámenes y sin bucles de Python por
+pregunta. El banco se codifica en arrays ordenados por celda
+(categoría × dificultad × tipo) y cada lote se genera en dos fases
+vectorizadas sobre todos los exámenes a la vez:
+
+1. Plan de celdas: antes de cada hueco, el peso disponible de cada celda
+   se ajusta con unas pasadas de IPF (ajuste proporcional iterativo) a lo
+   que falta de cada cuota, y el hueco elige celda en proporción a ese
+   peso. Las celdas con alguna cuota cerrada pesan 0 y las combinaciones
+   escasas se cubren pronto, así que al terminar se cumplen las tres
+   cuotas siempre que el banco lo permita.
+2. Preguntas: dentro de cada celda, muestreo ponderado sin reemplazo
+   (búsqueda binaria sobre los pesos acumulados y nuevo sorteo de las
+   repetidas).
+
+Política cuando falta material:
+- Una cuota imposible (p. ej. más preguntas 'hard' de las que hay en las
+  categorías elegidas) se recorta a lo disponible y el exceso pasa a los
+  demás valores de esa dimensión en proporción a su cuota.
+- Si en un hueco ninguna celda cumple las tres cuotas, se relajan en el
+  orden de RELAX_ORDER: primero el tipo, después la dificultad y por último
+  la categoría (el hueco se llena con cualquier pregunta de las categorías
+  elegidas). El informe cuenta los huecos relajados por dimensión.
+- Si las categorías elegidas tienen menos preguntas que el examen, el
+  examen es más corto.
+
+Requiere NumPy (pip install numpy).
+
+Uso:
+    python stratified_sampler.py                    # Lote de 1000 exámenes con el banco actual
+    python stratified_sampler.py --exams 10000      # Lote de 10.000 exámenes
+    python stratified_sampler.py --benchmark --questions 1000000 --exams 10000
+"""
+
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import database
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+QUESTION_TYPES = ('conceptual', 'syntax')
+DEFAULT_DIFFICULTY_QUOTA = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
+RELAX_ORDER = ('question_type', 'difficulty', 'category_id')
+MAX_REDRAW_ROUNDS = 32  # Sorteos vectorizados de repetidas antes de resolverlas una a una
+IPF_ITERATIONS = 8      # Pasadas de ajuste proporcional por hueco (al replanificar)
+PLAN_RETRIES = 4        # Replanificaciones (con IPF) de los exámenes que no cumplen las cuotas
+
+class StratifiedSampler:
+    """
+    Banco de preguntas codificado en arrays para muestreo estratificado
+
+    Las preguntas se ordenan por celda; cada celda ocupa un tramo contiguo
+    [cell_start, cell_end) de los arrays y sus pesos acumulados permiten
+    elegir una pregunta ponderada con una búsqueda binaria.
+    """
+
+    def __init__(self, question_ids, category_ids, difficulty_codes, type_codes, weights=None):
+        """
+        Args:
+            question_ids: ID de cada pregunta
+            category_ids: Categoría de cada pregunta
+            difficulty_codes: Índice en DIFFICULTIES de cada pregunta
+            type_codes: Índice en QUESTION_TYPES de cada pregunta
+            weights: Peso de muestreo de cada pregunta (None = uniforme;
+                     las de peso 0 no salen nunca)
+        """
+        if np is None:
+            raise RuntimeError('stratified_sampler.py requiere NumPy (pip install numpy)')
+        question_ids = np.asarray(question_ids, dtype=np.int64)
+        weights = (np.ones(len(question_ids)) if weights is None
+                   else np.asarray(weights, dtype=np.float64))
+        keep = weights > 0
+
+        self.categories = np.unique(np.asarray(category_ids, dtype=np.int64)[keep])
+        category_index = np.searchsorted(self.categories, np.asarray(category_ids)[keep])
+        per_category = len(DIFFICULTIES) * len(QUESTION_TYPES)
+        cells = (category_index * per_category
+                 + np.asarray(difficulty_codes)[keep] * len(QUESTION_TYPES)
+                 + np.asarray(type_codes)[keep])
+
+        order = np.argsort(cells, kind='stable')
+        self.question_ids = question_ids[keep][order]
+        self.weights = weights[keep][order]
+        self.cumulative = np.cumsum(self.weights)
+
+        n_cells = len(self.categories) * per_category
+        sorted_cells = cells[order]
+        cell_range = np.arange(n_cells)
+        self.cell_start = np.searchsorted(sorted_cells, cell_range, side='left')
+        self.cell_end = np.searchsorted(sorted_cells, cell_range, side='right')
+        self.cell_count = self.cell_end - self.cell_start
+        self.cell_weight = np.bincount(sorted_cells, weights=self.weights, minlength=n_cells)
+        self.cell_base = np.concatenate(([0.0], self.cumulative))[self.cell_start]
+        self.cell_mean_weight = np.divide(self.cell_weight, np.maximum(self.cell_count, 1))
+
+        # Dimensiones de cada celda (índices en categories, DIFFICULTIES y QUESTION_TYPES)
+        self.cell_dims = {
+            'category_id': cell_range // per_category,
+            'difficulty': (cell_range // len(QUESTION_TYPES)) % len(DIFFICULTIES),
+            'question_type': cell_range % len(QUESTION_TYPES),
+        }
+        # Matrices celda -> valor (one-hot): los márgenes de un lote son un producto matricial
+        self.cell_onehot = {
+            dimension: np.eye(len(self._quota_values(dimension)))[values]
+            for dimension, values in self.cell_dims.items()
+        }
+
+    @classmethod
+    def from_questions(cls, questions, weights: Optional[Dict[int, float]] = None):
+        """Construye el muestreador a partir de filas con id, category_id, difficulty y question_type"""
+        difficulty_code = {d: i for i, d in enumerate(DIFFICULTIES)}
+        type_code = {t: i for i, t in enumerate(QUESTION_TYPES)}
+        rows = [(q['id'], q['category_id'], difficulty_code[q['difficulty']],
+                 type_code[q['question_type']]) for q in questions]
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 4).T
+        question_weights = None
+        if weights is not None:
+            question_weights = np.array([weights.get(int(qid), 1.0) for qid in columns[0]])
+        return cls(columns[0], columns[1], columns[2], columns[3], question_weights)
+
+    # ==================== CUOTAS ====================
+
+    def _quota_values(self, dimension: str) -> Tuple:
+        if dimension == 'category_id':
+            return tuple(int(c) for c in self.categories)
+        return DIFFICULTIES if dimension == 'difficulty' else QUESTION_TYPES
+
+    def _targets(self, dimension: str, quota, available, num_questions: int,
+                 num_exams: int, rng) -> Optional['np.ndarray']:
+        """
+        Cuota de una dimensión como recuentos enteros por examen [exámenes, valores]
+
+        Recorta a lo disponible pasando el exceso a los demás valores y
+        redondea por restos mayores, desempatando al azar en cada examen.
+        """
+        if quota is None:
+            return None
+        values = self._quota_values(dimension)
+        if quota == 'even':
+            share = (available > 0).astype(np.float64)
+        else:
+            share = np.array([float(quota.get(value, 0)) for value in values])
+            if (share < 0).any():
+                raise ValueError(f'Cuota negativa en {dimension}')
+        share = np.where(available > 0, share, 0)
+        if share.sum() == 0:
+            share = available.astype(np.float64)
+        target = num_questions * share / share.sum()
+
+        # Recorte a lo disponible: el exceso va a los valores con hueco
+        for _ in range(len(values)):
+            excess = np.maximum(target - available, 0).sum()
+            if excess <= 1e-9:
+                break
+            target = np.minimum(target, available)
+            room = target < available
+            weights = np.where(room, share, 0)
+            if weights.sum() == 0:
+                weights = np.where(room, available - target, 0)
+            target = target + excess * weights / weights.sum()
+
+        floor = np.floor(target + 1e-9)
+        remainder = int(round(num_questions - floor.sum()))
+        counts = np.tile(floor.astype(np.int64), (num_exams, 1))
+        if remainder > 0:
+            keys = (target - floor) + rng.random((num_exams, len(values))) * 1e-6
+            keys[:, floor >= available] = -np.inf
+            chosen = np.argsort(-keys, axis=1)[:, :remainder]
+            np.put_along_axis(counts, chosen, np.take_along_axis(counts, chosen, axis=1) + 1, axis=1)
+        return counts
+
+    # ==================== MUESTREO ====================
+
+    def sample_batch(self, num_exams: int, num_questions: int = 20,
+                     category_ids: Optional[List[int]] = None,
+                     category_quota='even',
+                     difficulty_quota: Optional[Dict[str, float]] = DEFAULT_DIFFICULTY_QUOTA,
+                     type_quota: Optional[Dict[str, float]] = None,
+                     seed=None) -> Tuple['np.ndarray', Dict]:
+        """
+        Genera num_exams exámenes que cumplen las cuotas a la vez
+
+        Args:
+            num_exams: Exámenes del lote
+            num_questions: Preguntas por examen
+            category_ids: Categorías permitidas (None = todas)
+            category_quota: 'even' (reparto igual), dict {category_id: proporción} o None
+            difficulty_quota: Dict {dificultad: proporción} o None (sin cuota)
+            type_quota: Dict {tipo: proporción} o None (sin cuota)
+            seed: Semilla o np.random.Generator
+
+        Returns:
+            Tupla (array [num_exams, preguntas] de IDs, informe). El informe
+            incluye los recuentos objetivo, los huecos relajados por dimensión
+            y cuántos exámenes cumplen todas las cuotas.
+        """
+        start = time.perf_counter()
+        rng = np.random.default_rng(seed)
+        cell_dims = self.cell_dims
+        cap = self.cell_count.copy()
+        if category_ids:
+            allowed = np.isin(self.categories, np.asarray(category_ids, dtype=np.int64))
+            cap[~allowed[cell_dims['category_id']]] = 0
+        num_questions = int(min(num_questions, cap.sum()))
+
+        quotas = {'category_id': category_quota, 'difficulty': difficulty_quota,
+                  'question_type': type_quota}
+        remaining = {}
+        for dimension, quota in quotas.items():
+            available = np.bincount(cell_dims[dimension], weights=cap,
+                                    minlength=len(self._quota_values(dimension)))
+            target = self._targets(dimension, quota, available, num_questions, num_exams, rng)
+            if target is not None:
+                remaining[dimension] = target
+        targets = {
+            dimension: {value: mean for value, mean in zip(self._quota_values(dimension),
+                                                           counts.mean(axis=0).round(2).tolist())
+                        if mean > 0}
+            for dimension, counts in remaining.items()
+        }
+
+        # Fase 1: plan de celdas. Los exámenes que no cumplen alguna cuota se
+        # vuelven a planificar con el ajuste IPF, que evita callejones sin salida
+        plan, relaxed, met = self._plan(cap, remaining, num_exams, num_questions, rng, fit=False)
+        failed = np.flatnonzero(~met)
+        retries = 0
+        while len(failed) and retries < PLAN_RETRIES:
+            retries += 1
+            subset = {dimension: counts[failed] for dimension, counts in remaining.items()}
+            retry_plan, retry_relaxed, retry_met = self._plan(cap, subset, len(failed),
+                                                              num_questions, rng, fit=True)
+            plan[failed[retry_met]] = retry_plan[retry_met]
+            relaxed[failed[retry_met]] = retry_relaxed[retry_met]
+            failed = failed[~retry_met]
+
+        # Fase 2: pregunta ponderada dentro de cada celda, sin repetir
+        positions = self._draw_in_cells(plan, rng)
+        exams = rng.permuted(self.question_ids[positions], axis=1)
+
+        report = {
+            'exams': num_exams,
+            'questions_per_exam': num_questions,
+            'targets': targets,
+            'relaxed_slots': dict(zip(RELAX_ORDER, relaxed.sum(axis=0).tolist())),
+            'exact_exams': num_exams - len(failed),
+            'replanned_rounds': retries,
+            'seconds': round(time.perf_counter() - start, 4)
+        }
+        return exams, report
+
+    def _plan(self, cap, targets: Dict, num_exams: int, num_questions: int, rng,
+              fit: bool) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        Celda de cada hueco para un grupo de exámenes
+
+        Args:
+            cap: Preguntas disponibles por celda
+            targets: {dimensión: recuentos [exámenes, valores]} (no se modifican)
+            fit: Ajustar los pesos con IPF (más lento, casi nunca se atasca);
+                 si no, peso de la celda · lo que falta de cada una de sus cuotas
+
+        Returns:
+            Tupla (plan [exámenes, huecos], huecos relajados [exámenes,
+            RELAX_ORDER], máscara de exámenes que cumplen todas las cuotas)
+        """
+        remaining = {dimension: counts.copy() for dimension, counts in targets.items()}
+        capacity = np.tile(cap, (num_exams, 1))
+        plan = np.empty((num_exams, num_questions), dtype=np.int64)
+        relaxed = np.zeros((num_exams, len(RELAX_ORDER)), dtype=np.int64)
+        rows = np.arange(num_exams)
+        for slot in range(num_questions):
+            base = capacity * self.cell_mean_weight
+            weight = self._weigh(base, remaining, fit)
+            pending = weight.sum(axis=1) <= 0
+            if pending.any():
+                # Relajar cuotas en orden hasta que haya alguna celda con peso
+                active = [d for d in RELAX_ORDER if d in remaining]
+                while active and pending.any():
+                    dropped = active.pop(0)
+                    relaxed[pending, RELAX_ORDER.index(dropped)] += 1
+                    weight[pending] = self._weigh(
+                        base[pending], {d: remaining[d][pending] for d in active}, fit
+                    )
+                    pending = weight.sum(axis=1) <= 0
+
+            cumulative = np.cumsum(weight, axis=1)
+            draw = rng.random(num_exams) * cumulative[:, -1]
+            cell = np.minimum((cumulative <= draw[:, None]).sum(axis=1), len(cap) - 1)
+            plan[:, slot] = cell
+            capacity[rows, cell] -= 1
+            for dimension, counts in remaining.items():
+                value = self.cell_dims[dimension][cell]
+                counts[rows, value] = np.maximum(counts[rows, value] - 1, 0)
+
+        met = np.ones(num_exams, dtype=bool)
+        for counts in remaining.values():
+            met &= counts.sum(axis=1) == 0
+        return plan, relaxed, met
+
+    def _weigh(self, base, remaining: Dict, fit: bool) -> 'np.ndarray':
+        if fit:
+            return self._fit(base, remaining)
+        weight = base
+        for dimension, counts in remaining.items():
+            weight = weight * counts[:, self.cell_dims[dimension]]
+        return weight
+
+    def _fit(self, base, remaining: Dict) -> 'np.ndarray':
+        """Pesos [exámenes, celdas] ajustados por IPF a lo que falta de cada cuota"""
+        weight = base.astype(np.float64)
+        for _ in range(IPF_ITERATIONS):
+            for dimension, counts in remaining.items():
+                onehot = self.cell_onehot[dimension]
+                margin = weight @ onehot
+                ratio = np.divide(counts, margin, out=np.zeros(margin.shape), where=margin > 0)
+                weight *= ratio @ onehot.T
+        return weight
+
+    def _draw_in_cells(self, plan, rng) -> 'np.ndarray':
+        """Posición en los arrays ordenados de una pregunta por hueco, sin repetir en cada examen"""
+        start, end = self.cell_start[plan], self.cell_end[plan]
+        positions = np.empty_like(plan)
+        pending = np.ones(plan.shape, dtype=bool)
+        for _ in range(MAX_REDRAW_ROUNDS):
+            cells = plan[pending]
+            offset = self.cell_base[cells] + rng.random(len(cells)) * self.cell_weight[cells]
+            found = np.searchsorted(self.cumulative, offset, side='right')
+            positions[pending] = np.clip(found, start[pending], end[pending] - 1)
+            pending = self._repeated(positions)
+            if not pending.any():
+                return positions
+
+        # Celdas casi agotadas con pesos muy desiguales: completar a mano
+        for exam, slot in zip(*np.nonzero(pending)):
+            used = set(positions[exam].tolist())
+            free = [p for p in range(start[exam, slot], end[exam, slot]) if p not in used]
+            positions[exam, slot] = free[rng.integers(len(free))]
+        return positions
+
+    @staticmethod
+    def _repeated(positions) -> 'np.ndarray':
+        """Máscara de huecos con una posición ya usada por otro hueco anterior del examen"""
+        order = np.argsort(positions, axis=1, kind='stable')
+        ordered = np.take_along_axis(positions, order, axis=1)
+        repeated_sorted = np.zeros(positions.shape, dtype=bool)
+        repeated_sorted[:, 1:] = ordered[:, 1:] == ordered[:, :-1]
+        repeated = np.zeros(positions.shape, dtype=bool)
+        np.put_along_axis(repeated, order, repeated_sorted, axis=1)
+        return repeated
+
+# ==================== MUESTREADOR DEL BANCO ====================
+
+_sampler: Optional[StratifiedSampler] = None
+_sampler_version: Optional[int] = None
+_sampler_lock = threading.Lock()
+
+def get_stratified_sampler() -> StratifiedSampler:
+    """
+    Muestreador del banco actual (se construye una vez por versión del banco)
+
+    Raises:
+        RuntimeError: si NumPy no está instalado
+    """
+    global _sampler, _sampler_version
+    version = database.get_question_bank_version()
+    if _sampler is not None and _sampler_version == version:
+        return _sampler
+    with _sampler_lock:
+        if _sampler is None or _sampler_version != version:
+            questions = []
+            for category in database.get_all_categories():
+                questions.extend(database.get_questions_by_category(
+                    category['id'], fields=('id', 'category_id', 'difficulty', 'question_type')
+                ))
+            _sampler = StratifiedSampler.from_questions(questions)
+            _sampler_version = version
+        return _sampler
+
+def synthetic_sampler(num_questions: int, num_categories: int = 50, seed=0) -> StratifiedSampler:
+    """Banco sintético (atributos al azar, pesos desiguales) para medir el muestreo"""
+    if np is None:
+        raise RuntimeError('stratified_sampler.py requiere NumPy (pip install numpy)')
+    rng = np.random.default_rng(seed)
+    return StratifiedSampler(
+        np.arange(1, num_questions + 1),
+        rng.integers(1, num_categories + 1, num_questions),
+        rng.choice(len(DIFFICULTIES), num_questions, p=(0.4, 0.4, 0.2)),
+        rng.choice(len(QUESTION_TYPES), num_questions, p=(0.7, 0.3)),
+        rng.uniform(0.5, 2.0, num_questions)
+    )
+
+def _option(name: str, default: int) -> int:
+    return int(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+if __name__ == '__main__':
+    num_exams = _option('--exams', 1000)
+    benchmark = '--benchmark' in sys.argv
+
+    print("="*60)
+    print("🎯 MUESTREO ESTRATIFICADO DE EXÁMENES")
+    print("="*60 + "\n")
+
+    try:
+        build_start = time.perf_counter()
+        if benchmark:
+            sampler = synthetic_sampler(_option('--questions', 1_000_000),
+                                        _option('--categories', 50))
+        else:
+            sampler = get_stratified_sampler()
+        build_seconds = time.perf_counter() - build_start
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"📚 {len(sampler.question_ids)} preguntas, {len(sampler.categories)} categorías "
+          f"({build_seconds:.2f} s para indexar)")
+    exams, report = sampler.sample_batch(
+        num_exams, 20, type_quota={'conceptual': 0.6, 'syntax': 0.4}
+    )
+    print(f"✅ {report['exams']} exámenes de {report['questions_per_exam']} preguntas "
+          f"en {report['seconds']} s")
+    print(f"  Objetivo por dificultad: {report['targets'].get('difficulty')}")
+    print(f"  Objetivo por tipo: {report['targets'].get('question_type')}")
+    print(f"  Exámenes que cumplen todas las cuotas: {report['exact_exams']}/{report['exams']}")
+    if any(report['relaxed_slots'].values()):
+        print(f"  ⚠️  Huecos con cuota relajada: {report['relaxed_slots']}")
+    print()